@@ -1,17 +1,25 @@
+import time
+_IMPORT_STARTED = time.monotonic()
 import os
 import json
-import ast
-import time
+import codecs
+import glob
 import re
 import logging
 import requests
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 import math
-from datetime import datetime
-from typing import Optional, List, Dict, Any
-import yaml
-from queue import Queue
+import hashlib
+import heapq
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Callable, Set
+from queue import Queue, Full, Empty
+from collections import deque, OrderedDict
 import threading
+import sys
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +33,16 @@ FEEDER_DYNAMIC_DISCOVERY_DONE = False
 FEEDER_DEVICE_ID = "airplanes_live_feeder_device"
 FEEDER_DEVICE_NAME = "Airplanes Live Feeder"
 DETAILED_DISCOVERY_PUBLISHED = set()
+# Offline aircraft database, set once the background build/map finishes
+AIRCRAFT_DB: Optional["AircraftDatabase"] = None
+# Rolling traffic statistics, fed by the summary pass when enabled
+TRAFFIC_STATS: Optional["TrafficStatistics"] = None
+# Closest-point-of-approach predictor for the "next overhead" sensors, when enabled
+OVERHEAD: Optional["OverflightPredictor"] = None
+# Opt-in tracemalloc/RSS growth tracking (memory_monitor)
+MEMORY_MONITOR: Optional["MemoryMonitor"] = None
+# Suppresses summary publishes that carry no material change, when enabled
+SUMMARY_CHANGES: Optional["SummaryChangeDetector"] = None
 # Cache addon version to avoid repeated file reads and warnings
 _CACHED_ADDON_VERSION: Optional[str] = None
 _ADDON_VERSION_WARNED: bool = False
@@ -68,6 +86,17 @@ def _format_location_for_logs(lat_raw: Any, lon_raw: Any) -> str:
         return f"{lat:.5f},{lon:.5f}"
     return f"{lat:.1f},{lon:.1f} (approx)"
 
+def _seconds_since_process_start() -> float:
+    """Seconds since this process started (from /proc when available, else since module import)"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORT_STARTED
+
 def log(msg: str, level: str = "info"):
     """Log message with specified level"""
     safe_msg = _sanitize_log_message(msg)
@@ -84,7 +113,7 @@ def log(msg: str, level: str = "info"):
 
 def load_config():
     """Load configuration from Home Assistant options.json file"""
-    config_path = "/data/options.json"
+    config_path = OPTIONS_FILE
     try:
         with open(config_path, 'r') as f:
             config = json.load(f)
@@ -113,6 +142,8 @@ def get_addon_version():
         return _CACHED_ADDON_VERSION
     config_path = "config.yaml"
     try:
+        # Only needed when ADDON_VERSION is unset (local runs), so keep it off the startup path
+        import yaml
         with open(config_path, 'r') as f:
             config = yaml.safe_load(f)
         version = config.get('version', 'unknown')
@@ -125,6 +156,12 @@ def get_addon_version():
             _ADDON_VERSION_WARNED = True
         _CACHED_ADDON_VERSION = DEFAULT_ADDON_VERSION
         return _CACHED_ADDON_VERSION
+    except ImportError as e:
+        if not _ADDON_VERSION_WARNED:
+            log(f"PyYAML unavailable ({e}), using default version", "warning")
+            _ADDON_VERSION_WARNED = True
+        _CACHED_ADDON_VERSION = DEFAULT_ADDON_VERSION
+        return _CACHED_ADDON_VERSION
     except yaml.YAMLError as e:
         if not _ADDON_VERSION_WARNED:
             log(f"Error parsing config.yaml: {e}, using default version", "error")
@@ -138,34 +175,18 @@ def get_addon_version():
         _CACHED_ADDON_VERSION = DEFAULT_ADDON_VERSION
         return _CACHED_ADDON_VERSION
 
-# Load configuration
-config = load_config()
-
-log("Configuration loaded")
-
-# Load config from options.json with fallback defaults
-API_TYPE = config.get("api_type", "unauthenticated")
-API_KEY = config.get("api_key", "")
-DISABLE_AUTO_CONFIG = config.get("disable_auto_config", False)
-LATITUDE = config.get("latitude", "53.2707")
-LONGITUDE = config.get("longitude", "-9.0568")
-RADIUS = config.get("radius", 50)
-UPDATE_INTERVAL = config.get("update_interval", 25)
-MQTT_BROKER = config.get("mqtt_broker", "core-mosquitto")
-MQTT_PORT = config.get("mqtt_port", 1883)
-MQTT_TOPIC = config.get("mqtt_topic", "airplanes/live")
-MQTT_USERNAME = config.get("mqtt_username", "")
-MQTT_PASSWORD = config.get("mqtt_password", "")
-MQTT_QOS = config.get("mqtt_qos", 1)  # Default to QoS 1 for reliability
-MQTT_RETAIN = config.get("mqtt_retain", True)  # Default to retain messages
-TRACKING_MODE = config.get("tracking_mode", "summary")
-FEEDER_MONITOR_ENABLED = config.get("feeder_monitor_enabled", False)
-FEEDER_STATS_URL = config.get("feeder_stats_url", "http://127.0.0.1:8080/metrics.json")
-FEEDER_MONITOR_INTERVAL = config.get("feeder_monitor_interval", 30)
-FEEDER_FILTER_ZERO_SENSORS = config.get("feeder_filter_zero_sensors", False)
-SQUAWK_TRACKING_ENABLED = config.get("squawk_tracking_enabled", True)
-SQUAWK_ALERT_SPECIAL_CODES = config.get("squawk_alert_special_codes", True)
-CUSTOM_SQUAWKS = config.get("custom_squawks", [])
+OPTIONS_FILE = "/data/options.json"
+PROFILE_OUTPUT_DIR = "/data"
+AIRCRAFT_DB_FILE = "/data/aircraft_db.bin"
+TRAFFIC_STATS_FILE = "/data/traffic_stats.json"
+STATE_DB_FILE = "/data/state.db"
+# Local health endpoint polled by the Dockerfile HEALTHCHECK
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8099"))
+
+# Public airplanes.live endpoints, also used as failover sources
+REST_API_URL = "https://rest.api.airplanes.live"
+FEEDER_API_URL = "https://api.airplanes.live/v2/point"
+KM_TO_NMI = 0.539957
 
 # Special squawk codes that warrant alerts
 SPECIAL_SQUAWKS = {
@@ -177,96 +198,256 @@ SPECIAL_SQUAWKS = {
     "7777": "Reserved"
 }
 
-# Merge custom squawks with special ones
-for custom_code in CUSTOM_SQUAWKS:
-    if custom_code not in SPECIAL_SQUAWKS:
-        SPECIAL_SQUAWKS[custom_code] = "Custom Watch"
+# Work time (seconds) of the most recent update cycles, excluding the sleep
+RECENT_CYCLE_TIMES = deque(maxlen=100)
+# Seconds from process start to the first real summary publish
+STARTUP_SECONDS: Optional[float] = None
 
 # Track current active squawk
 CURRENT_SQUAWK = None
 CURRENT_SQUAWK_AIRCRAFT = []
 TRACKED_SQUAWKS = {}
 
-# Auto-configure API URL based on type (unless disabled)
-if DISABLE_AUTO_CONFIG:
-    # Use user-provided URL and radius as-is
-    API_URL = config.get("api_url", "https://api.airplanes.live/v2/point")
-    RADIUS_NMI = RADIUS
-    log("Auto-configuration disabled - using user-provided settings")
-else:
-    # Auto-configure based on API type
-    if API_TYPE == "authenticated":
-        API_URL = "https://rest.api.airplanes.live"
-        # Convert radius from km to nautical miles for REST API
-        RADIUS_NMI = RADIUS * 0.539957
-        log("Auto-configured for REST API with radius conversion")
-    else:
-        # Feeder API uses kilometers
-        API_URL = "https://api.airplanes.live/v2/point"
-        RADIUS_NMI = RADIUS
-        log("Auto-configured for feeder API")
 
-log(f"Runtime configuration initialized for location {_format_location_for_logs(LATITUDE, LONGITUDE)}")
-log("MQTT configuration initialized")
+class AddonConfig:
+    """Runtime configuration built from the Home Assistant options with fallback defaults.
+
+    Constructing it does no I/O; init_config() loads /data/options.json into
+    the module-wide CONFIG when the add-on starts.
+    """
+
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        options = options or {}
+        self.api_type = options.get("api_type", "unauthenticated")
+        self.api_key = options.get("api_key", "")
+        self.disable_auto_config = options.get("disable_auto_config", False)
+        self.latitude = options.get("latitude", "53.2707")
+        self.longitude = options.get("longitude", "-9.0568")
+        self.radius = options.get("radius", 50)
+        self.update_interval = options.get("update_interval", 25)
+        self.mqtt_broker = options.get("mqtt_broker", "core-mosquitto")
+        self.mqtt_port = options.get("mqtt_port", 1883)
+        self.mqtt_topic = options.get("mqtt_topic", "airplanes/live")
+        self.mqtt_username = options.get("mqtt_username", "")
+        self.mqtt_password = options.get("mqtt_password", "")
+        self.mqtt_qos = options.get("mqtt_qos", 1)  # Default to QoS 1 for reliability
+        self.mqtt_retain = options.get("mqtt_retain", True)  # Default to retain messages
+        self.tracking_mode = options.get("tracking_mode", "summary")
+        self.aggregate_compression = options.get("aggregate_compression", False)
+        self.feeder_monitor_enabled = options.get("feeder_monitor_enabled", False)
+        self.feeder_stats_url = options.get("feeder_stats_url", "http://127.0.0.1:8080/metrics.json")
+        self.feeder_monitor_interval = options.get("feeder_monitor_interval", 30)
+        self.feeder_filter_zero_sensors = options.get("feeder_filter_zero_sensors", False)
+        self.squawk_tracking_enabled = options.get("squawk_tracking_enabled", True)
+        self.squawk_alert_special_codes = options.get("squawk_alert_special_codes", True)
+        self.custom_squawks = options.get("custom_squawks", [])
+        self.capture_enabled = options.get("capture_enabled", False)
+        self.capture_dir = options.get("capture_dir", "/data/captures")
+        self.capture_max_files = options.get("capture_max_files", 48)
+        self.replay_file = options.get("replay_file", "")
+        self.replay_speed = options.get("replay_speed", 1.0)
+        self.profile_command_enabled = options.get("profile_command_enabled", False)
+        self.profile_max_files = options.get("profile_max_files", 10)
+        self.aircraft_state_expiry = options.get("aircraft_state_expiry", 300)
+        self.aircraft_db_csv = options.get("aircraft_db_csv", "")
+        self.watchlist_file = options.get("watchlist_file", "")
+        self.top_n_count = options.get("top_n_count", 5)
+        self.statistics_enabled = options.get("statistics_enabled", True)
+        self.persist_state = options.get("persist_state", True)
+        self.discovery_reconcile = options.get("discovery_reconcile", True)
+        self.device_discovery = options.get("device_discovery", False)
+        self.worker_processes = options.get("worker_processes", 0)
+        self.fallback_sources = options.get("fallback_sources", ["feeder"])
+        self.readsb_url = options.get("readsb_url", "http://127.0.0.1:8080/data/aircraft.json")
+        self.watchdog_restart = options.get("watchdog_restart", True)
+        self.summary_max_age = options.get("summary_max_age", 300)
+        self.overhead_minutes = options.get("overhead_minutes", 10)
+        self.overhead_radius = options.get("overhead_radius", 5.0)
+        self.memory_monitor = options.get("memory_monitor", False)
+        self.memory_warn_mb = options.get("memory_warn_mb", 64)
+        self.load_shedding = options.get("load_shedding", True)
+
+        # Merge custom squawks with special ones
+        self.special_squawks = dict(SPECIAL_SQUAWKS)
+        if isinstance(self.custom_squawks, list):
+            for custom_code in self.custom_squawks:
+                if custom_code not in self.special_squawks:
+                    self.special_squawks[custom_code] = "Custom Watch"
+
+        # Auto-configure API URL based on type (unless disabled)
+        if self.disable_auto_config:
+            # Use user-provided URL and radius as-is
+            self.api_url = options.get("api_url", FEEDER_API_URL)
+            self.radius_nmi = self.radius
+        elif self.api_type == "authenticated":
+            self.api_url = REST_API_URL
+            # Convert radius from km to nautical miles for REST API
+            self.radius_nmi = self.radius * KM_TO_NMI if isinstance(self.radius, (int, float)) else self.radius
+        else:
+            # Feeder API uses kilometers
+            self.api_url = FEEDER_API_URL
+            self.radius_nmi = self.radius
+
+    def log_summary(self):
+        """Log how the API endpoint was resolved, without exposing sensitive values"""
+        if self.disable_auto_config:
+            log("Auto-configuration disabled - using user-provided settings")
+        elif self.api_type == "authenticated":
+            log("Auto-configured for REST API with radius conversion")
+        else:
+            log("Auto-configured for feeder API")
+        log(f"Runtime configuration initialized for location {_format_location_for_logs(self.latitude, self.longitude)}")
+        log("MQTT configuration initialized")
+
+
+def init_config(options: Optional[Dict[str, Any]] = None) -> AddonConfig:
+    """Build the module-wide CONFIG from options.json, or from the given options."""
+    global CONFIG
+    CONFIG = AddonConfig(load_config() if options is None else options)
+    log("Configuration loaded")
+    CONFIG.log_summary()
+    return CONFIG
+
 
-def validate_config():
-    """Validate configuration values"""
+# Defaults until init_config() runs at startup; importing this module does no I/O
+CONFIG = AddonConfig()
+
+
+
+def validate_config(config: Optional[AddonConfig] = None):
+    """Validate configuration values (the running CONFIG unless a candidate is given)"""
+    config = CONFIG if config is None else config
     errors = []
     valid_api_types = {"unauthenticated", "authenticated"}
-    valid_tracking_modes = {"summary", "detailed", "both"}
+    valid_tracking_modes = {"summary", "detailed", "both", "aggregate"}
     
     try:
-        lat = float(LATITUDE)
+        lat = float(config.latitude)
         if not -90 <= lat <= 90:
             errors.append("Latitude is out of allowed range")
     except ValueError:
         errors.append("Latitude is not a valid number")
     
     try:
-        lon = float(LONGITUDE)
+        lon = float(config.longitude)
         if not -180 <= lon <= 180:
             errors.append("Longitude is out of allowed range")
     except ValueError:
         errors.append("Longitude is not a valid number")
     
-    if not isinstance(RADIUS, (int, float)) or RADIUS <= 0:
+    if not isinstance(config.radius, (int, float)) or config.radius <= 0:
         errors.append("Radius must be a positive number")
     
-    if not isinstance(UPDATE_INTERVAL, (int, float)) or UPDATE_INTERVAL < 1:
+    if not isinstance(config.update_interval, (int, float)) or config.update_interval < 1:
         errors.append("Update interval must be at least 1 second")
 
-    if API_TYPE not in valid_api_types:
+    if config.api_type not in valid_api_types:
         errors.append("api_type must be one of the supported values")
 
-    if TRACKING_MODE not in valid_tracking_modes:
+    if config.tracking_mode not in valid_tracking_modes:
         errors.append("tracking_mode must be one of the supported values")
 
-    if API_TYPE == "authenticated" and not API_KEY:
+    if config.api_type == "authenticated" and not config.api_key:
         errors.append("api_type is authenticated but api_key is empty")
     
     # Validate MQTT QoS
-    if not isinstance(MQTT_QOS, int) or MQTT_QOS not in [0, 1, 2]:
+    if not isinstance(config.mqtt_qos, int) or config.mqtt_qos not in [0, 1, 2]:
         errors.append("MQTT QoS must be 0, 1, or 2")
     
     # Validate MQTT retain
-    if not isinstance(MQTT_RETAIN, bool):
+    if not isinstance(config.mqtt_retain, bool):
         errors.append("MQTT retain must be a boolean")
     
     # Validate feeder monitor
-    if FEEDER_MONITOR_ENABLED:
-        if not isinstance(FEEDER_STATS_URL, str) or not FEEDER_STATS_URL:
+    if config.feeder_monitor_enabled:
+        if not isinstance(config.feeder_stats_url, str) or not config.feeder_stats_url:
             errors.append("Feeder monitor enabled but feeder_stats_url is invalid")
-        if not isinstance(FEEDER_MONITOR_INTERVAL, (int, float)) or FEEDER_MONITOR_INTERVAL < 5:
+        if not isinstance(config.feeder_monitor_interval, (int, float)) or config.feeder_monitor_interval < 5:
             errors.append("feeder_monitor_interval must be at least 5 seconds")
-        if not isinstance(FEEDER_FILTER_ZERO_SENSORS, bool):
+        if not isinstance(config.feeder_filter_zero_sensors, bool):
             errors.append("feeder_filter_zero_sensors must be a boolean")
 
-    if not isinstance(CUSTOM_SQUAWKS, list):
+    if not isinstance(config.custom_squawks, list):
         errors.append("custom_squawks must be a list")
     else:
-        for code in CUSTOM_SQUAWKS:
+        for code in config.custom_squawks:
             if not isinstance(code, str) or len(code) != 4 or not code.isdigit():
                 errors.append("Custom squawk codes must be 4-digit strings")
+
+    if config.capture_enabled:
+        if not isinstance(config.capture_dir, str) or not config.capture_dir:
+            errors.append("Capture enabled but capture_dir is invalid")
+        if not isinstance(config.capture_max_files, int) or config.capture_max_files < 1:
+            errors.append("capture_max_files must be at least 1")
+
+    if config.replay_file:
+        if not isinstance(config.replay_file, str):
+            errors.append("replay_file must be a path string")
+        if not isinstance(config.replay_speed, (int, float)) or config.replay_speed < 0:
+            errors.append("replay_speed must be 0 (as fast as possible) or a positive multiplier")
+
+    if not isinstance(config.profile_command_enabled, bool):
+        errors.append("profile_command_enabled must be a boolean")
+
+    if not isinstance(config.profile_max_files, int) or config.profile_max_files < 1:
+        errors.append("profile_max_files must be at least 1")
+
+    if not isinstance(config.aircraft_state_expiry, int) or config.aircraft_state_expiry < 0:
+        errors.append("aircraft_state_expiry must be 0 (never expire) or a number of seconds")
+
+    if config.aircraft_db_csv and not isinstance(config.aircraft_db_csv, str):
+        errors.append("aircraft_db_csv must be a path string")
+
+    if config.watchlist_file and not isinstance(config.watchlist_file, str):
+        errors.append("watchlist_file must be a path string")
+
+    if not isinstance(config.top_n_count, int) or not 0 <= config.top_n_count <= 50:
+        errors.append("top_n_count must be between 0 (disabled) and 50")
+
+    if not isinstance(config.statistics_enabled, bool):
+        errors.append("statistics_enabled must be a boolean")
+
+    if not isinstance(config.persist_state, bool):
+        errors.append("persist_state must be a boolean")
+
+    if not isinstance(config.discovery_reconcile, bool):
+        errors.append("discovery_reconcile must be a boolean")
+
+    if not isinstance(config.device_discovery, bool):
+        errors.append("device_discovery must be a boolean")
+
+    if not isinstance(config.aggregate_compression, bool):
+        errors.append("aggregate_compression must be a boolean")
+
+    if not isinstance(config.worker_processes, int) or not 0 <= config.worker_processes <= 32:
+        errors.append("worker_processes must be between 0 (in-process) and 32")
+
+    if not isinstance(config.fallback_sources, list) or not set(config.fallback_sources) <= {"rest", "feeder", "readsb"}:
+        errors.append("fallback_sources must be a list of rest, feeder and readsb")
+
+    if "readsb" in (config.fallback_sources or []) and not config.readsb_url:
+        errors.append("readsb_url is required when readsb is a fallback source")
+
+    if not isinstance(config.watchdog_restart, bool):
+        errors.append("watchdog_restart must be a boolean")
+
+    if not isinstance(config.summary_max_age, int) or config.summary_max_age < 0:
+        errors.append("summary_max_age must be 0 (publish every cycle) or a number of seconds")
+
+    if not isinstance(config.overhead_minutes, int) or not 0 <= config.overhead_minutes <= 60:
+        errors.append("overhead_minutes must be between 0 (disabled) and 60")
+
+    if not isinstance(config.overhead_radius, (int, float)) or config.overhead_radius <= 0:
+        errors.append("overhead_radius must be a positive distance in km")
+
+    if not isinstance(config.memory_monitor, bool):
+        errors.append("memory_monitor must be a boolean")
+
+    if not isinstance(config.memory_warn_mb, int) or config.memory_warn_mb < 0:
+        errors.append("memory_warn_mb must be 0 (no warning) or a number of MB")
+
+    if not isinstance(config.load_shedding, bool):
+        errors.append("load_shedding must be a boolean")
     
     if errors:
         for error in errors:
@@ -276,69 +457,430 @@ def validate_config():
     log("Configuration validation passed")
     return True
 
-def fetch_airplane_data() -> Optional[List[Dict[str, Any]]]:
-    """Fetch airplane data from API with improved error handling"""
-    
-    # Construct URL based on API type
-    if API_TYPE == "authenticated":
-        # REST API with circle query and filters
-        url = f"{API_URL}/?circle={LATITUDE},{LONGITUDE},{RADIUS_NMI:.1f}"
-        headers = {}
-        if API_KEY:
-            headers["auth"] = API_KEY
-    else:
-        # Feeder API
-        url = f"{API_URL}/{LATITUDE}/{LONGITUDE}/{RADIUS}"
+# Aircraft fields anything downstream reads; everything else is dropped while decoding
+AIRCRAFT_FIELDS = frozenset({
+    "hex", "flight", "r", "t", "alt_baro", "gs", "tas", "ias", "track",
+    "lat", "lon", "squawk", "wd", "ws", "oat", "baro_rate",
+})
+
+
+class AircraftStreamDecoder:
+    """Incremental decoder for the aircraft array of an API response.
+
+    feed() takes raw body chunks and returns the aircraft completed by each
+    one, trimmed to AIRCRAFT_FIELDS, so neither the whole body nor the whole
+    decoded tree is held at once. Both {"aircraft": [...]} and {"ac": [...]}
+    are accepted; other top-level members are decoded and dropped. Elements
+    are parsed with json.JSONDecoder.raw_decode, and a parse error before the
+    end of the body just means the element is not complete yet.
+    """
+
+    ARRAY_KEYS = ("aircraft", "ac")
+    _WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, fields=AIRCRAFT_FIELDS):
+        self._fields = {field: field for field in fields}
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = "start"  # start -> key -> colon -> value | array -> ... -> end
+        self._key: Optional[str] = None
+        self.keys: List[str] = []
+        self.array_key: Optional[str] = None
+        self.array_type: Optional[str] = None  # type name when the array key does not hold a list
+        self.now: Any = None  # top-level "now" (snapshot time) when present
+        self.bytes_read = 0
+        self.dropped = 0  # array elements that were not objects
+
+    def _value(self, pos: int, eof: bool):
+        """(value, end) for the JSON value at pos, or None until more input arrives"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            return None
+        if end == len(self._buffer) and not eof:
+            return None  # A number may continue in the next chunk
+        return value, end
+
+    def _parse(self, eof: bool) -> List[Dict[str, Any]]:
+        aircraft = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            pos = self._WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer) or self._state == "end":
+                break
+            char = buffer[pos]
+            if self._state == "start":
+                if char != "{":
+                    raise json.JSONDecodeError("API response is not a JSON object", buffer, pos)
+                pos += 1
+                self._state = "key"
+            elif self._state == "key":
+                if char == "}":
+                    pos += 1
+                    self._state = "end"
+                elif char == ",":
+                    pos += 1
+                else:
+                    decoded = self._value(pos, eof)
+                    if decoded is None:
+                        break
+                    self._key, pos = decoded
+                    self.keys.append(self._key)
+                    self._state = "colon"
+            elif self._state == "colon":
+                if char != ":":
+                    raise json.JSONDecodeError("Expecting ':' delimiter", buffer, pos)
+                pos += 1
+                self._state = "value"
+            elif self._state == "value":
+                if self._key in self.ARRAY_KEYS and self.array_key is None and char == "[":
+                    self.array_key = self._key
+                    pos += 1
+                    self._state = "array"
+                    continue
+                decoded = self._value(pos, eof)
+                if decoded is None:
+                    break
+                value, pos = decoded
+                if self._key == "now":
+                    self.now = value
+                if self._key in self.ARRAY_KEYS and self.array_key is None:
+                    self.array_key = self._key
+                    self.array_type = type(value).__name__
+                self._state = "key"
+            elif self._state == "array":
+                if char == "]":
+                    pos += 1
+                    self._state = "key"
+                elif char == ",":
+                    pos += 1
+                else:
+                    decoded = self._value(pos, eof)
+                    if decoded is None:
+                        break
+                    element, pos = decoded
+                    if isinstance(element, dict):
+                        # Map to shared key strings: raw_decode only memoises keys within one call
+                        fields = self._fields
+                        aircraft.append({fields[k]: v for k, v in element.items() if k in fields})
+                    else:
+                        self.dropped += 1
+        self._buffer = buffer[pos:]
+        return aircraft
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        self.bytes_read += len(chunk)
+        self._buffer += self._text.decode(chunk)
+        return self._parse(eof=False)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Parse what is left; raises json.JSONDecodeError if the body was truncated"""
+        self._buffer += self._text.decode(b"", final=True)
+        aircraft = self._parse(eof=True)
+        if self._state != "end":
+            raise json.JSONDecodeError("Unexpected end of API response", self._buffer, len(self._buffer))
+        return aircraft
+
+
+class ResponseFingerprint:
+    """Recognises a polled endpoint returning the same snapshot as last time.
+
+    Validators (ETag / Last-Modified) are sent back as If-None-Match /
+    If-Modified-Since when the server provides them, so an unchanged snapshot
+    costs a bodiless 304. Otherwise the body is hashed as it streams
+    (blake2b) and compared together with the API's "now" field. The last
+    payload is kept so callers still get data for a 304.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.url: Optional[str] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.fingerprint: Optional[tuple] = None
+        self.payload: Any = None
+        self.unchanged = False
+        self._in_flight = False
+        self.not_modified_count = 0
+        self.unchanged_count = 0
+        self.changed_count = 0
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Start a fetch of url; returns the conditional request headers to send"""
+        if url != self.url or self._in_flight:
+            # After a URL change or a failed fetch, the next snapshot is processed in full
+            self.url = url
+            self.reset()
+        self._in_flight = True
+        self.unchanged = False
         headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def not_modified(self) -> Any:
+        """Record a 304 and return the payload it stands for"""
+        self._in_flight = False
+        self.unchanged = True
+        self.not_modified_count += 1
+        return self.payload
+
+    def update(self, resp, fingerprint: tuple, payload: Any) -> bool:
+        """Record a full response; True when it matches the previous one"""
+        self._in_flight = False
+        self.unchanged = fingerprint == self.fingerprint
+        if self.unchanged:
+            self.unchanged_count += 1
+        else:
+            self.changed_count += 1
+        self.fingerprint = fingerprint
+        self.etag = resp.headers.get("ETag")
+        self.last_modified = resp.headers.get("Last-Modified")
+        # Only a 304 needs the old payload back, and only servers with validators send one
+        self.payload = payload if self.etag or self.last_modified else None
+        return self.unchanged
+
+    def reset(self):
+        """Forget the last response so the next one counts as changed"""
+        self._in_flight = False
+        self.unchanged = False
+        self.etag = self.last_modified = self.fingerprint = self.payload = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "changed": self.changed_count,
+            "unchanged": self.unchanged_count,
+            "not_modified": self.not_modified_count,
+            "validators": bool(self.etag or self.last_modified),
+        }
+
+
+API_RESPONSE = ResponseFingerprint("api")
+FEEDER_RESPONSE = ResponseFingerprint("feeder")
+
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker.
+
+    closed: requests flow; failure_threshold consecutive failures open it.
+    open: requests are skipped until the reset timeout has passed, then one
+    probe is let through (half_open). A successful probe closes the breaker;
+    a failed one reopens it with the timeout doubled, up to
+    max_reset_timeout. Auth failures (401/403) open it straight away, since
+    retrying cannot fix them.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0, max_reset_timeout: float = 600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            log(f"API source {self.name}: probing after {self.reset_timeout:.0f}s")
+        return self.state != "open"
+
+    def record_success(self):
+        if self.state != "closed":
+            log(f"API source {self.name}: recovered, breaker closed")
+        self.state = "closed"
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, error: str, trip: bool = False):
+        self.failures += 1
+        self.last_error = error
+        if self.state == "half_open":
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.state == "closed" and (trip or self.failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        log(f"API source {self.name}: breaker open for {self.reset_timeout:.0f}s after {self.failures} failure(s) ({self.last_error})", "warning")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "trips": self.trips, "last_error": self.last_error}
+
+
+class ApiSource:
+    """One aircraft endpoint (kind rest, feeder or readsb) with the radius in the unit it expects.
+
+    readsb is a local receiver's aircraft.json: it has no radius query, so
+    aircraft are filtered to radius_km here instead.
+    """
+
+    def __init__(self, name: str, kind: str, url: str, radius: Any, headers: Optional[Dict[str, str]] = None, timeout: float = 15):
+        self.name = name
+        self.kind = kind
+        self.url = url
+        self.radius = radius
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(name)
+        self.last_status: Optional[int] = None
+
+    def request_url(self) -> str:
+        if self.kind == "rest":
+            # REST API with circle query and filters
+            return f"{self.url}/?circle={CONFIG.latitude},{CONFIG.longitude},{self.radius:.1f}"
+        if self.kind == "feeder":
+            return f"{self.url}/{CONFIG.latitude}/{CONFIG.longitude}/{self.radius}"
+        return self.url
+
+    def filter(self, aircraft_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.kind != "readsb":
+            return aircraft_list
+        lat1, lon1 = math.radians(float(CONFIG.latitude)), math.radians(float(CONFIG.longitude))
+        cos_lat1 = math.cos(lat1)
+        inside = []
+        for ac in aircraft_list:
+            lat, lon = ac.get('lat'), ac.get('lon')
+            if lat is None or lon is None:
+                continue  # The point API only returns aircraft with a position
+            lat2, lon2 = math.radians(lat), math.radians(lon)
+            a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+            if 6371 * 2 * math.asin(math.sqrt(a)) <= self.radius:
+                inside.append(ac)
+        return inside
+
+
+API_SOURCES: List[ApiSource] = []
+ACTIVE_API_SOURCE: Optional[str] = None
+
+
+def init_api_sources() -> List[ApiSource]:
+    """Build the configured endpoint followed by the fallback_sources, in order"""
+    global API_SOURCES
+    auth = {"auth": CONFIG.api_key} if CONFIG.api_key else {}
+    primary_kind = "rest" if CONFIG.api_type == "authenticated" else "feeder"
+    sources = [ApiSource(primary_kind, primary_kind, CONFIG.api_url,
+                         CONFIG.radius_nmi if primary_kind == "rest" else CONFIG.radius,
+                         auth if primary_kind == "rest" else {})]
+    for kind in CONFIG.fallback_sources or []:
+        if any(source.kind == kind for source in sources):
+            continue
+        if kind == "rest":
+            if not CONFIG.api_key:
+                log("Skipping rest fallback source - it needs api_key", "warning")
+                continue
+            sources.append(ApiSource("rest", "rest", REST_API_URL, float(CONFIG.radius) * KM_TO_NMI, auth))
+        elif kind == "feeder":
+            sources.append(ApiSource("feeder", "feeder", FEEDER_API_URL, CONFIG.radius))
+        elif kind == "readsb":
+            sources.append(ApiSource("readsb", "readsb", CONFIG.readsb_url, float(CONFIG.radius), timeout=5))
+    API_SOURCES = sources
+    if len(sources) > 1:
+        log(f"API sources in failover order: {', '.join(source.name for source in sources)}")
+    return sources
+
+
+def get_api_stats() -> Dict[str, Any]:
+    return {
+        "active": ACTIVE_API_SOURCE or "none",
+        "breakers": {source.name: source.breaker.get_stats() for source in API_SOURCES},
+    }
+
+
+def fetch_airplane_data() -> Optional[List[Dict[str, Any]]]:
+    """Fetch aircraft from the first available source, failing over in order
+
+    A source whose circuit breaker is open is skipped without a request, so
+    an outage costs one timeout per probe rather than one per cycle.
+    """
+    global ACTIVE_API_SOURCE
+    for source in API_SOURCES or init_api_sources():
+        if not source.breaker.allow():
+            continue
+        aircraft_list = _fetch_from_source(source)
+        if aircraft_list is not None:
+            source.breaker.record_success()
+            if ACTIVE_API_SOURCE != source.name:
+                if ACTIVE_API_SOURCE is not None:
+                    log(f"Now fetching aircraft from the {source.name} source", "warning")
+                ACTIVE_API_SOURCE = source.name
+            return aircraft_list
+        source.breaker.record_failure(f"HTTP {source.last_status}" if (source.last_status or 0) >= 400 else "request failed",
+                                      trip=source.last_status in (401, 403))
+    if ACTIVE_API_SOURCE is not None:
+        log("No API source available - all breakers open or failing", "error")
+    ACTIVE_API_SOURCE = None
+    return None
+
+
+def _fetch_from_source(source: ApiSource) -> Optional[List[Dict[str, Any]]]:
+    """Fetch airplane data from one source with improved error handling
+
+    The body is streamed through AircraftStreamDecoder, so aircraft are
+    decoded and trimmed as chunks arrive.
+    """
+    url = source.request_url()
+    headers = dict(source.headers)
+    source.last_status = None
     
     try:
-        log("Fetching data from configured API endpoint")
-        resp = requests.get(url, headers=headers, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        log(f"Fetching data from the {source.name} API endpoint")
+        headers.update(API_RESPONSE.request_headers(url))
+        decoder = AircraftStreamDecoder()
+        body_hash = hashlib.blake2b(digest_size=16)
+        aircraft_list = []
+        with requests.get(url, headers=headers, timeout=(min(5, source.timeout), source.timeout), stream=True) as resp:
+            source.last_status = resp.status_code
+            if resp.status_code == 304 and API_RESPONSE.payload is not None:
+                log("API snapshot not modified since the last fetch")
+                return API_RESPONSE.not_modified()
+            resp.raise_for_status()
+            for chunk in resp.iter_content(chunk_size=65536):
+                body_hash.update(chunk)
+                aircraft_list.extend(decoder.feed(chunk))
+        aircraft_list.extend(decoder.close())
         
         # Debug: Log response structure
-        log(f"API response type: {type(data)}")
-        if isinstance(data, dict):
-            log(f"API response keys: {list(data.keys())}")
-            if 'aircraft' in data:
-                log(f"API response 'aircraft' type: {type(data['aircraft'])}")
-            elif 'ac' in data:
-                log(f"API response 'ac' type: {type(data['ac'])}")
+        log(f"API response keys: {decoder.keys} ({decoder.bytes_read} bytes)")
         
         # Extract aircraft array from response
-        if isinstance(data, dict):
-            if 'aircraft' in data:
-                aircraft_list = data['aircraft']
-                if isinstance(aircraft_list, list):
-                    count = len(aircraft_list)
-                    log(f"Fetched {count} aircraft using {API_TYPE} API")
-                    return aircraft_list
-                else:
-                    log(f"API response 'aircraft' field is not a list: {type(aircraft_list)}", "warning")
-                    return None
-            elif 'ac' in data:
-                # Fallback for older API format
-                aircraft_list = data['ac']
-                if isinstance(aircraft_list, list):
-                    count = len(aircraft_list)
-                    log(f"Fetched {count} aircraft using {API_TYPE} API (legacy format)")
-                    return aircraft_list
-                else:
-                    log(f"API response 'ac' field is not a list: {type(aircraft_list)}", "warning")
-                    return None
-            else:
-                log(f"API response missing 'aircraft' or 'ac' field. Available keys: {list(data.keys())}", "warning")
-                return None
-        else:
-            log(f"API response is not a dictionary: {type(data)}", "warning")
+        if decoder.array_key is None:
+            log(f"API response missing 'aircraft' or 'ac' field. Available keys: {decoder.keys}", "warning")
+            API_RESPONSE.reset()
+            return None
+        if decoder.array_type is not None:
+            log(f"API response '{decoder.array_key}' field is not a list: {decoder.array_type}", "warning")
+            API_RESPONSE.reset()
             return None
+        aircraft_list = source.filter(aircraft_list)
+        if API_RESPONSE.update(resp, (decoder.now, body_hash.digest()), aircraft_list):
+            log("API snapshot unchanged since the last fetch")
+        if decoder.dropped:
+            log(f"Skipped {decoder.dropped} malformed entries in API response '{decoder.array_key}' field", "warning")
+        if decoder.array_key == "aircraft":
+            log(f"Fetched {len(aircraft_list)} aircraft from the {source.name} source")
+        else:
+            # Fallback for older API format
+            log(f"Fetched {len(aircraft_list)} aircraft from the {source.name} source (legacy format)")
+        return aircraft_list
             
     except requests.exceptions.Timeout:
-        log("API request timed out", "error")
+        log(f"{source.name} API request timed out", "error")
         return None
     except requests.exceptions.ConnectionError:
-        log("Failed to connect to API - network error", "error")
+        log(f"Failed to connect to the {source.name} API - network error", "error")
         return None
     except requests.exceptions.HTTPError as e:
         log(f"API HTTP error: {e}", "error")
@@ -352,9 +894,46 @@ def fetch_airplane_data() -> Optional[List[Dict[str, Any]]]:
         log(f"Unexpected error fetching airplane data: {e}", "error")
         return None
 
+def _is_current_discovery_topic(topic: str) -> bool:
+    """Whether a retained config not republished this session still belongs to the current configuration"""
+    component, object_id = topic.split("/")[-3:-1]
+    if component == "device":
+        return object_id.startswith("airplane_") and CONFIG.tracking_mode in ["detailed", "both"] and CONFIG.device_discovery
+    if object_id.startswith("airplanes_live_feeder_"):
+        # Feeder configs depend on the metrics endpoint and appear after the first stats fetch
+        return CONFIG.feeder_monitor_enabled
+    if object_id.startswith("airplane_"):
+        # Per-aircraft configs are published lazily as aircraft appear
+        if CONFIG.tracking_mode not in ["detailed", "both"] or CONFIG.device_discovery:
+            return False
+        parts = object_id.split("_", 2)
+        return len(parts) == 3 and parts[2] in {sensor["key"] for sensor in AIRCRAFT_SENSORS}
+    return False
+
+def _reconcile_persisted_discovery(mqtt_manager):
+    """Forget persisted 'already published' state for configs the broker no longer retains"""
+    global FEEDER_DISCOVERY_DONE, FEEDER_DYNAMIC_DISCOVERY_DONE
+    if CONFIG.device_discovery:
+        aircraft_topic = "homeassistant/device/airplane_{}/config"
+    else:
+        aircraft_topic = "homeassistant/sensor/airplane_{}_" + AIRCRAFT_SENSORS[0]["key"] + "/config"
+    missing = {hex_code for hex_code in DETAILED_DISCOVERY_PUBLISHED
+               if not mqtt_manager.has_retained_discovery(aircraft_topic.format(hex_code))}
+    if missing:
+        DETAILED_DISCOVERY_PUBLISHED.difference_update(missing)
+        log(f"Broker lost discovery configs of {len(missing)} known aircraft - they will be republished")
+    if FEEDER_DISCOVERY_DONE and not mqtt_manager.has_retained_discovery("homeassistant/sensor/airplanes_live_feeder_messages_1min/config"):
+        FEEDER_DISCOVERY_DONE = False
+        FEEDER_DYNAMIC_DISCOVERY_DONE = False
+
 def publish_discovery(mqtt_manager):
     """Publish MQTT discovery for Home Assistant - single device with multiple sensors."""
     log("Starting MQTT discovery publishing...")
+
+    # Learn what the broker already retains so unchanged configs are not sent again
+    reconciled = CONFIG.discovery_reconcile and mqtt_manager.sync_retained_discovery()
+    if reconciled:
+        _reconcile_persisted_discovery(mqtt_manager)
     
     # Define the sensors we want to expose
     sensors = [
@@ -424,7 +1003,7 @@ def publish_discovery(mqtt_manager):
     ]
     
     # Add squawk-related sensors if squawk tracking is enabled
-    if SQUAWK_TRACKING_ENABLED:
+    if CONFIG.squawk_tracking_enabled:
         sensors.extend([
             {
                 "name": "Current Squawk",
@@ -439,7 +1018,7 @@ def publish_discovery(mqtt_manager):
         discovery_topic = f"homeassistant/sensor/airplanes_live_{sensor['key']}/config"
         payload = {
             "name": sensor['name'],  # Remove the "Airplanes Live" prefix to avoid duplication
-            "state_topic": f"{MQTT_TOPIC}/summary",
+            "state_topic": f"{CONFIG.mqtt_topic}/summary",
             "unique_id": f"airplanes_live_{sensor['key']}",
             "value_template": sensor["value_template"],
             "device": {
@@ -458,76 +1037,165 @@ def publish_discovery(mqtt_manager):
         try:
             payload_json = json.dumps(payload)
             log(f"Publishing discovery to {discovery_topic}: {payload_json}")
-            mqtt_manager.publish(discovery_topic, payload_json, retain=True)
+            mqtt_manager.publish_discovery(discovery_topic, payload_json)
             log(f"Published discovery for {sensor['name']}")
         except Exception as e:
             log(f"Error publishing discovery for {sensor['name']}: {e}", "error")
     
     # Publish individual squawk discovery if enabled
-    if SQUAWK_TRACKING_ENABLED:
+    if CONFIG.squawk_tracking_enabled:
         _publish_squawk_discovery(mqtt_manager)
     
+    if CONFIG.tracking_mode == "aggregate":
+        _publish_aggregate_discovery(mqtt_manager)
+
+    if CONFIG.top_n_count > 0:
+        _publish_top_aircraft_discovery(mqtt_manager)
+
+    if CONFIG.statistics_enabled:
+        _publish_statistics_discovery(mqtt_manager)
+
+    if CONFIG.overhead_minutes > 0:
+        _publish_overhead_discovery(mqtt_manager)
+
+    _publish_diagnostic_discovery(mqtt_manager)
+
     # Also publish feeder discovery if enabled
     try:
-        if FEEDER_MONITOR_ENABLED and not FEEDER_DISCOVERY_DONE:
+        if CONFIG.feeder_monitor_enabled and not FEEDER_DISCOVERY_DONE:
             # Call helper that publishes feeder sensors
             _publish_feeder_discovery(mqtt_manager)
     except Exception as e:
         log(f"Error during feeder discovery: {e}", "error")
+
+    if reconciled:
+        mqtt_manager.remove_orphaned_discovery(_is_current_discovery_topic)
     
-    log("Discovery publishing completed")
+    log(f"Discovery publishing completed ({mqtt_manager.discovery_sent} sent, {mqtt_manager.discovery_skipped} unchanged)")
+
+def build_aircraft_state(aircraft) -> Dict[str, Any]:
+    """Per-aircraft state payload published to <mqtt_topic>/aircraft/<hex>/state"""
+    record = lookup_aircraft(aircraft) or {}
+    state = {
+        "hex": aircraft.get('hex', 'unknown'),
+        "flight": (aircraft.get('flight') or 'Unknown').strip(),
+        "altitude": aircraft.get('alt_baro'),
+        "speed": aircraft.get('gs') or aircraft.get('tas') or aircraft.get('ias'),  # Use correct speed fields
+        "track": aircraft.get('track'),
+        "lat": aircraft.get('lat'),
+        "lon": aircraft.get('lon'),
+        "position": f"{aircraft.get('lat')}, {aircraft.get('lon')}" if aircraft.get('lat') is not None and aircraft.get('lon') is not None else "Unknown",
+        "aircraft_type": aircraft.get('t') or record.get('type') or 'Unknown',
+        "registration": aircraft.get('r') or record.get('registration') or 'Unknown',
+        "squawk": aircraft.get('squawk', 'Unknown'),
+        "last_seen": datetime.now().isoformat()
+    }
+    if record:
+        state["operator"] = record.get('operator') or 'Unknown'
+        state["military"] = record['military']
+    return state
+
+# Per-aircraft sensors, one discovery config each (airplane_<hex>_<key>)
+AIRCRAFT_SENSORS = [
+    {
+        "key": "flight",
+        "name": "Flight",
+        "value_template": "{{ value_json.flight }}",
+        "icon": "mdi:airplane",
+    },
+    {
+        "key": "altitude",
+        "name": "Altitude",
+        "value_template": "{{ value_json.altitude }}",
+        "unit": "ft",
+    },
+    {
+        "key": "speed",
+        "name": "Speed",
+        "value_template": "{{ value_json.speed }}",
+        "unit": "kn",
+        "device_class": "speed",
+    },
+    {
+        "key": "track",
+        "name": "Track",
+        "value_template": "{{ value_json.track }}",
+        "unit": "deg",
+    },
+    {
+        "key": "aircraft_type",
+        "name": "Aircraft Type",
+        "value_template": "{{ value_json.aircraft_type }}",
+    },
+    {
+        "key": "registration",
+        "name": "Registration",
+        "value_template": "{{ value_json.registration }}",
+    },
+    {
+        "key": "position",
+        "name": "Position",
+        "value_template": "{{ value_json.position }}",
+        "icon": "mdi:crosshairs-gps",
+    },
+]
+
+# Serialised device discovery payload with @HEX@/@MODEL@/@MANUFACTURER@ tokens: (mqtt_topic, template)
+_AIRCRAFT_DEVICE_TEMPLATE: Optional[tuple] = None
+
+def _aircraft_device_template() -> str:
+    """Build the device-based discovery payload for AIRCRAFT_SENSORS once (again only if mqtt_topic changes)"""
+    global _AIRCRAFT_DEVICE_TEMPLATE
+    if _AIRCRAFT_DEVICE_TEMPLATE is not None and _AIRCRAFT_DEVICE_TEMPLATE[0] == CONFIG.mqtt_topic:
+        return _AIRCRAFT_DEVICE_TEMPLATE[1]
+    state_topic = f"{CONFIG.mqtt_topic}/aircraft/@HEX@/state"
+    components = {}
+    for sensor in AIRCRAFT_SENSORS:
+        component = {
+            "platform": "sensor",
+            "name": sensor["name"],
+            "unique_id": f"airplane_@HEX@_{sensor['key']}",
+            "value_template": sensor["value_template"],
+        }
+        if sensor.get("unit"):
+            component["unit_of_measurement"] = sensor["unit"]
+        if sensor.get("device_class"):
+            component["device_class"] = sensor["device_class"]
+        if sensor.get("icon"):
+            component["icon"] = sensor["icon"]
+        components[f"airplane_@HEX@_{sensor['key']}"] = component
+    payload = {
+        "device": {
+            "identifiers": ["airplane_@HEX@"],
+            "name": "Aircraft @HEX@",
+            "manufacturer": "@MANUFACTURER@",
+            "model": "@MODEL@",
+            "via_device": "airplanes_live_device"
+        },
+        "origin": {"name": "Airplanes Live", "sw_version": get_addon_version()},
+        "components": components,
+        # Shared by every component
+        "state_topic": state_topic,
+        "json_attributes_topic": state_topic,
+        "json_attributes_template": "{{ value_json }}",
+    }
+    _AIRCRAFT_DEVICE_TEMPLATE = (CONFIG.mqtt_topic, json.dumps(payload))
+    return _AIRCRAFT_DEVICE_TEMPLATE[1]
+
+def build_aircraft_device_discovery(hex_code: str, model: str, manufacturer: str) -> str:
+    """One device discovery message covering every per-aircraft sensor"""
+    return (_aircraft_device_template()
+            .replace("@HEX@", hex_code)
+            .replace("@MODEL@", json.dumps(str(model))[1:-1])
+            .replace("@MANUFACTURER@", json.dumps(str(manufacturer))[1:-1]))
 
 def publish_individual_aircraft(mqtt_manager, aircraft_list):
     """Publish individual aircraft data if tracking mode allows it"""
-    if TRACKING_MODE not in ["detailed", "both"]:
+    if CONFIG.tracking_mode not in ["detailed", "both"]:
         return
     
     if not aircraft_list or not isinstance(aircraft_list, list):
         return
-
-    sensor_defs = [
-        {
-            "key": "flight",
-            "name": "Flight",
-            "value_template": "{{ value_json.flight }}",
-            "icon": "mdi:airplane",
-        },
-        {
-            "key": "altitude",
-            "name": "Altitude",
-            "value_template": "{{ value_json.altitude }}",
-            "unit": "ft",
-        },
-        {
-            "key": "speed",
-            "name": "Speed",
-            "value_template": "{{ value_json.speed }}",
-            "unit": "kn",
-            "device_class": "speed",
-        },
-        {
-            "key": "track",
-            "name": "Track",
-            "value_template": "{{ value_json.track }}",
-            "unit": "deg",
-        },
-        {
-            "key": "aircraft_type",
-            "name": "Aircraft Type",
-            "value_template": "{{ value_json.aircraft_type }}",
-        },
-        {
-            "key": "registration",
-            "name": "Registration",
-            "value_template": "{{ value_json.registration }}",
-        },
-        {
-            "key": "position",
-            "name": "Position",
-            "value_template": "{{ value_json.position }}",
-            "icon": "mdi:crosshairs-gps",
-        },
-    ]
     
     log(f"Publishing individual aircraft data for {len(aircraft_list)} aircraft")
     
@@ -539,27 +1207,22 @@ def publish_individual_aircraft(mqtt_manager, aircraft_list):
                 continue
                 
             # Publish aircraft state
-            state_topic = f"{MQTT_TOPIC}/aircraft/{hex_code}/state"
-            state_payload = {
-                "hex": hex_code,
-                "flight": (aircraft.get('flight') or 'Unknown').strip(),
-                "altitude": aircraft.get('alt_baro'),
-                "speed": aircraft.get('gs') or aircraft.get('tas') or aircraft.get('ias'),  # Use correct speed fields
-                "track": aircraft.get('track'),
-                "lat": aircraft.get('lat'),
-                "lon": aircraft.get('lon'),
-                "position": f"{aircraft.get('lat')}, {aircraft.get('lon')}" if aircraft.get('lat') is not None and aircraft.get('lon') is not None else "Unknown",
-                "aircraft_type": aircraft.get('t', 'Unknown'),
-                "registration": aircraft.get('r', 'Unknown'),
-                "squawk": aircraft.get('squawk', 'Unknown'),
-                "last_seen": datetime.now().isoformat()
-            }
+            state_topic = f"{CONFIG.mqtt_topic}/aircraft/{hex_code}/state"
+            state_payload = build_aircraft_state(aircraft)
             
-            mqtt_manager.publish(state_topic, json.dumps(state_payload), retain=True)
+            mqtt_manager.publish(state_topic, json.dumps(state_payload), topic_class="aircraft")
             
             # Publish discovery once per aircraft hex for detailed sensors.
-            if hex_code not in DETAILED_DISCOVERY_PUBLISHED:
-                for sensor in sensor_defs:
+            if hex_code not in DETAILED_DISCOVERY_PUBLISHED and CONFIG.device_discovery:
+                record = lookup_aircraft(aircraft) or {}
+                mqtt_manager.publish_discovery(
+                    f"homeassistant/device/airplane_{hex_code}/config",
+                    build_aircraft_device_discovery(hex_code, state_payload["aircraft_type"], record.get('manufacturer') or "Unknown"),
+                )
+                DETAILED_DISCOVERY_PUBLISHED.add(hex_code)
+            elif hex_code not in DETAILED_DISCOVERY_PUBLISHED:
+                record = lookup_aircraft(aircraft) or {}
+                for sensor in AIRCRAFT_SENSORS:
                     discovery_topic = f"homeassistant/sensor/airplane_{hex_code}_{sensor['key']}/config"
                     discovery_payload = {
                         "name": f"Aircraft {hex_code} {sensor['name']}",
@@ -571,8 +1234,8 @@ def publish_individual_aircraft(mqtt_manager, aircraft_list):
                         "device": {
                             "identifiers": [f"airplane_{hex_code}"],
                             "name": f"Aircraft {hex_code}",
-                            "manufacturer": "Unknown",
-                            "model": aircraft.get('t', 'Unknown'),
+                            "manufacturer": record.get('manufacturer') or "Unknown",
+                            "model": state_payload["aircraft_type"],
                             "via_device": "airplanes_live_device"
                         }
                     }
@@ -582,12 +1245,165 @@ def publish_individual_aircraft(mqtt_manager, aircraft_list):
                         discovery_payload["device_class"] = sensor["device_class"]
                     if sensor.get("icon"):
                         discovery_payload["icon"] = sensor["icon"]
-                    mqtt_manager.publish(discovery_topic, json.dumps(discovery_payload), retain=True)
+                    mqtt_manager.publish_discovery(discovery_topic, json.dumps(discovery_payload))
                 DETAILED_DISCOVERY_PUBLISHED.add(hex_code)
             
         except Exception as e:
             log(f"Error publishing individual aircraft {hex_code}: {e}", "error")
 
+# Columns of the aggregate payload and the API field each one is read from
+AGGREGATE_COLUMNS = [
+    ("hex", "hex"),
+    ("flight", "flight"),
+    ("alt", "alt_baro"),
+    ("gs", "gs"),
+    ("track", "track"),
+    ("squawk", "squawk"),
+    ("type", "t"),
+    ("reg", "r"),
+]
+AGGREGATE_POSITION_SCALE = 100000  # 1e-5 degrees, roughly 1 m
+
+def encode_aircraft_batch(aircraft_list) -> Dict[str, Any]:
+    """Build the columnar aggregate payload for all aircraft in one cycle.
+
+    Positions are quantised to 1e-5 degrees and delta-encoded: the first one
+    relative to the configured centre, each following one relative to the
+    previous positioned row. Rows are ordered by latitude so the deltas stay
+    small. Aircraft without a position get null deltas and do not move the
+    running position.
+    """
+    rows = [a for a in aircraft_list if isinstance(a, dict) and a.get('hex')]
+    rows.sort(key=lambda a: a['lat'] if isinstance(a.get('lat'), (int, float)) else 91.0)
+
+    scale = AGGREGATE_POSITION_SCALE
+    origin = [round(float(CONFIG.latitude) * scale), round(float(CONFIG.longitude) * scale)]
+    columns: Dict[str, List[Any]] = {name: [] for name, _ in AGGREGATE_COLUMNS}
+    dlat: List[Optional[int]] = []
+    dlon: List[Optional[int]] = []
+    prev_lat, prev_lon = origin
+    for aircraft in rows:
+        for name, field in AGGREGATE_COLUMNS:
+            value = aircraft.get(field)
+            if name == "flight" and value:
+                value = value.strip() or None
+            elif name == "gs" and value is None:
+                value = aircraft.get('tas') or aircraft.get('ias')
+            elif name in ("type", "reg") and not value:
+                value = (lookup_aircraft(aircraft) or {}).get("type" if name == "type" else "registration")
+            columns[name].append(value)
+        lat, lon = aircraft.get('lat'), aircraft.get('lon')
+        if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+            dlat.append(None)
+            dlon.append(None)
+            continue
+        qlat, qlon = round(lat * scale), round(lon * scale)
+        dlat.append(qlat - prev_lat)
+        dlon.append(qlon - prev_lon)
+        prev_lat, prev_lon = qlat, qlon
+
+    return {
+        "v": 1,
+        "ts": int(time.time()),
+        "n": len(rows),
+        "scale": scale,
+        "origin": origin,
+        "cols": columns,
+        "dlat": dlat,
+        "dlon": dlon,
+    }
+
+def decode_aircraft_batch(payload) -> List[Dict[str, Any]]:
+    """Expand an aggregate payload (dict, JSON text or zlib bytes) back into one dict per aircraft"""
+    if isinstance(payload, (bytes, bytearray)):
+        if payload[:1] == b"\x78":
+            import zlib
+            payload = zlib.decompress(payload)
+        payload = json.loads(payload)
+    elif isinstance(payload, str):
+        payload = json.loads(payload)
+
+    scale = payload["scale"]
+    prev_lat, prev_lon = payload["origin"]
+    columns = payload["cols"]
+    aircraft_list = []
+    for i in range(payload["n"]):
+        aircraft = {name: columns[name][i] for name in columns}
+        if payload["dlat"][i] is not None:
+            prev_lat += payload["dlat"][i]
+            prev_lon += payload["dlon"][i]
+            aircraft["lat"] = prev_lat / scale
+            aircraft["lon"] = prev_lon / scale
+        aircraft_list.append(aircraft)
+    return aircraft_list
+
+def build_aircraft_map(aircraft_list) -> Dict[str, Any]:
+    """Attributes view of the aggregate payload: positioned aircraft with latitude/longitude keys for map cards"""
+    aircraft = []
+    for a in aircraft_list:
+        if not isinstance(a, dict) or not a.get('hex'):
+            continue
+        if not isinstance(a.get('lat'), (int, float)) or not isinstance(a.get('lon'), (int, float)):
+            continue
+        aircraft.append({
+            "hex": a['hex'],
+            "flight": (a.get('flight') or '').strip() or a['hex'],
+            "latitude": a['lat'],
+            "longitude": a['lon'],
+            "altitude": a.get('alt_baro'),
+            "speed": a.get('gs') or a.get('tas') or a.get('ias'),
+            "track": a.get('track'),
+        })
+    return {
+        "count": len(aircraft),
+        "last_update": datetime.now().isoformat(),
+        "aircraft": aircraft,
+    }
+
+def publish_aircraft_batch(mqtt_manager, aircraft_list):
+    """Publish all aircraft as one aggregate payload plus its map attributes view (aggregate tracking mode)"""
+    if CONFIG.tracking_mode != "aggregate":
+        return
+
+    if not isinstance(aircraft_list, list):
+        return
+
+    try:
+        batch = json.dumps(encode_aircraft_batch(aircraft_list), separators=(",", ":"))
+        if CONFIG.aggregate_compression:
+            import zlib  # only needed when compression is enabled
+            batch = zlib.compress(batch.encode("utf-8"), 6)
+        mqtt_manager.publish(f"{CONFIG.mqtt_topic}/aircraft_batch", batch, topic_class="aggregate")
+
+        aircraft_map = build_aircraft_map(aircraft_list)
+        mqtt_manager.publish(f"{CONFIG.mqtt_topic}/aircraft_map", json.dumps(aircraft_map, separators=(",", ":")),
+                             topic_class="aggregate")
+        log(f"Published aggregate payload for {len(aircraft_list)} aircraft ({len(batch)} bytes)")
+    except Exception as e:
+        log(f"Error publishing aggregate aircraft payload: {e}", "error")
+
+def _publish_aggregate_discovery(mqtt_manager):
+    """Publish the Aircraft Map sensor whose attributes carry every positioned aircraft"""
+    map_topic = f"{CONFIG.mqtt_topic}/aircraft_map"
+    payload = {
+        "name": "Aircraft Map",
+        "state_topic": map_topic,
+        "unique_id": "airplanes_live_aircraft_map",
+        "value_template": "{{ value_json.count }}",
+        "json_attributes_topic": map_topic,
+        "icon": "mdi:radar",
+        "device": {
+            "identifiers": ["airplanes_live_device"],
+            "name": "Airplanes Live",
+            "manufacturer": "BenCos17",
+            "model": "Aircraft Tracker (Powered by airplanes.live)",
+        },
+    }
+    try:
+        mqtt_manager.publish_discovery("homeassistant/sensor/airplanes_live_aircraft_map/config", json.dumps(payload))
+    except Exception as e:
+        log(f"Error publishing aircraft map discovery: {e}", "error")
+
 def extract_squawks(aircraft_list) -> Dict[str, Any]:
     """Extract and track squawk information from aircraft data"""
     global CURRENT_SQUAWK, CURRENT_SQUAWK_AIRCRAFT, TRACKED_SQUAWKS
@@ -632,15 +1448,15 @@ def extract_squawks(aircraft_list) -> Dict[str, Any]:
                 })
                 
                 # Check for special squawks if alerting is enabled
-                if SQUAWK_ALERT_SPECIAL_CODES and squawk in SPECIAL_SQUAWKS:
+                if CONFIG.squawk_alert_special_codes and squawk in CONFIG.special_squawks:
                     special_squawks_detected.append({
                         "squawk": squawk,
-                        "description": SPECIAL_SQUAWKS[squawk],
+                        "description": CONFIG.special_squawks[squawk],
                         "aircraft": flight,
                         "hex": hex_code,
                         "detected": datetime.now().isoformat()
                     })
-                    log(f"ALERT: Special squawk {squawk} ({SPECIAL_SQUAWKS[squawk]}) detected on {flight}", "warning")
+                    log(f"ALERT: Special squawk {squawk} ({CONFIG.special_squawks[squawk]}) detected on {flight}", "warning")
         
         except Exception as e:
             log(f"Error extracting squawk from aircraft: {e}", "error")
@@ -666,7 +1482,7 @@ def extract_squawks(aircraft_list) -> Dict[str, Any]:
     
     # Format output
     if current_squawk_code:
-        description = SPECIAL_SQUAWKS.get(current_squawk_code, "Squawk")
+        description = CONFIG.special_squawks.get(current_squawk_code, "Squawk")
         aircraft_list_str = ", ".join([f"{ac['flight']}" for ac in current_aircraft_list])
         current_squawk_str = f"{current_squawk_code} - {description} ({squawk_counts[current_squawk_code]} aircraft: {aircraft_list_str})"
     else:
@@ -682,7 +1498,7 @@ def extract_squawks(aircraft_list) -> Dict[str, Any]:
 
 def _publish_squawk_discovery(mqtt_manager):
     """Publish MQTT discovery for the current squawk entity"""
-    if not SQUAWK_TRACKING_ENABLED:
+    if not CONFIG.squawk_tracking_enabled:
         return
     
     log("Publishing squawk discovery")
@@ -692,10 +1508,10 @@ def _publish_squawk_discovery(mqtt_manager):
         
         payload = {
             "name": "Current Squawk",
-            "state_topic": f"{MQTT_TOPIC}/current_squawk",
+            "state_topic": f"{CONFIG.mqtt_topic}/current_squawk",
             "unique_id": "airplanes_live_current_squawk",
             "value_template": "{{ value_json.squawk_code }} - {{ value_json.description }} ({{ value_json.aircraft_count }} aircraft: {{ value_json.aircraft_list }})",
-            "json_attributes_topic": f"{MQTT_TOPIC}/current_squawk",
+            "json_attributes_topic": f"{CONFIG.mqtt_topic}/current_squawk",
             "json_attributes_template": "{{ value_json }}",
             "icon": "mdi:radio-tower",
             "device": {
@@ -707,7 +1523,7 @@ def _publish_squawk_discovery(mqtt_manager):
             }
         }
         
-        mqtt_manager.publish(discovery_topic, json.dumps(payload), retain=True)
+        mqtt_manager.publish_discovery(discovery_topic, json.dumps(payload))
         log("Published discovery for current squawk entity")
     
     except Exception as e:
@@ -715,7 +1531,7 @@ def _publish_squawk_discovery(mqtt_manager):
 
 def publish_squawk_state(mqtt_manager, squawk_data):
     """Publish the current active squawk state"""
-    if not SQUAWK_TRACKING_ENABLED:
+    if not CONFIG.squawk_tracking_enabled:
         return
     
     try:
@@ -728,17 +1544,17 @@ def publish_squawk_state(mqtt_manager, squawk_data):
             
             state_payload = {
                 "squawk_code": squawk_code,
-                "description": SPECIAL_SQUAWKS.get(squawk_code, "Squawk"),
+                "description": CONFIG.special_squawks.get(squawk_code, "Squawk"),
                 "aircraft_count": len(aircraft),
                 "aircraft": [{"flight": ac["flight"], "hex": ac["hex"]} for ac in aircraft],
                 "aircraft_list": ",".join([ac["flight"] for ac in aircraft]),
-                "is_special": squawk_code in SPECIAL_SQUAWKS,
+                "is_special": squawk_code in CONFIG.special_squawks,
                 "first_seen": tracking_info.get("first_seen", "Unknown"),
                 "last_seen": datetime.now().isoformat()
             }
             
-            state_topic = f"{MQTT_TOPIC}/current_squawk"
-            mqtt_manager.publish(state_topic, json.dumps(state_payload), retain=True)
+            state_topic = f"{CONFIG.mqtt_topic}/current_squawk"
+            mqtt_manager.publish(state_topic, json.dumps(state_payload), topic_class="squawk")
             log(f"Published current squawk state: {squawk_code}")
         else:
             # No squawk active
@@ -753,232 +1569,754 @@ def publish_squawk_state(mqtt_manager, squawk_data):
                 "last_seen": datetime.now().isoformat()
             }
             
-            state_topic = f"{MQTT_TOPIC}/current_squawk"
-            mqtt_manager.publish(state_topic, json.dumps(state_payload), retain=True)
+            state_topic = f"{CONFIG.mqtt_topic}/current_squawk"
+            mqtt_manager.publish(state_topic, json.dumps(state_payload), topic_class="squawk")
             log("No active squawk to publish")
     
     except Exception as e:
         log(f"Error publishing squawk state: {e}", "error")
 
 
-def publish_summary_data(mqtt_manager, aircraft_list, squawk_data: Optional[Dict[str, Any]] = None):
-    """Publish summary data to MQTT with improved error handling"""
-    try:
-        if not aircraft_list or not isinstance(aircraft_list, list):
-            # No aircraft data
-            summary_payload = {
-                "count": 0,
-                "closest_lowest": "None",
-                "closest_distance": "None",
-                "highest": None,
-                "highest_aircraft": "None",
-                "highest_display": "None",
-                "fastest_ground": 0,
-                "fastest_air": 0,
-                "aircraft_types": "None",
-                "weather": "Unknown",
-                "current_squawk": "None",
-                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+# Diagnostic sensors read from the combined {MQTT_TOPIC}/diagnostics payload
+DIAGNOSTIC_SENSORS = [
+    {
+        "name": "Cycle Work Time",
+        "key": "cycle_work_time",
+        "unit": "ms",
+        "icon": "mdi:timer-outline",
+        "value_template": "{{ value_json.scheduler.last_work_ms }}"
+    },
+    {
+        "name": "Cycle Jitter",
+        "key": "cycle_jitter",
+        "unit": "ms",
+        "icon": "mdi:sine-wave",
+        "value_template": "{{ value_json.scheduler.jitter_ms }}"
+    },
+    {
+        "name": "Cycle Overruns",
+        "key": "cycle_overruns",
+        "unit": None,
+        "icon": "mdi:timer-alert-outline",
+        "value_template": "{{ value_json.scheduler.overruns }}"
+    },
+    {
+        "name": "Skipped Cycles",
+        "key": "cycle_skipped",
+        "unit": None,
+        "icon": "mdi:skip-next-outline",
+        "value_template": "{{ value_json.scheduler.skipped_cycles }}"
+    },
+    {
+        "name": "Topic Alias Hit Rate",
+        "key": "topic_alias_hit_rate",
+        "unit": "%",
+        "icon": "mdi:tag-arrow-right-outline",
+        "value_template": "{{ value_json.mqtt.topic_alias.hit_rate }}"
+    },
+    {
+        "name": "Topic Alias Bytes Saved",
+        "key": "topic_alias_bytes_saved",
+        "unit": "B",
+        "icon": "mdi:content-save-outline",
+        "value_template": "{{ value_json.mqtt.topic_alias.bytes_saved }}"
+    },
+    {
+        "name": "Load Shedding Level",
+        "key": "load_shedding_level",
+        "unit": None,
+        "icon": "mdi:speedometer-slow",
+        "value_template": "{{ value_json.load.level }}",
+        "attributes_template": "{{ value_json.load | tojson }}"
+    },
+    {
+        "name": "API Source",
+        "key": "api_source",
+        "unit": None,
+        "icon": "mdi:swap-horizontal",
+        "value_template": "{{ value_json.api.active }}",
+        "attributes_template": "{{ value_json.api.breakers | tojson }}"
+    }
+]
+
+# Published only while memory_monitor is enabled
+MEMORY_SENSORS = [
+    {
+        "name": "Memory RSS",
+        "key": "memory_rss",
+        "unit": "MB",
+        "icon": "mdi:memory",
+        "value_template": "{{ value_json.memory.rss_mb }}",
+        "attributes_template": "{{ value_json.memory.registries | tojson }}"
+    },
+    {
+        "name": "Memory Growth",
+        "key": "memory_growth",
+        "unit": "MB",
+        "icon": "mdi:chart-line-variant",
+        "value_template": "{{ value_json.memory.growth_mb }}",
+        "attributes_template": "{{ {'top_growth': value_json.memory.top_growth} | tojson }}"
+    },
+    {
+        "name": "Traced Memory",
+        "key": "memory_traced",
+        "unit": "MB",
+        "icon": "mdi:magnify-scan",
+        "value_template": "{{ value_json.memory.traced_mb }}"
+    }
+]
+
+
+def _publish_diagnostic_discovery(mqtt_manager):
+    """Publish MQTT discovery for the diagnostic sensors"""
+    sensors = DIAGNOSTIC_SENSORS + (MEMORY_SENSORS if CONFIG.memory_monitor else [])
+    for sensor in sensors:
+        discovery_topic = f"homeassistant/sensor/airplanes_live_{sensor['key']}/config"
+        payload = {
+            "name": sensor["name"],
+            "state_topic": f"{CONFIG.mqtt_topic}/diagnostics",
+            "unique_id": f"airplanes_live_{sensor['key']}",
+            "value_template": sensor["value_template"],
+            "entity_category": "diagnostic",
+            "icon": sensor["icon"],
+            "device": {
+                "identifiers": ["airplanes_live_device"],
+                "name": "Airplanes Live",
+                "manufacturer": "BenCos17",
+                "model": "Aircraft Tracker (Powered by airplanes.live)",
+                "sw_version": get_addon_version()
             }
-        else:
-            # Process aircraft data
-            count = len(aircraft_list)
-            log(f"Processing {count} aircraft for summary data")
-            
-            # Extract squawk information
-            squawk_data = squawk_data if squawk_data is not None else (
-                extract_squawks(aircraft_list) if SQUAWK_TRACKING_ENABLED else {
-                "current_squawk": "None"
-                }
-            )
-            
-            # Find closest aircraft (lowest altitude)
-            closest_lowest = "None"
-            if aircraft_list:
-                # Filter aircraft with valid altitude data and convert to numbers
-                valid_aircraft = []
-                for ac in aircraft_list:
-                    alt = ac.get('alt_baro')
-                    if alt is not None:
-                        try:
-                            alt_num = float(alt)
-                            valid_aircraft.append((ac, alt_num))
-                        except (ValueError, TypeError):
-                            continue
-                
-                log(f"Found {len(valid_aircraft)} aircraft with valid altitude data")
-                
-                if valid_aircraft:
-                    # Find aircraft with lowest altitude
-                    closest_aircraft, closest_alt = min(valid_aircraft, key=lambda x: x[1])
-                    flight = closest_aircraft.get('flight', 'Unknown')
-                    closest_lowest = f"{flight} ({closest_alt}ft)"
-                else:
-                    # No valid altitude data, use first aircraft
-                    closest_aircraft = aircraft_list[0]
-                    closest_lowest = closest_aircraft.get('flight', 'Unknown')
-            
-            # Find geographically closest aircraft
-            closest_distance = "None"
-            if aircraft_list:
-                # Calculate distance for each aircraft from your location
-                aircraft_distances = []
-                for ac in aircraft_list:
-                    lat = ac.get('lat')
-                    lon = ac.get('lon')
-                    if lat is not None and lon is not None:
-                        try:
-                            # Calculate distance using Haversine formula
-                            lat1, lon1 = float(LATITUDE), float(LONGITUDE)
-                            lat2, lon2 = float(lat), float(lon)
-                            
-                            # Convert to radians
-                            lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-                            
-                            # Haversine formula
-                            dlat = lat2 - lat1
-                            dlon = lon2 - lon1
-                            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-                            c = 2 * math.asin(math.sqrt(a))
-                            distance_km = 6371 * c  # Earth's radius in km
-                            
-                            aircraft_distances.append((ac, distance_km))
-                        except (ValueError, TypeError):
-                            continue
-                
-                log(f"Found {len(aircraft_distances)} aircraft with valid position data")
-                
-                if aircraft_distances:
-                    # Find aircraft with shortest distance
-                    closest_aircraft, closest_dist = min(aircraft_distances, key=lambda x: x[1])
-                    flight = closest_aircraft.get('flight', 'Unknown')
-                    closest_distance = f"{flight} ({closest_dist:.1f}km)"
-                else:
-                    # No valid position data
-                    closest_distance = "Unknown"
-            
-            # Find highest aircraft
-            highest = 0
-            highest_aircraft = None
-            if aircraft_list:
-                altitudes = []
-                for ac in aircraft_list:
-                    alt = ac.get('alt_baro')
-                    if alt is not None:
-                        try:
-                            alt_num = float(alt)
-                            altitudes.append((ac, alt_num))
-                        except (ValueError, TypeError):
-                            continue
-                
-                log(f"Found {len(altitudes)} valid altitude values")
-                if altitudes:
-                    # Find aircraft with highest altitude
-                    highest_aircraft, highest = max(altitudes, key=lambda x: x[1])
-                    log(f"Highest altitude: {highest}ft")
-                else:
-                    log("No valid altitude data found")
-            
-            # Find fastest aircraft (ground speed)
-            fastest_ground = 0
-            if aircraft_list:
-                ground_speeds = []
-                for ac in aircraft_list:
-                    speed = ac.get('gs')  # Ground speed
-                    if speed is not None:
-                        try:
-                            speed_num = float(speed)
-                            ground_speeds.append(speed_num)
-                        except (ValueError, TypeError):
-                            continue
-                
-                log(f"Found {len(ground_speeds)} valid ground speed values")
-                if ground_speeds:
-                    fastest_ground = max(ground_speeds)
-                    log(f"Fastest ground speed: {fastest_ground}kts")
-                else:
-                    log("No valid ground speed data found")
-            
-            # Find fastest aircraft (air speed)
-            fastest_air = 0
-            if aircraft_list:
-                air_speeds = []
-                for ac in aircraft_list:
-                    # Try airspeed fields
-                    speed = ac.get('tas')  # True airspeed
-                    if speed is None:
-                        speed = ac.get('ias')  # Indicated airspeed
-                    
-                    if speed is not None:
-                        try:
-                            speed_num = float(speed)
-                            air_speeds.append(speed_num)
-                        except (ValueError, TypeError):
-                            continue
-                
-                log(f"Found {len(air_speeds)} valid air speed values")
-                if air_speeds:
-                    fastest_air = max(air_speeds)
-                    log(f"Fastest air speed: {fastest_air}kts")
-                else:
-                    log("No valid air speed data found")
-            
-            # Collect aircraft types
-            aircraft_types = []
-            if aircraft_list:
-                for ac in aircraft_list:
-                    ac_type = ac.get('t')  # Aircraft type code
-                    ac_desc = ac.get('desc')  # Full description
-                    if ac_type and ac_type not in aircraft_types:
-                        aircraft_types.append(ac_type)
-            
-            # Collect weather conditions
-            weather_info = "Unknown"
-            if aircraft_list:
-                # Get weather data from first aircraft with valid data
-                for ac in aircraft_list:
-                    wind_dir = ac.get('wd')
-                    wind_speed = ac.get('ws')
-                    temp = ac.get('oat')
-                    if wind_dir is not None or wind_speed is not None or temp is not None:
-                        weather_parts = []
-                        if wind_dir is not None:
-                            weather_parts.append(f"Wind: {wind_dir}°")
-                        if wind_speed is not None:
-                            weather_parts.append(f"{wind_speed}kts")
-                        if temp is not None:
-                            weather_parts.append(f"Temp: {temp}°C")
-                        weather_info = " | ".join(weather_parts)
-                        break
-            
-            # Convert speeds from knots to km/h (1 knot = 1.852 km/h)
-            fastest_ground_kmh = fastest_ground * 1.852 if fastest_ground > 0 else 0
-            fastest_air_kmh = fastest_air * 1.852 if fastest_air > 0 else 0
-            
+        }
+        if sensor["unit"]:
+            payload["unit_of_measurement"] = sensor["unit"]
+            payload["state_class"] = "measurement"
+        if sensor.get("attributes_template"):
+            payload["json_attributes_topic"] = f"{CONFIG.mqtt_topic}/diagnostics"
+            payload["json_attributes_template"] = sensor["attributes_template"]
+        try:
+            mqtt_manager.publish_discovery(discovery_topic, json.dumps(payload))
+        except Exception as e:
+            log(f"Error publishing diagnostic discovery for {sensor['name']}: {e}", "error")
+    log(f"Published discovery for {len(sensors)} diagnostic sensors")
+
+
+def publish_diagnostics(mqtt_manager, diagnostics: Dict[str, Any]):
+    """Publish the combined diagnostics payload (one message per cycle)"""
+    try:
+        mqtt_manager.publish(f"{CONFIG.mqtt_topic}/diagnostics", json.dumps(diagnostics), topic_class="diagnostics")
+    except Exception as e:
+        log(f"Error publishing diagnostics: {e}", "error")
+
+
+TOP_AIRCRAFT_SENSORS = [
+    {"key": "nearest", "name": "Nearest Aircraft", "icon": "mdi:map-marker-radius"},
+    {"key": "lowest", "name": "Lowest Aircraft", "icon": "mdi:airplane-landing"},
+    {"key": "fastest", "name": "Fastest Aircraft", "icon": "mdi:speedometer"},
+]
+
+def _top_entry(aircraft, distance_km: Optional[float] = None) -> Dict[str, Any]:
+    entry = {
+        "hex": aircraft.get('hex'),
+        "flight": (aircraft.get('flight') or 'Unknown').strip(),
+        "type": aircraft.get('t') or (lookup_aircraft(aircraft) or {}).get('type'),
+        "altitude": aircraft.get('alt_baro'),
+        "speed": round(float(aircraft['gs']) * 1.852, 1) if isinstance(aircraft.get('gs'), (int, float)) else None,
+        "latitude": aircraft.get('lat'),
+        "longitude": aircraft.get('lon'),
+    }
+    if distance_km is not None:
+        entry["distance"] = round(distance_km, 1)
+    return entry
+
+def publish_top_aircraft(mqtt_manager, nearest_list, lowest_list, fastest_list):
+    """Publish the nearest/lowest/fastest top-N lists selected during the summary pass"""
+    payload = {
+        "nearest": [_top_entry(ac, dist) for ac, dist in nearest_list],
+        "lowest": [_top_entry(ac) for ac, _ in lowest_list],
+        "fastest": [_top_entry(ac) for ac, _ in fastest_list],
+    }
+    mqtt_manager.publish(f"{CONFIG.mqtt_topic}/top", json.dumps(payload), topic_class="summary")
+
+def _publish_top_aircraft_discovery(mqtt_manager):
+    """Top-N sensors: state is the first aircraft, attributes hold the whole list (speed km/h, distance km)"""
+    for sensor in TOP_AIRCRAFT_SENSORS:
+        key = sensor["key"]
+        payload = {
+            "name": f"{sensor['name']} (Top {CONFIG.top_n_count})",
+            "state_topic": f"{CONFIG.mqtt_topic}/top",
+            "unique_id": f"airplanes_live_top_{key}",
+            "value_template": f"{{{{ value_json.{key}[0].flight if value_json.{key} else 'None' }}}}",
+            "json_attributes_topic": f"{CONFIG.mqtt_topic}/top",
+            "json_attributes_template": f"{{{{ {{'aircraft': value_json.{key}}} | tojson }}}}",
+            "icon": sensor["icon"],
+            "device": {
+                "identifiers": ["airplanes_live_device"],
+                "name": "Airplanes Live",
+                "manufacturer": "BenCos17",
+                "model": "Aircraft Tracker (Powered by airplanes.live)",
+            },
+        }
+        try:
+            mqtt_manager.publish_discovery(f"homeassistant/sensor/airplanes_live_top_{key}/config", json.dumps(payload))
+        except Exception as e:
+            log(f"Error publishing top aircraft discovery for {key}: {e}", "error")
+
+STATISTICS_SENSORS = [
+    {"key": "unique_hour", "name": "Unique Aircraft (This Hour)", "icon": "mdi:airplane-search", "unit": "aircraft"},
+    {"key": "unique_today", "name": "Unique Aircraft (Today)", "icon": "mdi:airplane-search", "unit": "aircraft"},
+    {"key": "unique_24h", "name": "Unique Aircraft (24h)", "icon": "mdi:airplane-search", "unit": "aircraft"},
+    {"key": "busiest_hour", "name": "Busiest Hour", "icon": "mdi:chart-bar", "unit": None,
+     "attributes": "hourly_mean_aircraft"},
+    {"key": "most_common_type", "name": "Most Common Type", "icon": "mdi:airplane", "unit": None,
+     "attributes": "top_types"},
+    {"key": "max_range", "name": "Max Range", "icon": "mdi:radar", "unit": "km",
+     "attributes": "max_range_aircraft"},
+]
+
+def _publish_statistics_discovery(mqtt_manager):
+    """Publish MQTT discovery for the rolling traffic statistics sensors"""
+    for sensor in STATISTICS_SENSORS:
+        payload = {
+            "name": sensor["name"],
+            "state_topic": f"{CONFIG.mqtt_topic}/stats",
+            "unique_id": f"airplanes_live_stats_{sensor['key']}",
+            "value_template": f"{{{{ value_json.{sensor['key']} }}}}",
+            "icon": sensor["icon"],
+            "device": {
+                "identifiers": ["airplanes_live_device"],
+                "name": "Airplanes Live",
+                "manufacturer": "BenCos17",
+                "model": "Aircraft Tracker (Powered by airplanes.live)",
+            },
+        }
+        if sensor["unit"]:
+            payload["unit_of_measurement"] = sensor["unit"]
+            payload["state_class"] = "measurement"
+        if sensor.get("attributes"):
+            payload["json_attributes_topic"] = f"{CONFIG.mqtt_topic}/stats"
+            payload["json_attributes_template"] = f"{{{{ value_json.{sensor['attributes']} | tojson }}}}"
+        try:
+            mqtt_manager.publish_discovery(f"homeassistant/sensor/airplanes_live_stats_{sensor['key']}/config", json.dumps(payload))
+        except Exception as e:
+            log(f"Error publishing statistics discovery for {sensor['name']}: {e}", "error")
+
+OVERHEAD_SENSORS = [
+    {"key": "flight", "name": "Next Overhead", "icon": "mdi:airplane-clock", "unit": None, "device_class": None},
+    {"key": "time", "name": "Next Overhead Time", "icon": "mdi:clock-outline", "unit": None, "device_class": "timestamp"},
+    {"key": "distance", "name": "Next Overhead Distance", "icon": "mdi:map-marker-distance", "unit": "km", "device_class": None},
+    {"key": "altitude", "name": "Next Overhead Altitude", "icon": "mdi:altimeter", "unit": "ft", "device_class": None},
+]
+
+def _publish_overhead_discovery(mqtt_manager):
+    """Next overhead sensors; the first also carries the upcoming passes and the closest pass as attributes"""
+    for index, sensor in enumerate(OVERHEAD_SENSORS):
+        key = sensor["key"]
+        fallback = "'None'" if key == "flight" else "none"
+        payload = {
+            "name": sensor["name"],
+            "state_topic": f"{CONFIG.mqtt_topic}/overhead",
+            "unique_id": f"airplanes_live_overhead_{key}",
+            "value_template": f"{{{{ value_json.next.{key} if value_json.next else {fallback} }}}}",
+            "icon": sensor["icon"],
+            "device": {
+                "identifiers": ["airplanes_live_device"],
+                "name": "Airplanes Live",
+                "manufacturer": "BenCos17",
+                "model": "Aircraft Tracker (Powered by airplanes.live)",
+            },
+        }
+        if sensor["unit"]:
+            payload["unit_of_measurement"] = sensor["unit"]
+        if sensor["device_class"]:
+            payload["device_class"] = sensor["device_class"]
+        if index == 0:
+            payload["json_attributes_topic"] = f"{CONFIG.mqtt_topic}/overhead"
+            payload["json_attributes_template"] = "{{ {'upcoming': value_json.upcoming, 'closest_pass': value_json.closest_pass} | tojson }}"
+        try:
+            mqtt_manager.publish_discovery(f"homeassistant/sensor/airplanes_live_overhead_{key}/config", json.dumps(payload))
+        except Exception as e:
+            log(f"Error publishing overhead discovery for {key}: {e}", "error")
+
+class OverflightPredictor:
+    """Closest point of approach (CPA) of every aircraft to the configured location.
+
+    Positions are projected onto a local east/north plane around the
+    observer, which is accurate well beyond the API radius, and each
+    aircraft is extrapolated along its ground speed and track. The time of
+    CPA is kept as an absolute epoch, so an aircraft whose position, speed,
+    track and altitude did not change since the last cycle reuses its
+    previous result instead of being solved again, until that CPA time has
+    passed: the API repeats stale positions unchanged, and those are solved
+    afresh rather than reporting a pass that is already over.
+    """
+
+    EARTH_RADIUS_KM = 6371.0
+    KNOTS_TO_KM_S = 1.852 / 3600
+
+    def __init__(self, latitude: float, longitude: float, horizon_s: float, radius_km: float):
+        self.lat0 = math.radians(float(latitude))
+        self.lon0 = math.radians(float(longitude))
+        self.cos_lat0 = math.cos(self.lat0)
+        self.horizon_s = horizon_s
+        self.radius_km = radius_km
+        # hex -> (inputs, result) for the aircraft of the last cycle only
+        self.cache: Dict[str, tuple] = {}
+        self.solved = 0
+        self.reused = 0
+        self.last_payload: Optional[str] = None
+
+    def _solve(self, lat, lon, gs, track, alt, baro_rate, now: float):
+        """(cpa_epoch, cpa_km, cpa_altitude_ft, distance_now_km), or None if it is not approaching"""
+        if alt == "ground":
+            return None
+        try:
+            speed = float(gs) * self.KNOTS_TO_KM_S
+            heading = math.radians(float(track))
+            # Wrap the longitude difference so the antimeridian does not put aircraft on the far side of the planet
+            dlon = (math.radians(float(lon)) - self.lon0 + math.pi) % (2 * math.pi) - math.pi
+            east = self.EARTH_RADIUS_KM * dlon * self.cos_lat0
+            north = self.EARTH_RADIUS_KM * (math.radians(float(lat)) - self.lat0)
+        except (TypeError, ValueError):
+            return None
+        if speed <= 0:
+            return None
+        v_east = speed * math.sin(heading)
+        v_north = speed * math.cos(heading)
+        tcpa = -(east * v_east + north * v_north) / (speed * speed)
+        if tcpa < 0:
+            return None  # Already past its closest point
+        cpa_km = math.hypot(east + v_east * tcpa, north + v_north * tcpa)
+        altitude = alt if isinstance(alt, (int, float)) else None
+        if altitude is not None and isinstance(baro_rate, (int, float)):
+            altitude = max(0.0, altitude + baro_rate * tcpa / 60)
+        return now + tcpa, cpa_km, altitude, math.hypot(east, north)
+
+    def update(self, aircraft_list, now: float):
+        """Return (result, aircraft) for every aircraft approaching the observer"""
+        cache = {}
+        passes = []
+        for ac in aircraft_list:
+            hex_code = ac.get('hex')
+            if not hex_code:
+                continue
+            inputs = (ac.get('lat'), ac.get('lon'), ac.get('gs'), ac.get('track'), ac.get('alt_baro'), ac.get('baro_rate'))
+            cached = self.cache.get(hex_code)
+            if cached is not None and cached[0] == inputs and (cached[1] is None or cached[1][0] >= now):
+                result = cached[1]
+                self.reused += 1
+            else:
+                result = self._solve(*inputs, now)
+                self.solved += 1
+            cache[hex_code] = (inputs, result)
+            if result is not None:
+                passes.append((result, ac))
+        self.cache = cache
+        return passes
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"tracked": len(self.cache), "solved": self.solved, "reused": self.reused}
+
+
+def _overhead_entry(result, aircraft) -> Dict[str, Any]:
+    cpa_epoch, cpa_km, altitude, distance_km = result
+    return {
+        "hex": aircraft.get('hex'),
+        "flight": (aircraft.get('flight') or 'Unknown').strip(),
+        "type": aircraft.get('t') or (lookup_aircraft(aircraft) or {}).get('type'),
+        "time": datetime.fromtimestamp(cpa_epoch, timezone.utc).isoformat(timespec="seconds"),
+        "distance": round(cpa_km, 1),
+        "altitude": int(round(altitude)) if altitude is not None else None,
+        "current_distance": round(distance_km, 1),
+    }
+
+def publish_overhead_prediction(mqtt_manager, aircraft_list):
+    """Publish the next passes within overhead_radius and the closest pass over the next overhead_minutes"""
+    now = time.time()
+    horizon = OVERHEAD.horizon_s
+    in_horizon = [(result, ac) for result, ac in OVERHEAD.update(aircraft_list, now) if 0 <= result[0] - now <= horizon]
+    upcoming = sorted((p for p in in_horizon if p[0][1] <= OVERHEAD.radius_km), key=lambda p: p[0][0])[:10]
+    closest = min(in_horizon, key=lambda p: p[0][1], default=None)
+    payload = json.dumps({
+        "next": _overhead_entry(*upcoming[0]) if upcoming else None,
+        "upcoming": [_overhead_entry(*p) for p in upcoming],
+        "closest_pass": _overhead_entry(*closest) if closest else None,
+    })
+    # Predictions of stale positions do not move; leave the retained state alone then
+    if payload != OVERHEAD.last_payload and mqtt_manager.publish(f"{CONFIG.mqtt_topic}/overhead", payload, topic_class="summary"):
+        OVERHEAD.last_payload = payload
+
+class SummaryAccumulator:
+    """Mergeable summary statistics over all or part of one cycle's aircraft.
+
+    add() takes (index, aircraft) pairs, where index is the position in the
+    full aircraft list. Ties are broken by that index, so merging the
+    accumulators of several shards (worker mode) gives exactly the result
+    of a single pass over the whole list. Only the top-N candidates keep
+    references to aircraft, so a partial accumulator is small to send
+    between processes.
+    """
+
+    def __init__(self, top_n: int = 1):
+        self.top_n = max(top_n, 1)
+        self.count = 0
+        self.first: Optional[tuple] = None  # (index, aircraft): fallback for the lowest aircraft
+        self.lowest: List[tuple] = []  # (altitude, index, aircraft), ascending
+        self.highest: Optional[tuple] = None  # (-altitude, index, aircraft)
+        self.nearest: List[tuple] = []  # (distance_km, index, aircraft), ascending
+        self.furthest: Optional[tuple] = None  # (-distance_km, index, aircraft)
+        self.fastest: List[tuple] = []  # (-ground_speed, index, aircraft)
+        self.fastest_air = 0
+        self.types: Set[str] = set()  # published sorted, so response order cannot change the summary
+        self.weather: Optional[tuple] = None  # (index, text) of the first aircraft reporting weather
+        self.counts = {"altitude": 0, "position": 0, "ground_speed": 0, "air_speed": 0}
+
+    def add(self, indexed_aircraft):
+        """Single pass over (index, aircraft) pairs; every statistic selects from the lists built here"""
+        lat1, lon1 = math.radians(float(CONFIG.latitude)), math.radians(float(CONFIG.longitude))
+        cos_lat1 = math.cos(lat1)
+        altitudes = []
+        distances = []
+        ground_speeds = []
+        air_speeds = []
+        types = self.types
+        weather = self.weather
+        for index, ac in indexed_aircraft:
+            self.count += 1
+            if self.first is None or index < self.first[0]:
+                self.first = (index, ac)
+
+            alt = ac.get('alt_baro')
+            if alt is not None:
+                try:
+                    altitudes.append((float(alt), index, ac))
+                except (ValueError, TypeError):
+                    pass
+
+            lat = ac.get('lat')
+            lon = ac.get('lon')
+            if lat is not None and lon is not None:
+                try:
+                    # Haversine distance from your location
+                    lat2, lon2 = math.radians(float(lat)), math.radians(float(lon))
+                    a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+                    distances.append((6371 * 2 * math.asin(math.sqrt(a)), index, ac))  # Earth's radius in km
+                except (ValueError, TypeError):
+                    pass
+
+            speed = ac.get('gs')  # Ground speed
+            if speed is not None:
+                try:
+                    ground_speeds.append((-float(speed), index, ac))
+                except (ValueError, TypeError):
+                    pass
+
+            # Try airspeed fields
+            speed = ac.get('tas')  # True airspeed
+            if speed is None:
+                speed = ac.get('ias')  # Indicated airspeed
+            if speed is not None:
+                try:
+                    air_speeds.append(float(speed))
+                except (ValueError, TypeError):
+                    pass
+
+            ac_type = ac.get('t') or (lookup_aircraft(ac) or {}).get('type')  # Aircraft type code
+            if ac_type:
+                types.add(ac_type)
+
+            if weather is None or index < weather[0]:
+                wind_dir = ac.get('wd')
+                wind_speed = ac.get('ws')
+                temp = ac.get('oat')
+                if wind_dir is not None or wind_speed is not None or temp is not None:
+                    weather_parts = []
+                    if wind_dir is not None:
+                        weather_parts.append(f"Wind: {wind_dir}°")
+                    if wind_speed is not None:
+                        weather_parts.append(f"{wind_speed}kts")
+                    if temp is not None:
+                        weather_parts.append(f"Temp: {temp}°C")
+                    weather = (index, " | ".join(weather_parts))
+        self.weather = weather
+
+        self.counts["altitude"] += len(altitudes)
+        self.counts["position"] += len(distances)
+        self.counts["ground_speed"] += len(ground_speeds)
+        self.counts["air_speed"] += len(air_speeds)
+        # Bounded heap selection: O(n log N) for the top-N lists
+        self.lowest = heapq.nsmallest(self.top_n, self.lowest + altitudes, key=lambda x: x[:2])
+        self.nearest = heapq.nsmallest(self.top_n, self.nearest + distances, key=lambda x: x[:2])
+        self.fastest = heapq.nsmallest(self.top_n, self.fastest + ground_speeds, key=lambda x: x[:2])
+        highest = min(((-alt, index, ac) for alt, index, ac in altitudes), key=lambda x: x[:2], default=None)
+        furthest = min(((-dist, index, ac) for dist, index, ac in distances), key=lambda x: x[:2], default=None)
+        self.highest = self._first_of(self.highest, highest)
+        self.furthest = self._first_of(self.furthest, furthest)
+        if air_speeds:
+            self.fastest_air = max(self.fastest_air, max(air_speeds))
+        return self
+
+    @staticmethod
+    def _first_of(a: Optional[tuple], b: Optional[tuple]) -> Optional[tuple]:
+        if a is None or (b is not None and b[:2] < a[:2]):
+            return b
+        return a
+
+    def merge(self, other: "SummaryAccumulator") -> "SummaryAccumulator":
+        self.count += other.count
+        if other.first is not None and (self.first is None or other.first[0] < self.first[0]):
+            self.first = other.first
+        self.lowest = heapq.nsmallest(self.top_n, self.lowest + other.lowest, key=lambda x: x[:2])
+        self.nearest = heapq.nsmallest(self.top_n, self.nearest + other.nearest, key=lambda x: x[:2])
+        self.fastest = heapq.nsmallest(self.top_n, self.fastest + other.fastest, key=lambda x: x[:2])
+        self.highest = self._first_of(self.highest, other.highest)
+        self.furthest = self._first_of(self.furthest, other.furthest)
+        self.fastest_air = max(self.fastest_air, other.fastest_air)
+        self.types |= other.types
+        if other.weather is not None and (self.weather is None or other.weather[0] < self.weather[0]):
+            self.weather = other.weather
+        for key, value in other.counts.items():
+            self.counts[key] += value
+        return self
+
+    def top_lists(self):
+        """(nearest, lowest, fastest) as (aircraft, value) pairs for publish_top_aircraft()"""
+        return (
+            [(ac, dist) for dist, _, ac in self.nearest],
+            [(ac, alt) for alt, _, ac in self.lowest],
+            [(ac, -speed) for speed, _, ac in self.fastest],
+        )
+
+    def furthest_aircraft(self) -> Optional[tuple]:
+        """(aircraft, distance_km) of the furthest aircraft, for the traffic statistics"""
+        if self.furthest is None:
+            return None
+        return self.furthest[2], -self.furthest[0]
+
+    def to_payload(self, squawk_data: Dict[str, Any]) -> Dict[str, Any]:
+        log(f"Found {self.counts['altitude']} aircraft with valid altitude data, {self.counts['position']} with valid position data, "
+            f"{self.counts['ground_speed']} ground speeds and {self.counts['air_speed']} air speeds")
+
+        # Find closest aircraft (lowest altitude)
+        if self.lowest:
+            closest_alt, _, closest_aircraft = self.lowest[0]
+            flight = closest_aircraft.get('flight', 'Unknown')
+            closest_lowest = f"{flight} ({closest_alt}ft)"
+        else:
+            # No valid altitude data, use first aircraft
+            closest_lowest = self.first[1].get('flight', 'Unknown')
+
+        # Find geographically closest aircraft
+        if self.nearest:
+            closest_dist, _, closest_aircraft = self.nearest[0]
+            flight = closest_aircraft.get('flight', 'Unknown')
+            closest_distance = f"{flight} ({closest_dist:.1f}km)"
+        else:
+            # No valid position data
+            closest_distance = "Unknown"
+
+        # Find highest aircraft
+        highest = 0
+        highest_aircraft = None
+        if self.highest is not None:
+            highest, highest_aircraft = -self.highest[0], self.highest[2]
+            log(f"Highest altitude: {highest}ft")
+        else:
+            log("No valid altitude data found")
+
+        # Find fastest aircraft (ground and air speed)
+        fastest_ground = -self.fastest[0][0] if self.fastest else 0
+        fastest_air = self.fastest_air
+        log(f"Fastest ground speed: {fastest_ground}kts, fastest air speed: {fastest_air}kts")
+
+        aircraft_types = sorted(self.types)
+        weather_info = self.weather[1] if self.weather else "Unknown"
+
+        # Convert speeds from knots to km/h (1 knot = 1.852 km/h)
+        fastest_ground_kmh = fastest_ground * 1.852 if fastest_ground > 0 else 0
+        fastest_air_kmh = fastest_air * 1.852 if fastest_air > 0 else 0
+
+        return {
+            "count": self.count,
+            "closest_lowest": closest_lowest,
+            "closest_distance": closest_distance,
+            # Keep this numeric because the HA sensor uses unit_of_measurement=ft.
+            "highest": highest if highest_aircraft else None,
+            "highest_aircraft": highest_aircraft.get('flight', 'Unknown').strip() if highest_aircraft else "None",
+            "highest_display": f"{highest_aircraft.get('flight', 'Unknown').strip()} ({highest}ft)" if highest_aircraft else "None",
+            "fastest_ground": fastest_ground_kmh,
+            "fastest_air": fastest_air_kmh,
+            "aircraft_types": ", ".join(aircraft_types) if aircraft_types else "Unknown",
+            "weather": weather_info,
+            "current_squawk": squawk_data.get("current_squawk", "None"),
+            "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+
+# Summary fields that make a publish worthwhile and how far each may move
+# first: 0 means any change, otherwise every number in the value (altitudes
+# in ft, distances in km, speeds in km/h, weather readings) may drift by up
+# to the tolerance. Fields not listed, such as last_update, never count.
+SUMMARY_CHANGE_RULES = {
+    "count": 0,
+    "current_squawk": 0,
+    "aircraft_types": 0,
+    "highest_aircraft": 0,
+    "closest_lowest": 500,
+    "highest": 500,
+    "highest_display": 500,
+    "closest_distance": 1.0,
+    "fastest_ground": 25,
+    "fastest_air": 25,
+    "weather": 5,
+}
+
+
+class SummaryChangeDetector:
+    """Decide whether a summary differs materially from the last one published.
+
+    Each new summary is compared with the last published payload, not the
+    previous cycle, so slow drift still adds up to a publish. A summary older
+    than max_age seconds is republished regardless so last_update moves.
+    """
+
+    # Numbers standing on their own; digits inside callsigns are part of the text
+    NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?")
+
+    def __init__(self, max_age: int, rules: Optional[Dict[str, float]] = None):
+        self.max_age = max_age
+        self.rules = SUMMARY_CHANGE_RULES if rules is None else rules
+        self.last_payload: Optional[Dict[str, Any]] = None
+        self.last_published = 0.0
+        self.published = 0
+        self.suppressed = 0
+        self.last_reason: Optional[str] = None
+
+    def _split(self, value):
+        """Split a value into its text with numbers masked, and the numbers."""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return "", [float(value)]
+        text = str(value)
+        return self.NUMBER.sub("#", text), [float(n) for n in self.NUMBER.findall(text)]
+
+    def _differs(self, old, new, tolerance) -> bool:
+        if tolerance == 0:
+            return old != new
+        old_text, old_numbers = self._split(old)
+        new_text, new_numbers = self._split(new)
+        if old_text != new_text or len(old_numbers) != len(new_numbers):
+            return True
+        return any(abs(a - b) > tolerance for a, b in zip(old_numbers, new_numbers))
+
+    def check(self, payload: Dict[str, Any]) -> Optional[str]:
+        """Return why payload should be published, or None to skip it."""
+        if self.last_payload is None:
+            return "first summary"
+        if self.max_age and time.monotonic() - self.last_published >= self.max_age:
+            return "max age"
+        changed = [field for field, tolerance in self.rules.items()
+                   if self._differs(self.last_payload.get(field), payload.get(field), tolerance)]
+        if changed:
+            return ", ".join(changed)
+        self.suppressed += 1
+        return None
+
+    def record(self, payload: Dict[str, Any], reason: str):
+        """Remember payload as the one now on the broker."""
+        self.last_payload = payload
+        self.last_published = time.monotonic()
+        self.last_reason = reason
+        self.published += 1
+
+    def reset(self):
+        """Forget the last publish so the next summary goes out."""
+        self.last_payload = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_age": self.max_age,
+            "published": self.published,
+            "suppressed": self.suppressed,
+            "last_reason": self.last_reason,
+        }
+
+
+def publish_summary_data(mqtt_manager, aircraft_list, squawk_data: Optional[Dict[str, Any]] = None,
+                         accumulator: Optional[SummaryAccumulator] = None):
+    """Publish summary data to MQTT with improved error handling
+
+    accumulator carries statistics already computed elsewhere (merged worker
+    partials); without it they are computed here in one pass.
+    """
+    try:
+        if not aircraft_list or not isinstance(aircraft_list, list):
+            # No aircraft data
             summary_payload = {
-                "count": count,
-                "closest_lowest": closest_lowest,
-                "closest_distance": closest_distance,
-                # Keep this numeric because the HA sensor uses unit_of_measurement=ft.
-                "highest": highest if highest_aircraft else None,
-                "highest_aircraft": highest_aircraft.get('flight', 'Unknown').strip() if highest_aircraft else "None",
-                "highest_display": f"{highest_aircraft.get('flight', 'Unknown').strip()} ({highest}ft)" if highest_aircraft else "None",
-                "fastest_ground": fastest_ground_kmh,
-                "fastest_air": fastest_air_kmh,
-                "aircraft_types": ", ".join(aircraft_types) if aircraft_types else "Unknown",
-                "weather": weather_info,
-                "current_squawk": squawk_data.get("current_squawk", "None"),
+                "count": 0,
+                "closest_lowest": "None",
+                "closest_distance": "None",
+                "highest": None,
+                "highest_aircraft": "None",
+                "highest_display": "None",
+                "fastest_ground": 0,
+                "fastest_air": 0,
+                "aircraft_types": "None",
+                "weather": "Unknown",
+                "current_squawk": "None",
                 "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
+            accumulator = SummaryAccumulator()
+        else:
+            # Process aircraft data
+            count = len(aircraft_list)
+            log(f"Processing {count} aircraft for summary data")
+            
+            # Extract squawk information
+            squawk_data = squawk_data if squawk_data is not None else (
+                extract_squawks(aircraft_list) if CONFIG.squawk_tracking_enabled else {
+                "current_squawk": "None"
+                }
+            )
+
+            if accumulator is None:
+                accumulator = SummaryAccumulator(CONFIG.top_n_count).add(enumerate(aircraft_list))
+            summary_payload = accumulator.to_payload(squawk_data)
         
         # Debug: Log the summary payload structure
         log(f"Summary payload keys: {list(summary_payload.keys())}")
         
-        # Publish summary data
-        summary_topic = f"{MQTT_TOPIC}/summary"
-        mqtt_manager.publish(summary_topic, json.dumps(summary_payload), retain=True)
+        # Publish summary data, unless nothing moved enough to be worth a recorder entry
+        summary_topic = f"{CONFIG.mqtt_topic}/summary"
+        reason = SUMMARY_CHANGES.check(summary_payload) if SUMMARY_CHANGES is not None else "every cycle"
+        if reason is None:
+            log("Summary unchanged - skipping publish", "debug")
+        elif mqtt_manager.publish(summary_topic, json.dumps(summary_payload), topic_class="summary"):
+            if SUMMARY_CHANGES is not None:
+                SUMMARY_CHANGES.record(summary_payload, reason)
+                log(f"Summary published ({reason})", "debug")
+
+        if CONFIG.top_n_count > 0:
+            try:
+                publish_top_aircraft(mqtt_manager, *accumulator.top_lists())
+            except Exception as e:
+                log(f"Error publishing top aircraft lists: {e}", "error")
+
+        if OVERHEAD is not None:
+            try:
+                publish_overhead_prediction(mqtt_manager, aircraft_list if isinstance(aircraft_list, list) else [])
+            except Exception as e:
+                log(f"Error publishing overhead prediction: {e}", "error")
+
+        if TRAFFIC_STATS is not None:
+            try:
+                # A failed fetch is not a cycle without aircraft; counting it would drag the hourly means down
+                if aircraft_list is not None:
+                    TRAFFIC_STATS.observe(aircraft_list if isinstance(aircraft_list, list) else [], accumulator.furthest_aircraft())
+                mqtt_manager.publish(f"{CONFIG.mqtt_topic}/stats", json.dumps(TRAFFIC_STATS.snapshot()), topic_class="summary")
+            except Exception as e:
+                log(f"Error updating traffic statistics: {e}", "error")
         
-        log(f"Published summary: {summary_payload.get('count', 'N/A')} aircraft, lowest: {summary_payload.get('closest_lowest', 'N/A')}, closest: {summary_payload.get('closest_distance', 'N/A')}, highest: {summary_payload.get('highest', 'N/A')}ft, fastest ground: {summary_payload.get('fastest_ground', 'N/A')}km/h, fastest air: {summary_payload.get('fastest_air', 'N/A')}km/h, types: {summary_payload.get('aircraft_types', 'N/A')}, weather: {summary_payload.get('weather', 'N/A')}")
+        if reason is not None:
+            log(f"Published summary: {summary_payload.get('count', 'N/A')} aircraft, lowest: {summary_payload.get('closest_lowest', 'N/A')}, closest: {summary_payload.get('closest_distance', 'N/A')}, highest: {summary_payload.get('highest', 'N/A')}ft, fastest ground: {summary_payload.get('fastest_ground', 'N/A')}km/h, fastest air: {summary_payload.get('fastest_air', 'N/A')}km/h, types: {summary_payload.get('aircraft_types', 'N/A')}, weather: {summary_payload.get('weather', 'N/A')}")
         
     except Exception as e:
         log(f"Error publishing summary data: {e}", "error")
@@ -992,32 +2330,32 @@ def _publish_feeder_discovery(mqtt_manager):
     global FEEDER_DISCOVERY_DONE
     if FEEDER_DISCOVERY_DONE:
         return
-    if not FEEDER_MONITOR_ENABLED:
+    if not CONFIG.feeder_monitor_enabled:
         return
     feeder_sensors = [
         {
             "name": "Feeder Messages 1min",
             "key": "feeder_messages_1min",
-            "state_topic": f"{MQTT_TOPIC}/feeder/summary",
+            "state_topic": f"{CONFIG.mqtt_topic}/feeder/summary",
             "value_template": "{{ value_json.last1min.messages }}"
         },
         {
             "name": "Feeder Strong Signals 1min",
             "key": "feeder_strong_1min",
-            "state_topic": f"{MQTT_TOPIC}/feeder/summary",
+            "state_topic": f"{CONFIG.mqtt_topic}/feeder/summary",
             "value_template": "{{ value_json.last1min.local.strong_signals }}"
         },
         {
             "name": "Feeder Noise dBFS 1min",
             "key": "feeder_noise_1min",
-            "state_topic": f"{MQTT_TOPIC}/feeder/summary",
+            "state_topic": f"{CONFIG.mqtt_topic}/feeder/summary",
             "value_template": "{{ value_json.last1min.local.noise }}",
             "unit": "dB"
         },
         {
             "name": "Feeder Gain dB",
             "key": "feeder_gain_db",
-            "state_topic": f"{MQTT_TOPIC}/feeder/summary",
+            "state_topic": f"{CONFIG.mqtt_topic}/feeder/summary",
             "value_template": "{{ value_json.gain_db }}",
             "unit": "dB"
         }
@@ -1027,7 +2365,7 @@ def _publish_feeder_discovery(mqtt_manager):
         discovery_topic = f"homeassistant/sensor/airplanes_live_{fs['key']}/config"
         # Apply zero-filter for count-like sensors if enabled
         vt = fs["value_template"]
-        if FEEDER_FILTER_ZERO_SENSORS and fs["key"] in ["feeder_messages_1min", "feeder_strong_1min"]:
+        if CONFIG.feeder_filter_zero_sensors and fs["key"] in ["feeder_messages_1min", "feeder_strong_1min"]:
             vt = "{{ (" + vt[3:-2] + ") if ((" + vt[3:-2] + ") | int(0) > 0) else none }}"
         payload = {
             "name": fs["name"],
@@ -1045,131 +2383,2023 @@ def _publish_feeder_discovery(mqtt_manager):
         if fs.get("unit"):
             payload["unit_of_measurement"] = fs["unit"]
         try:
-            mqtt_manager.publish(discovery_topic, json.dumps(payload), retain=True)
-            log(f"Published feeder discovery: {discovery_topic}")
+            mqtt_manager.publish_discovery(discovery_topic, json.dumps(payload))
+            log(f"Published feeder discovery: {discovery_topic}")
+        except Exception as e:
+            log(f"Error publishing feeder discovery for {fs['name']}: {e}", "error")
+    FEEDER_DISCOVERY_DONE = True
+
+
+def _sanitize_metric_key(path_parts):
+    """Sanitize a list of path parts into a safe metric key for unique_id/topic."""
+    safe = []
+    for p in path_parts:
+        if isinstance(p, int):
+            safe.append(str(p))
+        else:
+            safe.append(str(p).lower().replace(" ", "_").replace("/", "_").replace("-", "_").replace("__", "_"))
+    return "_".join(safe)
+
+
+def _iter_leaf_paths(data, prefix=None, depth=0, max_depth=10):
+    """Yield (path_list, value) for each leaf node (non-dict, non-list) in dict."""
+    if prefix is None:
+        prefix = []
+    if depth > max_depth:
+        return
+    if isinstance(data, dict):
+        for k, v in data.items():
+            _iter = _iter_leaf_paths(v, prefix + [k], depth + 1, max_depth)
+            if _iter is None:
+                continue
+            for item in _iter:
+                yield item
+    elif isinstance(data, list):
+        # Skip long arrays; expose their length instead
+        length = len(data)
+        yield (prefix + ["length"], length)
+    else:
+        # primitive leaf
+        yield (prefix, data)
+
+
+def _publish_dynamic_feeder_discovery(mqtt_manager, stats: Dict[str, Any], limit: int = 200):
+    """Publish discovery entries for all leaf metrics in stats.json."""
+    global FEEDER_DYNAMIC_DISCOVERY_DONE
+    if FEEDER_DYNAMIC_DISCOVERY_DONE or not stats:
+        return
+    sensors_published = 0
+    for path, value in _iter_leaf_paths(stats):
+        # Only publish reasonable primitives
+        if not isinstance(value, (int, float, bool, str)):
+            continue
+        metric_key = _sanitize_metric_key(path)
+        discovery_topic = f"homeassistant/sensor/airplanes_live_feeder_{metric_key}/config"
+        json_path = "value_json." + ".".join([str(p) for p in path])
+        # For integer metrics, hide zeros by emitting 'none' so HA shows unavailable
+        if CONFIG.feeder_filter_zero_sensors and isinstance(value, int):
+            value_template = "{{ " + json_path + " if (" + json_path + " | int(0) > 0) else none }}"
+        else:
+            value_template = "{{ " + json_path + " }}"
+        payload = {
+            "name": f"Feeder: {'/'.join([str(p) for p in path])}",
+            "state_topic": f"{CONFIG.mqtt_topic}/feeder/summary",
+            "unique_id": f"airplanes_live_feeder_{metric_key}",
+            "value_template": value_template,
+            "device": {
+                "identifiers": [FEEDER_DEVICE_ID],
+                "name": FEEDER_DEVICE_NAME,
+                "manufacturer": "BenCos17",
+                "model": "Aircraft Tracker (Powered by airplanes.live)",
+                "sw_version": get_addon_version()
+            }
+        }
+        try:
+            mqtt_manager.publish_discovery(discovery_topic, json.dumps(payload))
+            sensors_published += 1
+        except Exception as e:
+            log(f"Error publishing dynamic feeder discovery for {metric_key}: {e}", "error")
+        if sensors_published >= limit:
+            break
+    if sensors_published > 0:
+        FEEDER_DYNAMIC_DISCOVERY_DONE = True
+        log(f"Published {sensors_published} dynamic feeder sensors (limit {limit})")
+
+
+def fetch_feeder_stats() -> Optional[Dict[str, Any]]:
+    """Fetch local feeder stats JSON (e.g., readsb/dump1090 metrics.json)."""
+    if not CONFIG.feeder_monitor_enabled:
+        return None
+    try:
+        log(f"Fetching feeder stats from: {CONFIG.feeder_stats_url}")
+        headers = FEEDER_RESPONSE.request_headers(CONFIG.feeder_stats_url)
+        resp = requests.get(CONFIG.feeder_stats_url, headers=headers, timeout=10)
+        if resp.status_code == 304 and FEEDER_RESPONSE.payload is not None:
+            return FEEDER_RESPONSE.not_modified()
+        resp.raise_for_status()
+        data = resp.json()
+        if isinstance(data, dict) and data:
+            FEEDER_RESPONSE.update(resp, (hashlib.blake2b(resp.content, digest_size=16).digest(),), data)
+            return data
+        log("Feeder stats response was empty or not a dict", "warning")
+        FEEDER_RESPONSE.reset()
+        return None
+    except requests.exceptions.Timeout:
+        log("Feeder stats request timed out", "warning")
+        return None
+    except Exception as e:
+        log(f"Error fetching feeder stats: {e}", "warning")
+        return None
+
+
+def publish_feeder_stats(mqtt_manager, stats: Optional[Dict[str, Any]]):
+    """Publish feeder stats to MQTT: raw payload and summarized fields."""
+    if not CONFIG.feeder_monitor_enabled:
+        return
+    try:
+        base_topic = f"{CONFIG.mqtt_topic}/feeder"
+        # Raw
+        mqtt_manager.publish(f"{base_topic}/raw", json.dumps(stats or {}), topic_class="feeder_raw")
+        # Summary mirrors the raw structure but is intended for HA sensors value_template
+        mqtt_manager.publish(f"{base_topic}/summary", json.dumps(stats or {}), topic_class="feeder_summary")
+        # Ensure discovery exists once stats are published
+        if not FEEDER_DISCOVERY_DONE:
+            _publish_feeder_discovery(mqtt_manager)
+        # Publish dynamic sensors for all leaf metrics (first time only)
+        if not FEEDER_DYNAMIC_DISCOVERY_DONE and stats:
+            _publish_dynamic_feeder_discovery(mqtt_manager, stats)
+    except Exception as e:
+        log(f"Error publishing feeder stats: {e}", "error")
+
+
+class CycleScheduler:
+    """Fixed-rate update cadence on the monotonic clock.
+
+    Cycles start on a fixed grid (start + k * interval), so fetch and publish
+    time no longer stretch the period. If a cycle overruns, the next one starts
+    immediately and any further missed slots are skipped rather than queued up.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = float(interval)
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped_cycles = 0
+        self.last_work = 0.0
+        self.max_work = 0.0
+        self.max_jitter = 0.0
+        self._work_samples = deque(maxlen=100)
+        self._jitter_samples = deque(maxlen=100)
+        self._next_due: Optional[float] = None
+        self._scheduled = 0.0
+        self._started = 0.0
+        self._wake = threading.Event()
+
+    def start_cycle(self):
+        """Mark the start of a cycle and record how late it started against the grid."""
+        now = time.monotonic()
+        if self._next_due is None:
+            self._next_due = now
+        jitter = max(now - self._next_due, 0.0)
+        self._jitter_samples.append(jitter)
+        self.max_jitter = max(self.max_jitter, jitter)
+        self._scheduled = self._next_due
+        self._started = now
+
+    def end_cycle(self) -> float:
+        """Mark the end of a cycle's work, schedule the next slot and return the work time."""
+        now = time.monotonic()
+        work = now - self._started
+        self.cycles += 1
+        self.last_work = work
+        self.max_work = max(self.max_work, work)
+        self._work_samples.append(work)
+
+        next_due = self._scheduled + self.interval
+        if now > next_due:
+            # Overrun: run the late cycle right away, drop the slots that were missed entirely
+            self.overruns += 1
+            missed = int((now - next_due) // self.interval)
+            self.skipped_cycles += missed
+            next_due += missed * self.interval
+            log(f"Cycle overran its {self.interval:g}s interval ({work:.2f}s of work, {missed} slot(s) skipped)", "warning")
+        self._next_due = next_due
+        return work
+
+    def wait(self) -> float:
+        """Sleep until the next slot is due (or wake() is called); returns the time slept."""
+        if self._next_due is None:
+            return 0.0
+        delay = self._next_due - time.monotonic()
+        if delay <= 0:
+            return 0.0
+        log(f"Sleeping for {delay:.1f} seconds")
+        self._wake.wait(delay)
+        self._wake.clear()
+        return delay
+
+    def wake(self):
+        """Cut the current wait short (e.g. from another thread)."""
+        self._wake.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cycle timing statistics for the diagnostics payload"""
+        work = list(self._work_samples)
+        jitter = list(self._jitter_samples)
+        return {
+            "interval_s": self.interval,
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "skipped_cycles": self.skipped_cycles,
+            "last_work_ms": round(self.last_work * 1000, 1),
+            "mean_work_ms": round(sum(work) / len(work) * 1000, 1) if work else 0.0,
+            "max_work_ms": round(self.max_work * 1000, 1),
+            "jitter_ms": round(sum(jitter) / len(jitter) * 1000, 1) if jitter else 0.0,
+            "max_jitter_ms": round(self.max_jitter * 1000, 1),
+        }
+
+
+class LoadShedder:
+    """Graceful degradation of per-aircraft publishing when MQTT falls behind.
+
+    At the start of each cycle the level is updated from the outbound
+    backlog still left after the sleep (our queue plus messages paho has
+    not yet written or had acknowledged) and from an overrun of the previous cycle:
+
+        0  everything is published
+        1  each aircraft's state every 2nd cycle
+        2  each aircraft's state every 4th cycle
+        3  no per-aircraft or aggregate publishing
+
+    Aircraft are staggered by a hash of their hex, so each cycle carries a
+    similar share, and the stride never outlives aircraft_state_expiry.
+    Summary, squawk, status and diagnostics are never shed. The level rises
+    as soon as a threshold is crossed (or by one step on an overrun) and
+    falls one step after CALM_CYCLES quiet cycles.
+    """
+
+    BACKLOG_THRESHOLDS = (500, 2000, 5000)
+    STRIDES = (1, 2, 4, 0)
+    CALM_CYCLES = 3
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.level = 0
+        self.cycle = 0
+        self.calm = 0
+        self.backlog = 0
+        self.max_level = 0
+        self.level_changes = 0
+        self.shed_publishes = 0
+
+    def update(self, backlog: int, overran: bool) -> int:
+        """Fold the backlog left at the start of a cycle and the last overrun into this cycle's level"""
+        self.cycle += 1
+        self.backlog = backlog
+        if not self.enabled:
+            self.level = 0
+            return 0
+        target = sum(backlog >= threshold for threshold in self.BACKLOG_THRESHOLDS)
+        if overran:
+            target = max(target, min(self.level + 1, len(self.STRIDES) - 1))
+        if target > self.level:
+            self._set_level(target, f"backlog {backlog}{', cycle overran' if overran else ''}")
+        elif target < self.level:
+            self.calm += 1
+            if self.calm >= self.CALM_CYCLES:
+                self._set_level(self.level - 1, f"backlog {backlog}")
+        else:
+            self.calm = 0
+        return self.level
+
+    def _set_level(self, level: int, reason: str):
+        log(f"Load shedding level {self.level} -> {level} ({reason})", "warning" if level > self.level else "info")
+        self.level = level
+        self.calm = 0
+        self.level_changes += 1
+        self.max_level = max(self.max_level, level)
+
+    def _stride(self) -> int:
+        stride = self.STRIDES[self.level]
+        if stride > 1 and CONFIG.aircraft_state_expiry:
+            # Republish before the broker expires the retained state
+            stride = max(1, min(stride, int(CONFIG.aircraft_state_expiry // (2 * CONFIG.update_interval))))
+        return stride
+
+    @staticmethod
+    def _slot(hex_code: Any) -> int:
+        # Independent of ShardPool.shard_of, so every worker keeps a share of each cycle
+        return int.from_bytes(hashlib.blake2b(str(hex_code).encode("utf-8"), digest_size=2).digest(), "big")
+
+    def select(self, aircraft_list):
+        """The aircraft whose state is due this cycle"""
+        stride = self._stride()
+        if stride == 1 or not isinstance(aircraft_list, list):
+            return aircraft_list
+        if stride == 0:
+            self.shed_publishes += len(aircraft_list)
+            return []
+        phase = self.cycle % stride
+        due = [ac for ac in aircraft_list if self._slot(ac.get('hex')) % stride == phase]
+        self.shed_publishes += len(aircraft_list) - len(due)
+        return due
+
+    def batch_due(self) -> bool:
+        """Whether the aggregate batch goes out this cycle"""
+        stride = self._stride()
+        return stride == 1 or (stride > 1 and self.cycle % stride == 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "level": self.level,
+            "max_level": self.max_level,
+            "backlog": self.backlog,
+            "level_changes": self.level_changes,
+            "shed_publishes": self.shed_publishes,
+        }
+
+
+class Watchdog:
+    """Liveness tracking for the main loop, fetching and MQTT publishing.
+
+    The main loop calls beat() every cycle and fetch_ok() after each
+    successful fetch; publish liveness comes from MQTTManager, whose
+    pending-publish timestamp is only cleared by paho's on_publish callback,
+    so a dead network loop shows up even while publish() keeps queueing.
+    All times are monotonic.
+
+    A background thread checks every few seconds. The process is stalled
+    when the loop has not beaten, or a publish has gone unconfirmed while
+    connected, for stall_seconds; it then logs every thread's stack once per
+    stall and, if restart is enabled, runs on_restart (bounded by
+    RESTART_CLEANUP_SECONDS, since the stuck thread may hold what it needs)
+    and re-executes itself. A fetch outage only marks the process degraded:
+    the API breakers handle that and a restart would not. status() also
+    backs the local /health endpoint, which answers 503 until the loop
+    beats or a publish is confirmed again.
+    """
+
+    CHECK_INTERVAL = 5.0
+    RESTART_CLEANUP_SECONDS = 10.0
+
+    def __init__(self, mqtt_manager, stall_seconds: float, restart: bool = True,
+                 on_restart: Optional[Callable[[], None]] = None):
+        now = time.monotonic()
+        self.mqtt_manager = mqtt_manager
+        self.stall_seconds = stall_seconds
+        self.restart = restart
+        self.on_restart = on_restart
+        self.started = now
+        self.last_beat = now
+        self.last_fetch: Optional[float] = None
+        self.stall_reported = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._server = None
+
+    def beat(self):
+        self.last_beat = time.monotonic()
+
+    def fetch_ok(self):
+        self.last_fetch = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        manager = self.mqtt_manager
+        pending = manager.publish_pending_since
+        problems = []
+        if now - self.last_beat > self.stall_seconds:
+            problems.append(f"main loop silent for {now - self.last_beat:.0f}s")
+        if manager.connected and pending is not None and now - pending > self.stall_seconds:
+            problems.append(f"no MQTT publish confirmed for {now - pending:.0f}s")
+        fetch_age = now - (self.last_fetch if self.last_fetch is not None else self.started)
+
+        def age(timestamp):
+            return round(now - timestamp, 1) if timestamp is not None else None
+
+        return {
+            "status": "stalled" if problems else ("degraded" if fetch_age > self.stall_seconds else "ok"),
+            "problems": problems,
+            "loop_age_s": age(self.last_beat),
+            "fetch_age_s": age(self.last_fetch),
+            "publish_age_s": age(manager.last_publish_ack),
+            "publish_pending_s": age(pending),
+            "mqtt_connected": manager.is_connected(),
+            "stall_seconds": self.stall_seconds,
+            "uptime_s": age(self.started),
+        }
+
+    def start(self, port: int):
+        self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+        self._thread.start()
+        try:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # only for the health endpoint
+            watchdog = self
+
+            class HealthHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/health":
+                        self.send_error(404)
+                        return
+                    status = watchdog.status()
+                    body = json.dumps(status).encode("utf-8")
+                    self.send_response(503 if status["status"] == "stalled" else 200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), HealthHandler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="health", daemon=True).start()
+            log(f"Health endpoint listening on http://127.0.0.1:{port}/health")
+        except OSError as e:
+            log(f"Health endpoint unavailable on port {port}: {e}", "warning")
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _run(self):
+        while not self._stop.wait(self.CHECK_INTERVAL):
+            status = self.status()
+            if status["status"] != "stalled":
+                self.stall_reported = False
+            elif not self.stall_reported:
+                self._on_stall(status["problems"])
+
+    def _on_stall(self, problems: List[str]):
+        log(f"Watchdog: stall detected ({'; '.join(problems)})", "critical")
+        import traceback  # only needed on this path
+        frames = sys._current_frames()
+        for thread in threading.enumerate():
+            frame = frames.get(thread.ident)
+            if frame is not None:
+                log(f"Stack of thread {thread.name}:\n{''.join(traceback.format_stack(frame))}", "critical")
+        # Report once per stall rather than every check; status() stays stalled until the loop recovers
+        self.stall_reported = True
+        if not self.restart:
+            return
+        if self.on_restart is not None:
+            cleanup = threading.Thread(target=self._cleanup, name="watchdog-cleanup", daemon=True)
+            cleanup.start()
+            cleanup.join(self.RESTART_CLEANUP_SECONDS)
+            if cleanup.is_alive():
+                log(f"Watchdog: cleanup did not finish within {self.RESTART_CLEANUP_SECONDS:.0f}s", "error")
+        restart_process("Watchdog: restarting the add-on process", "critical")
+
+    def _cleanup(self):
+        try:
+            self.on_restart()
+        except Exception as e:
+            log(f"Watchdog: cleanup before restart failed: {e}", "error")
+
+
+def restart_process(reason: str, level: str = "info"):
+    """Replace this process with a fresh run of the add-on"""
+    log(reason, level)
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+    # exec keeps the PID s6 supervises; the broker publishes our last will when the socket drops
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+# Subsystem each option (or derived AddonConfig attribute) belongs to, for hot reload
+RELOAD_SUBSYSTEMS = {
+    "update_interval": "scheduler",
+    "latitude": "api", "longitude": "api", "radius": "api", "radius_nmi": "api", "api_type": "api",
+    "api_key": "api", "api_url": "api", "disable_auto_config": "api", "fallback_sources": "api", "readsb_url": "api",
+    "squawk_tracking_enabled": "squawks", "squawk_alert_special_codes": "squawks",
+    "custom_squawks": "squawks", "special_squawks": "squawks",
+    "watchlist_file": "watchlist",
+    "feeder_monitor_enabled": "feeder", "feeder_stats_url": "feeder",
+    "feeder_monitor_interval": "feeder", "feeder_filter_zero_sensors": "feeder",
+    "summary_max_age": "summary", "top_n_count": "summary",
+    "overhead_minutes": "overhead", "overhead_radius": "overhead",
+    "statistics_enabled": "statistics",
+    "mqtt_qos": "mqtt", "mqtt_retain": "mqtt",
+    "capture_enabled": "capture", "capture_dir": "capture", "capture_max_files": "capture",
+    "profile_max_files": "profiling",
+    "aircraft_state_expiry": "publishing", "aggregate_compression": "publishing",
+    "watchdog_restart": "watchdog",
+    "memory_monitor": "memory", "memory_warn_mb": "memory",
+    "load_shedding": "load",
+}
+# Options that define the MQTT session, the topic layout or process-wide resources; changing one restarts the add-on
+RESTART_OPTIONS = frozenset({
+    "mqtt_broker", "mqtt_port", "mqtt_username", "mqtt_password", "mqtt_topic", "tracking_mode",
+    "device_discovery", "worker_processes", "persist_state", "discovery_reconcile",
+    "replay_file", "replay_speed", "profile_command_enabled", "aircraft_db_csv",
+})
+# Subsystems whose Home Assistant entities change with their options
+DISCOVERY_SUBSYSTEMS = frozenset({"squawks", "feeder", "summary", "overhead", "statistics", "memory"})
+
+
+class ConfigReloader:
+    """Watch options.json and validate changes against the running configuration.
+
+    A background thread polls the file's mtime and wakes the scheduler, so
+    the main loop picks up a change at the start of its next cycle instead
+    of after a full update_interval. An edit that does not parse or validate
+    is logged and the running configuration stays in place.
+    """
+
+    POLL_INTERVAL = 2.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = self._stat()
+        self.reloads = 0
+        self.failures = 0
+        self.last_changed: List[str] = []
+        self.last_latency_ms: Optional[float] = None
+        self._stop = threading.Event()
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def start(self, on_change: Callable[[], None]):
+        def poll():
+            while not self._stop.wait(self.POLL_INTERVAL):
+                if self._stat() != self.mtime:
+                    on_change()
+        threading.Thread(target=poll, name="config-watch", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def maybe_reload(self):
+        """(new config, changed attribute names, file mtime) when the file changed and validates, else None"""
+        mtime = self._stat()
+        if mtime is None or mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        try:
+            with open(self.path, 'r') as f:
+                options = json.load(f)
+        except (OSError, ValueError) as e:
+            self.failures += 1
+            log(f"{self.path} changed but could not be read ({e}) - keeping the running configuration", "error")
+            return None
+        current, candidate = CONFIG, AddonConfig(options)
+        if not validate_config(candidate):
+            self.failures += 1
+            log(f"{self.path} changed but does not validate - keeping the running configuration", "error")
+            return None
+        previous = vars(current)
+        changed = sorted(key for key, value in vars(candidate).items() if previous.get(key) != value)
+        if not changed:
+            log(f"{self.path} rewritten without changes", "debug")
+            return None
+        return candidate, changed, mtime
+
+    def record(self, changed: List[str], latency_ms: float):
+        self.reloads += 1
+        self.last_changed = changed
+        self.last_latency_ms = round(latency_ms, 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_changed": self.last_changed,
+            "last_latency_ms": self.last_latency_ms,
+        }
+
+
+def apply_reloaded_config(subsystems: Set[str]):
+    """Rebuild the module-level state behind the changed subsystems; CONFIG is already the new one"""
+    global TRAFFIC_STATS, OVERHEAD, SUMMARY_CHANGES, MEMORY_MONITOR, FEEDER_DISCOVERY_DONE, FEEDER_DYNAMIC_DISCOVERY_DONE
+    if "api" in subsystems:
+        init_api_sources()
+    if "feeder" in subsystems:
+        FEEDER_DISCOVERY_DONE = False
+        FEEDER_DYNAMIC_DISCOVERY_DONE = False
+        FEEDER_RESPONSE.reset()
+    if "statistics" in subsystems:
+        if CONFIG.statistics_enabled and TRAFFIC_STATS is None:
+            TRAFFIC_STATS = TrafficStatistics(TRAFFIC_STATS_FILE)
+            TRAFFIC_STATS.load()
+        elif not CONFIG.statistics_enabled and TRAFFIC_STATS is not None:
+            TRAFFIC_STATS.checkpoint()
+            TRAFFIC_STATS = None
+    if subsystems & {"api", "overhead"}:
+        # The predictor is anchored to the location
+        OVERHEAD = (OverflightPredictor(CONFIG.latitude, CONFIG.longitude, CONFIG.overhead_minutes * 60, CONFIG.overhead_radius)
+                    if CONFIG.overhead_minutes > 0 else None)
+    if "memory" in subsystems:
+        if MEMORY_MONITOR is not None:
+            MEMORY_MONITOR.stop()
+        MEMORY_MONITOR = MemoryMonitor(CONFIG.memory_warn_mb) if CONFIG.memory_monitor else None
+    # Always start over so the next summary shows the new settings
+    SUMMARY_CHANGES = SummaryChangeDetector(CONFIG.summary_max_age) if CONFIG.summary_max_age else None
+
+
+class MemoryMonitor:
+    """Opt-in memory growth tracking for long-running instances.
+
+    Every cycle reads RSS from /proc and the sizes of the long-lived
+    registries. Every SNAPSHOT_INTERVAL seconds a tracemalloc snapshot is
+    compared with the baseline snapshot taken once the first interval of
+    warm-up has passed, naming the allocation sites that grew since. RSS
+    growth over the baseline is logged as a warning each time it crosses
+    another multiple of warn_mb.
+    """
+
+    SNAPSHOT_INTERVAL = 600.0
+    TOP_SITES = 10
+
+    def __init__(self, warn_mb: int):
+        import tracemalloc  # only needed while the monitor is enabled
+        self.tracemalloc = tracemalloc
+        self.warn_mb = warn_mb
+        if not tracemalloc.is_tracing():
+            # One frame per allocation keeps the tracing overhead low and is enough to name the line
+            tracemalloc.start(1)
+        self.started = time.monotonic()
+        self.rss_mb: Optional[float] = None
+        self.peak_rss_mb: Optional[float] = None
+        self.baseline_rss_mb: Optional[float] = None
+        self.baseline_snapshot = None
+        self.last_snapshot = self.started
+        self.snapshots = 0
+        self.warned_steps = 0
+        self.top_growth: List[Dict[str, Any]] = []
+        self.registries: Dict[str, int] = {}
+
+    @staticmethod
+    def read_rss_mb():
+        """(VmRSS, VmHWM) of this process in MB, or (None, None) without /proc"""
+        values = {}
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith(("VmRSS:", "VmHWM:")):
+                        key, value = line.split(":", 1)
+                        values[key] = int(value.split()[0]) / 1024  # kB
+        except OSError:
+            pass
+        return values.get("VmRSS"), values.get("VmHWM")
+
+    def sample(self, registries: Dict[str, int]):
+        """Record this cycle's RSS and registry sizes; snapshot and warn when due"""
+        self.rss_mb, self.peak_rss_mb = self.read_rss_mb()
+        self.registries = registries
+        now = time.monotonic()
+        if now - self.last_snapshot >= self.SNAPSHOT_INTERVAL:
+            self.last_snapshot = now
+            self._snapshot()
+        growth = self.growth_mb()
+        if growth is not None and self.warn_mb and growth >= (self.warned_steps + 1) * self.warn_mb:
+            self.warned_steps = int(growth // self.warn_mb)
+            largest = sorted(registries.items(), key=lambda item: item[1], reverse=True)[:5]
+            sites = ", ".join(f"{site['site']} +{site['size_kb']}kB" for site in self.top_growth[:5]) or "no snapshot diff yet"
+            log(f"Memory grew {growth:.1f} MB since the baseline (RSS {self.rss_mb:.1f} MB). "
+                f"Top allocation sites: {sites}. Largest registries: {dict(largest)}", "warning")
+
+    def _snapshot(self):
+        tracemalloc = self.tracemalloc
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        self.snapshots += 1
+        if self.baseline_snapshot is None:
+            # The first interval covers start-up (discovery, caches filling); growth is measured from here
+            self.baseline_snapshot = snapshot
+            self.baseline_rss_mb = self.rss_mb
+            return
+        self.top_growth = []
+        for stat in snapshot.compare_to(self.baseline_snapshot, "lineno")[:self.TOP_SITES]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            self.top_growth.append({
+                "site": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                "size_kb": round(stat.size_diff / 1024, 1),
+                "count": stat.count_diff,
+            })
+
+    def growth_mb(self) -> Optional[float]:
+        if self.rss_mb is None or self.baseline_rss_mb is None:
+            return None
+        return self.rss_mb - self.baseline_rss_mb
+
+    def stop(self):
+        self.tracemalloc.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        traced, traced_peak = self.tracemalloc.get_traced_memory() if self.tracemalloc.is_tracing() else (0, 0)
+        growth = self.growth_mb()
+        return {
+            "rss_mb": round(self.rss_mb, 1) if self.rss_mb is not None else None,
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "growth_mb": round(growth, 1) if growth is not None else None,
+            "traced_mb": round(traced / 1048576, 1),
+            "traced_peak_mb": round(traced_peak / 1048576, 1),
+            "snapshots": self.snapshots,
+            "top_growth": self.top_growth,
+            "registries": self.registries,
+        }
+
+
+def get_registry_sizes(mqtt_manager) -> Dict[str, int]:
+    """Entry counts of the module-level and MQTT structures that live as long as the process"""
+    sizes = {
+        "detailed_discovery": len(DETAILED_DISCOVERY_PUBLISHED),
+        "tracked_squawks": len(TRACKED_SQUAWKS),
+        "retained_discovery": len(mqtt_manager.retained_discovery),
+        "discovery_confirmed": len(mqtt_manager.discovery_confirmed),
+        "topic_aliases": len(mqtt_manager._topic_aliases),
+        "alias_candidates": len(mqtt_manager._alias_candidates),
+        "mqtt_queue": mqtt_manager.message_queue.qsize(),
+        "mqtt_unconfirmed": mqtt_manager.unconfirmed,
+    }
+    if OVERHEAD is not None:
+        sizes["overhead_cache"] = len(OVERHEAD.cache)
+    if TRAFFIC_STATS is not None:
+        sizes["stats_hour_seen"] = len(TRAFFIC_STATS.hour_seen)
+        sizes["stats_types"] = sum(len(counts) for counts in TRAFFIC_STATS.daily_types.values())
+    return sizes
+
+
+class AircraftDatabase:
+    """Offline hex -> registration/type/operator/manufacturer/military lookup.
+
+    The user-supplied CSV is converted once into a sorted binary file that is
+    memory-mapped and searched by binary search, so a 500k-row table costs
+    page cache rather than Python objects. The binary is rebuilt whenever the
+    CSV's size or mtime changes.
+
+    Layout: header (HEADER), then `count` index records (RECORD: hex as an
+    integer, string offset, flags) sorted by hex, then a string blob of
+    length-prefixed UTF-8 records (registration, type, operator and
+    manufacturer joined by 0x1f). Identical string records are stored once.
+
+    Only ICAO addresses are keyed. readsb marks non-ICAO addresses (TIS-B,
+    anonymous ADS-R) with a leading "~"; their digits can collide with a real
+    airframe, so such rows are skipped and such hexes are never looked up.
+    """
+
+    MAGIC = b"ALDB"
+    VERSION = 2  # 2: "~" rows no longer folded onto the ICAO key
+    HEADER = struct.Struct("<4sHxxIdQ")  # magic, version, count, csv mtime, csv size
+    RECORD = struct.Struct("<IIB")
+    FLAG_MILITARY = 0x01
+    FIELDS = ("registration", "type", "operator", "manufacturer")
+    # Accepted CSV header names per field (OpenSky, tar1090-db and hand-made exports)
+    COLUMN_ALIASES = {
+        "hex": ("hex", "icao24", "icao", "icao_hex", "modes"),
+        "registration": ("registration", "reg", "r"),
+        "type": ("type", "typecode", "icaotype", "icao_type", "t"),
+        "operator": ("operator", "ownop", "owner", "operatorcallsign"),
+        "manufacturer": ("manufacturer", "manufacturername", "manufacturericao"),
+        "military": ("military", "mil", "is_military"),
+    }
+    CACHE_SIZE = 4096
+
+    def __init__(self, csv_path: str, bin_path: str):
+        self.csv_path = csv_path
+        self.bin_path = bin_path
+        self.count = 0
+        self._file = None
+        self._map = None
+        self._strings_start = 0
+        self._cache: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def open(self, build: bool = True) -> bool:
+        """Build the binary file if it is missing or stale, then map it
+
+        build=False maps whatever file exists (worker processes map the file
+        the coordinator built rather than racing it).
+        """
+        import mmap
+        try:
+            if build and self._is_stale():
+                self.build()
+            self._file = open(self.bin_path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.count, _, _ = self.HEADER.unpack_from(self._map, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError(f"{self.bin_path} is not an aircraft database (version {self.VERSION})")
+            self._strings_start = self.HEADER.size + self.count * self.RECORD.size
+            log(f"Aircraft database ready: {self.count} aircraft from {self.csv_path}")
+            return True
+        except Exception as e:
+            log(f"Aircraft database unavailable: {e}", "error")
+            self.close()
+            return False
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _is_stale(self) -> bool:
+        try:
+            st = os.stat(self.csv_path)
+        except FileNotFoundError:
+            # Keep using a previously built file if the CSV was removed
+            if os.path.exists(self.bin_path):
+                return False
+            raise
+        try:
+            with open(self.bin_path, "rb") as f:
+                magic, version, _, mtime, size = self.HEADER.unpack(f.read(self.HEADER.size))
+        except (OSError, struct.error):
+            return True
+        return magic != self.MAGIC or version != self.VERSION or mtime != st.st_mtime or size != st.st_size
+
+    @classmethod
+    def _resolve_columns(cls, header: List[str]) -> Dict[str, int]:
+        normalized = [h.strip().lower().strip("'\"") for h in header]
+        columns = {}
+        for field, aliases in cls.COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in normalized:
+                    columns[field] = normalized.index(alias)
+                    break
+        if "hex" not in columns:
+            raise ValueError("aircraft database CSV needs a hex/icao24 column")
+        return columns
+
+    def build(self):
+        """Convert the CSV into the sorted binary file (written atomically)"""
+        import csv
+        started = time.monotonic()
+        st = os.stat(self.csv_path)
+        records = {}
+        non_icao = 0
+        with open(self.csv_path, newline="", encoding="utf-8", errors="replace") as f:
+            reader = csv.reader(f)
+            columns = self._resolve_columns(next(reader))
+            for row in reader:
+                try:
+                    hex_code = row[columns["hex"]].strip().strip("'\"")
+                    if hex_code.startswith("~"):
+                        non_icao += 1
+                        continue
+                    key = int(hex_code, 16)
+                except (ValueError, IndexError):
+                    continue
+                values = []
+                for field in self.FIELDS:
+                    index = columns.get(field)
+                    value = row[index].strip().strip("'\"") if index is not None and index < len(row) else ""
+                    values.append(value.replace("\x1f", " "))
+                military = columns.get("military")
+                flags = 0
+                if military is not None and military < len(row) and row[military].strip().lower() in ("1", "true", "yes", "y", "t"):
+                    flags |= self.FLAG_MILITARY
+                records[key] = ("\x1f".join(values), flags)
+
+        strings = bytearray()
+        offsets: Dict[str, int] = {}
+        index = bytearray()
+        for key in sorted(records):
+            text, flags = records[key]
+            offset = offsets.get(text)
+            if offset is None:
+                encoded = text.encode("utf-8")[:0xFFFF]
+                offset = offsets[text] = len(strings)
+                strings += struct.pack("<H", len(encoded)) + encoded
+            index += self.RECORD.pack(key, offset, flags)
+
+        tmp_path = self.bin_path + ".tmp"
+        os.makedirs(os.path.dirname(self.bin_path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(records), st.st_mtime, st.st_size))
+            f.write(index)
+            f.write(strings)
+        os.replace(tmp_path, self.bin_path)
+        log(f"Built aircraft database {self.bin_path}: {len(records)} aircraft, "
+            f"{len(index) + len(strings)} bytes in {time.monotonic() - started:.1f}s"
+            + (f" ({non_icao} non-ICAO rows skipped)" if non_icao else ""))
+
+    def lookup(self, hex_code: str) -> Optional[Dict[str, Any]]:
+        """Return the record for an ICAO hex, or None when unknown or not an ICAO address"""
+        if self._map is None or not hex_code or hex_code.startswith("~"):
+            return None
+        self.lookups += 1
+        cache = self._cache
+        if hex_code in cache:
+            cache.move_to_end(hex_code)
+            record = cache[hex_code]
+        else:
+            record = self._search(hex_code)
+            cache[hex_code] = record
+            if len(cache) > self.CACHE_SIZE:
+                cache.popitem(last=False)
+        if record is not None:
+            self.hits += 1
+        return record
+
+    def _search(self, hex_code: str) -> Optional[Dict[str, Any]]:
+        try:
+            key = int(hex_code, 16)
+        except ValueError:
+            return None
+        data, unpack_from = self._map, self.RECORD.unpack_from
+        record_size, base = self.RECORD.size, self.HEADER.size
+        lo, hi = 0, self.count - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            mid_key, offset, flags = unpack_from(data, base + mid * record_size)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid - 1
+            else:
+                start = self._strings_start + offset
+                (length,) = struct.unpack_from("<H", data, start)
+                values = data[start + 2:start + 2 + length].decode("utf-8").split("\x1f")
+                record = {field: value or None for field, value in zip(self.FIELDS, values)}
+                record["military"] = bool(flags & self.FLAG_MILITARY)
+                return record
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "aircraft": self.count,
+            "lookups": self.lookups,
+            "hit_rate": round(100 * self.hits / self.lookups, 1) if self.lookups else 0.0,
+        }
+
+
+def open_aircraft_db():
+    """Build/map the aircraft database off the main thread; enrichment starts once it is ready"""
+    global AIRCRAFT_DB
+    db = AircraftDatabase(CONFIG.aircraft_db_csv, AIRCRAFT_DB_FILE)
+    if db.open():
+        AIRCRAFT_DB = db
+
+
+def lookup_aircraft(aircraft) -> Optional[Dict[str, Any]]:
+    """Aircraft database record for an API aircraft, or None (no database or unknown hex)"""
+    db = AIRCRAFT_DB
+    if db is None:
+        return None
+    return db.lookup(aircraft.get('hex'))
+
+
+class Watchlist:
+    """Compiled watchlist that restricts which aircraft get per-aircraft topics and entities.
+
+    The file is plain text, one entry per line, `#` starts a comment:
+
+        hex:4ca7b3        exact ICAO hex (a bare 6-digit hex works too)
+        type:B744         exact ICAO type code
+        reg:EI-DVM        exact registration
+        callsign:RYR      callsign prefix
+        regex:^EI[A-Z]{3}$  regular expression searched in the callsign
+
+    Entries are compiled once into sets, a callsign prefix trie and a single
+    combined regex. The file is re-read when its mtime changes; a file that
+    fails to parse keeps the previous list.
+    """
+
+    _BARE_HEX = re.compile(r"^~?[0-9a-fA-F]{6}$")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime: Optional[float] = None
+        self._missing = False
+        self.hexes = set()
+        self.types = set()
+        self.registrations = set()
+        self.prefix_trie: Dict[str, Any] = {}
+        self.regex = None
+        self.entries = 0
+        self.reloads = 0
+        self.matched = 0
+
+    def maybe_reload(self) -> bool:
+        """Recompile if the file changed since the last load; True when a new list was applied"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            if not self._missing:
+                log(f"Watchlist {self.path} unavailable ({e}) - no aircraft pass the filter", "warning")
+                self._missing = True
+            return False
+        self._missing = False
+        if mtime == self.mtime:
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.compile(f.read().splitlines())
+        except (OSError, ValueError, re.error) as e:
+            log(f"Watchlist {self.path} not reloaded: {e}", "error")
+            return False
+        finally:
+            self.mtime = mtime
+        self.reloads += 1
+        log(f"Watchlist loaded: {self.entries} entries ({len(self.hexes)} hex, {len(self.types)} type, "
+            f"{len(self.registrations)} registration, {'regex' if self.regex else 'no regex'})")
+        return True
+
+    def compile(self, lines: List[str]):
+        hexes, types, registrations, patterns = set(), set(), set(), []
+        trie: Dict[str, Any] = {}
+        entries = 0
+        for number, raw in enumerate(lines, 1):
+            line = raw.split("#", 1)[0].strip()
+            if not line:
+                continue
+            kind, sep, value = line.partition(":")
+            kind, value = kind.strip().lower(), value.strip()
+            if not sep:
+                if not self._BARE_HEX.match(line):
+                    raise ValueError(f"line {number}: expected kind:value, got {line!r}")
+                kind, value = "hex", line
+            if not value:
+                raise ValueError(f"line {number}: empty {kind} entry")
+            if kind == "hex":
+                hexes.add(value.lower())
+            elif kind == "type":
+                types.add(value.upper())
+            elif kind == "reg":
+                registrations.add(value.upper())
+            elif kind == "callsign":
+                node = trie
+                for char in value.upper():
+                    node = node.setdefault(char, {})
+                node[""] = True
+            elif kind == "regex":
+                re.compile(value)  # report the offending line rather than the combined pattern
+                patterns.append(f"(?:{value})")
+            else:
+                raise ValueError(f"line {number}: unknown entry kind {kind!r}")
+            entries += 1
+
+        self.hexes, self.types, self.registrations, self.prefix_trie = hexes, types, registrations, trie
+        self.regex = re.compile("|".join(patterns)) if patterns else None
+        self.entries = entries
+
+    def _callsign_prefix_match(self, callsign: str) -> bool:
+        node = self.prefix_trie
+        for char in callsign:
+            node = node.get(char)
+            if node is None:
+                return False
+            if "" in node:
+                return True
+        return False
+
+    def matches(self, aircraft) -> bool:
+        if aircraft.get('hex', '').lower() in self.hexes:
+            return True
+        if self.types or self.registrations:
+            record = lookup_aircraft(aircraft) or {}
+            ac_type = aircraft.get('t') or record.get('type')
+            if ac_type and ac_type.upper() in self.types:
+                return True
+            registration = aircraft.get('r') or record.get('registration')
+            if registration and registration.upper() in self.registrations:
+                return True
+        if self.prefix_trie or self.regex:
+            callsign = (aircraft.get('flight') or '').strip().upper()
+            if callsign:
+                if self.prefix_trie and self._callsign_prefix_match(callsign):
+                    return True
+                if self.regex is not None and self.regex.search(callsign):
+                    return True
+        return False
+
+    def filter(self, aircraft_list):
+        """Single pass over the aircraft list keeping watched aircraft"""
+        if not isinstance(aircraft_list, list):
+            return aircraft_list
+        matches = self.matches
+        watched = [ac for ac in aircraft_list if isinstance(ac, dict) and matches(ac)]
+        self.matched = len(watched)
+        return watched
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"entries": self.entries, "matched": self.matched, "reloads": self.reloads}
+
+
+class HyperLogLog:
+    """Approximate distinct counter: 2**p one-byte registers (p=11: 2 KB, ~2.3% standard error)."""
+
+    def __init__(self, p: int = 11, registers: Optional[bytes] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class TrafficStatistics:
+    """Rolling traffic statistics with O(1) work per aircraft per cycle.
+
+    - unique aircraft: one HyperLogLog per clock hour for the last 24 hours;
+      today and the last 24 hours are register-wise merges of those
+    - busiest hour: per hour of day, the running mean of aircraft in range
+    - type frequency: each aircraft counted once per hour by ICAO type, in
+      one bucket per day for the last TYPE_DAYS days
+    - max range: furthest aircraft ever seen, with its callsign and time
+
+    The only exact set is the current hour's hexes (used for the type
+    counts), which is cleared every hour. State is checkpointed as JSON to
+    path every checkpoint_interval seconds and on shutdown.
+    """
+
+    HOURS_KEPT = 24
+    TYPE_DAYS = 7
+
+    def __init__(self, path: str, checkpoint_interval: float = 300):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.hourly: "OrderedDict[str, HyperLogLog]" = OrderedDict()
+        self.hour_key: Optional[str] = None
+        self.hour_seen = set()
+        self.yesterday: Optional[Dict[str, Any]] = None
+        self.hour_of_day_sum = [0] * 24
+        self.hour_of_day_cycles = [0] * 24
+        self.daily_types: "OrderedDict[str, Dict[str, int]]" = OrderedDict()  # YYYYMMDD -> type -> count
+        self.max_range: Optional[Dict[str, Any]] = None
+        self.since = datetime.now().isoformat(timespec="seconds")
+        self._last_checkpoint = time.monotonic()
+
+    def observe(self, aircraft_list, furthest=None):
+        """Fold one cycle into the aggregates; furthest is the (aircraft, distance_km) pair with the longest range"""
+        now = datetime.now()
+        hour_key = now.strftime("%Y%m%d%H")
+        if hour_key != self.hour_key:
+            self._roll_hour(now, hour_key)
+        hll = self.hourly[hour_key]
+        hour_seen = self.hour_seen
+        type_counts = self.daily_types.setdefault(hour_key[:8], {})
+        for ac in aircraft_list:
+            hex_code = ac.get('hex')
+            if not hex_code or hex_code in hour_seen:
+                continue
+            hour_seen.add(hex_code)
+            hll.add(hex_code)
+            ac_type = ac.get('t') or (lookup_aircraft(ac) or {}).get('type')
+            if ac_type:
+                type_counts[ac_type] = type_counts.get(ac_type, 0) + 1
+
+        self.hour_of_day_sum[now.hour] += len(aircraft_list)
+        self.hour_of_day_cycles[now.hour] += 1
+
+        if furthest is not None:
+            ac, distance_km = furthest
+            if self.max_range is None or distance_km > self.max_range["distance"]:
+                self.max_range = {
+                    "distance": round(distance_km, 1),
+                    "flight": (ac.get('flight') or 'Unknown').strip(),
+                    "hex": ac.get('hex'),
+                    "time": now.isoformat(timespec="seconds"),
+                }
+
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def _roll_hour(self, now: datetime, hour_key: str):
+        today = hour_key[:8]
+        if self.hour_key is not None and self.hour_key[:8] != today:
+            # Keep the finished day's total before its hours age out
+            self.yesterday = {"date": self.hour_key[:8], "unique": self._merged(self.hour_key[:8]).count()}
+        self.hour_key = hour_key
+        self.hour_seen = set()
+        self.hourly.setdefault(hour_key, HyperLogLog())
+        # Keys sort chronologically; drop hours that left the 24 hour window (also after downtime)
+        cutoff = (now - timedelta(hours=self.HOURS_KEPT - 1)).strftime("%Y%m%d%H")
+        while next(iter(self.hourly)) < cutoff:
+            self.hourly.popitem(last=False)
+        self.daily_types.setdefault(today, {})
+        day_cutoff = (now - timedelta(days=self.TYPE_DAYS - 1)).strftime("%Y%m%d")
+        while next(iter(self.daily_types)) < day_cutoff:
+            self.daily_types.popitem(last=False)
+
+    def _merged(self, prefix: str = "") -> HyperLogLog:
+        merged = HyperLogLog()
+        for key, hll in self.hourly.items():
+            if key.startswith(prefix):
+                merged.merge(hll)
+        return merged
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Payload for <mqtt_topic>/stats"""
+        means = [round(total / cycles, 1) if cycles else 0 for total, cycles in zip(self.hour_of_day_sum, self.hour_of_day_cycles)]
+        busiest = max(range(24), key=lambda h: means[h]) if any(self.hour_of_day_cycles) else None
+        type_counts: Dict[str, int] = {}
+        for counts in self.daily_types.values():
+            for ac_type, count in counts.items():
+                type_counts[ac_type] = type_counts.get(ac_type, 0) + count
+        top_types = sorted(type_counts.items(), key=lambda item: item[1], reverse=True)[:10]
+        current = self.hourly.get(self.hour_key)
+        return {
+            "unique_hour": current.count() if current is not None else 0,
+            "unique_today": self._merged(self.hour_key[:8]).count() if self.hour_key else 0,
+            "unique_24h": self._merged().count() if self.hourly else 0,
+            "unique_yesterday": self.yesterday["unique"] if self.yesterday else None,
+            "busiest_hour": f"{busiest:02d}:00" if busiest is not None else "Unknown",
+            "hourly_mean_aircraft": {f"{h:02d}": means[h] for h in range(24)},
+            "most_common_type": top_types[0][0] if top_types else "Unknown",
+            "top_types": dict(top_types),
+            "max_range": self.max_range["distance"] if self.max_range else None,
+            "max_range_aircraft": self.max_range,
+            "since": self.since,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        import base64
+        return {
+            "version": 2,
+            "since": self.since,
+            "hourly": {key: base64.b64encode(bytes(hll.registers)).decode("ascii") for key, hll in self.hourly.items()},
+            "hour_key": self.hour_key,
+            "hour_seen": sorted(self.hour_seen),
+            "yesterday": self.yesterday,
+            "hour_of_day_sum": self.hour_of_day_sum,
+            "hour_of_day_cycles": self.hour_of_day_cycles,
+            "daily_types": self.daily_types,
+            "max_range": self.max_range,
+        }
+
+    def checkpoint(self):
+        """Write the state atomically; failures are logged and retried at the next interval"""
+        self._last_checkpoint = time.monotonic()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log(f"Could not checkpoint traffic statistics to {self.path}: {e}", "warning")
+
+    def load(self) -> bool:
+        """Restore a checkpoint written by a previous run; a missing or corrupt file starts fresh"""
+        import base64
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") not in (1, 2):
+                return False
+            self.hourly = OrderedDict(
+                (key, HyperLogLog(registers=base64.b64decode(registers))) for key, registers in sorted(state["hourly"].items())
+            )
+            self.hour_key = state.get("hour_key")
+            self.hour_seen = set(state.get("hour_seen", []))
+            self.yesterday = state.get("yesterday")
+            self.hour_of_day_sum = state["hour_of_day_sum"]
+            self.hour_of_day_cycles = state["hour_of_day_cycles"]
+            # Version 1 kept all-time type counts, which cannot be split into days; they are dropped
+            self.daily_types = OrderedDict(sorted(state.get("daily_types", {}).items()))
+            self.max_range = state.get("max_range")
+            self.since = state.get("since", self.since)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"Ignoring unreadable traffic statistics checkpoint {self.path}: {e}", "warning")
+            return False
+        log(f"Restored traffic statistics since {self.since} ({len(self.hourly)} hours of unique counts)")
+        return True
+
+
+class StateStore:
+    """SQLite (WAL) store for discovery and squawk state that should survive restarts.
+
+    Persists DETAILED_DISCOVERY_PUBLISHED, TRACKED_SQUAWKS, FEEDER_DISCOVERY_DONE
+    and FEEDER_DYNAMIC_DISCOVERY_DONE. load() fills the globals at startup;
+    flush() writes what changed since the previous flush in one transaction,
+    once per cycle. Discovery state is dropped when the fingerprint (add-on
+    version and the options that shape discovery payloads) changes, so an
+    update or reconfiguration still republishes every config.
+
+    Discovered aircraft carry a last_seen time. Rows for hexes that leave
+    DETAILED_DISCOVERY_PUBLISHED (reconciliation) are deleted, and aircraft
+    not seen for RETENTION_SECONDS are forgotten in both places, so neither
+    the table nor the set grows with every airframe ever seen.
+    """
+
+    # Aircraft unseen for this long are forgotten; a return visit republishes their discovery config
+    RETENTION_SECONDS = 14 * 86400
+    # last_seen is rewritten once it is this stale, and expired rows are pruned this often
+    SEEN_RESOLUTION = 3600.0
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS discovered_aircraft (hex TEXT PRIMARY KEY, published_at REAL NOT NULL, last_seen REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS tracked_squawks (squawk TEXT PRIMARY KEY, data TEXT NOT NULL);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._last_seen: Dict[str, float] = {}  # persisted hex -> last_seen as stored
+        self._last_prune = 0.0
+        self._saved_squawks: Dict[str, Dict[str, Any]] = {}
+        self._saved_flags: Dict[str, bool] = {}
+        self.writes = 0
+        # The watchdog may flush and close from its own thread before restarting a stuck loop
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def discovery_fingerprint() -> str:
+        shape = {
+            "version": get_addon_version(),
+            "mqtt_topic": CONFIG.mqtt_topic,
+            "tracking_mode": CONFIG.tracking_mode,
+            "device_discovery": CONFIG.device_discovery,
+            "feeder_stats_url": CONFIG.feeder_stats_url,
+            "feeder_filter_zero_sensors": CONFIG.feeder_filter_zero_sensors,
+        }
+        return hashlib.sha1(json.dumps(shape, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def open(self) -> bool:
+        import sqlite3  # only needed when state persistence is enabled
+        try:
+            self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(self.SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(discovered_aircraft)")}
+            if "last_seen" not in columns:
+                # Stores written before last_seen existed: give every row a full retention window
+                self._db.execute("ALTER TABLE discovered_aircraft ADD COLUMN last_seen REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE discovered_aircraft SET last_seen = ?", (time.time(),))
+            return True
+        except sqlite3.Error as e:
+            log(f"State store {self.path} unavailable, state will not persist: {e}", "warning")
+            self.close()
+            return False
+
+    def load(self):
+        """Restore persisted state into the module globals"""
+        global FEEDER_DISCOVERY_DONE, FEEDER_DYNAMIC_DISCOVERY_DONE
+        if self._db is None:
+            return
+        started = time.monotonic()
+        db = self._db
+        meta = dict(db.execute("SELECT key, value FROM meta"))
+        fingerprint = self.discovery_fingerprint()
+        if meta.get("fingerprint") != fingerprint:
+            if meta.get("fingerprint"):
+                log("Add-on version or discovery settings changed - discovery configs will be republished")
+            db.execute("BEGIN")
+            db.execute("DELETE FROM discovered_aircraft")
+            db.execute("DELETE FROM meta WHERE key IN ('feeder_discovery_done', 'feeder_dynamic_discovery_done')")
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+            db.execute("COMMIT")
+            meta = {"fingerprint": fingerprint}
+
+        db.execute("DELETE FROM discovered_aircraft WHERE last_seen < ?", (time.time() - self.RETENTION_SECONDS,))
+        self._last_seen = dict(db.execute("SELECT hex, last_seen FROM discovered_aircraft"))
+        hexes = set(self._last_seen)
+        DETAILED_DISCOVERY_PUBLISHED.update(hexes)
+        for squawk, data in db.execute("SELECT squawk, data FROM tracked_squawks"):
+            try:
+                TRACKED_SQUAWKS.setdefault(squawk, json.loads(data))
+            except ValueError:
+                continue
+        FEEDER_DISCOVERY_DONE = FEEDER_DISCOVERY_DONE or meta.get("feeder_discovery_done") == "1"
+        FEEDER_DYNAMIC_DISCOVERY_DONE = FEEDER_DYNAMIC_DISCOVERY_DONE or meta.get("feeder_dynamic_discovery_done") == "1"
+
+        self._saved_squawks = {squawk: dict(info) for squawk, info in TRACKED_SQUAWKS.items()}
+        self._saved_flags = self._flags()
+        log(f"Restored state in {(time.monotonic() - started) * 1000:.0f} ms: {len(hexes)} discovered aircraft, "
+            f"{len(TRACKED_SQUAWKS)} tracked squawks, feeder discovery {'done' if FEEDER_DISCOVERY_DONE else 'pending'}")
+
+    @staticmethod
+    def _flags() -> Dict[str, bool]:
+        return {
+            "feeder_discovery_done": FEEDER_DISCOVERY_DONE,
+            "feeder_dynamic_discovery_done": FEEDER_DYNAMIC_DISCOVERY_DONE,
+        }
+
+    def flush(self, seen=()):
+        """Write state changed since the last flush in a single transaction; seen are this cycle's hexes"""
+        with self._lock:
+            self._flush(seen)
+
+    def _flush(self, seen):
+        if self._db is None:
+            return
+        now = time.time()
+        saved = self._last_seen
+        new_hexes = DETAILED_DISCOVERY_PUBLISHED.difference(saved)
+        dropped = [hex_code for hex_code in saved if hex_code not in DETAILED_DISCOVERY_PUBLISHED]
+        refreshed = {hex_code for hex_code in seen
+                     if now - saved.get(hex_code, now) >= self.SEEN_RESOLUTION and hex_code in DETAILED_DISCOVERY_PUBLISHED}
+        expired = []
+        if now - self._last_prune >= self.SEEN_RESOLUTION:
+            cutoff = now - self.RETENTION_SECONDS
+            expired = [hex_code for hex_code, last_seen in saved.items()
+                       if last_seen < cutoff and hex_code not in refreshed and hex_code in DETAILED_DISCOVERY_PUBLISHED]
+            self._last_prune = now
+        changed_squawks = {squawk: info for squawk, info in TRACKED_SQUAWKS.items() if self._saved_squawks.get(squawk) != info}
+        flags = self._flags()
+        changed_flags = {key: value for key, value in flags.items() if self._saved_flags.get(key) != value}
+        if not (new_hexes or dropped or refreshed or expired or changed_squawks or changed_flags):
+            return
+        try:
+            db = self._db
+            db.execute("BEGIN")
+            db.executemany("INSERT OR IGNORE INTO discovered_aircraft (hex, published_at, last_seen) VALUES (?, ?, ?)",
+                           ((hex_code, now, now) for hex_code in new_hexes))
+            db.executemany("UPDATE discovered_aircraft SET last_seen = ? WHERE hex = ?",
+                           ((now, hex_code) for hex_code in refreshed))
+            db.executemany("DELETE FROM discovered_aircraft WHERE hex = ?",
+                           ((hex_code,) for hex_code in dropped + expired))
+            db.executemany("INSERT OR REPLACE INTO tracked_squawks (squawk, data) VALUES (?, ?)",
+                           ((squawk, json.dumps(info)) for squawk, info in changed_squawks.items()))
+            db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                           ((key, "1" if value else "0") for key, value in changed_flags.items()))
+            db.execute("COMMIT")
+        except Exception as e:
+            log(f"Error saving state to {self.path}: {e}", "error")
+            try:
+                self._db.execute("ROLLBACK")
+            except Exception:
+                pass
+            return
+        self.writes += 1
+        for hex_code in new_hexes | refreshed:
+            saved[hex_code] = now
+        for hex_code in dropped + expired:
+            del saved[hex_code]
+        if expired:
+            DETAILED_DISCOVERY_PUBLISHED.difference_update(expired)
+            log(f"Forgot {len(expired)} aircraft not seen for {self.RETENTION_SECONDS // 86400} days")
+        for squawk, info in changed_squawks.items():
+            self._saved_squawks[squawk] = dict(info)
+        self._saved_flags = flags
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class CaptureWriter:
+    """Append API and feeder snapshots to hourly gzip-compressed NDJSON archives."""
+
+    def __init__(self, directory: str, max_files: int = 48):
+        self.directory = directory
+        self.max_files = max_files
+        self.records_written = 0
+        self.bytes_written = 0
+        self._current_path: Optional[str] = None
+
+    def _archive_path(self, ts: float) -> str:
+        stamp = datetime.fromtimestamp(ts).strftime("%Y%m%d-%H")
+        return os.path.join(self.directory, f"capture-{stamp}.ndjson.gz")
+
+    def _prune(self):
+        """Remove the oldest archives beyond max_files."""
+        archives = sorted(glob.glob(os.path.join(self.directory, "capture-*.ndjson.gz")))
+        for old_path in archives[:-self.max_files]:
+            try:
+                os.remove(old_path)
+                log(f"Removed old capture archive {old_path}")
+            except OSError as e:
+                log(f"Error removing capture archive {old_path}: {e}", "warning")
+
+    def write(self, kind: str, data: Any):
+        """Write one snapshot record; each write is its own gzip member so a crash never corrupts earlier records."""
+        ts = time.time()
+        record = {"ts": round(ts, 3), "kind": kind, "source": CONFIG.api_type, "data": data}
+        try:
+            path = self._archive_path(ts)
+            if path != self._current_path:
+                os.makedirs(self.directory, exist_ok=True)
+                self._current_path = path
+                self._prune()
+            line = json.dumps(record, separators=(",", ":")) + "\n"
+            import gzip  # only loaded when capture mode is on
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self.records_written += 1
+            self.bytes_written += len(line)
         except Exception as e:
-            log(f"Error publishing feeder discovery for {fs['name']}: {e}", "error")
-    FEEDER_DISCOVERY_DONE = True
+            log(f"Error writing capture record: {e}", "error")
 
 
-def _sanitize_metric_key(path_parts):
-    """Sanitize a list of path parts into a safe metric key for unique_id/topic."""
-    safe = []
-    for p in path_parts:
-        if isinstance(p, int):
-            safe.append(str(p))
-        else:
-            safe.append(str(p).lower().replace(" ", "_").replace("/", "_").replace("-", "_").replace("__", "_"))
-    return "_".join(safe)
+class CaptureReplayer:
+    """Replay capture archives through the pipeline at real time or N× speed."""
 
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self.records_replayed = 0
+        self._records = self._iter_records()
+        self._first_ts: Optional[float] = None
+        self._start_monotonic = 0.0
 
-def _iter_leaf_paths(data, prefix=None, depth=0, max_depth=10):
-    """Yield (path_list, value) for each leaf node (non-dict, non-list) in dict."""
-    if prefix is None:
-        prefix = []
-    if depth > max_depth:
-        return
-    if isinstance(data, dict):
-        for k, v in data.items():
-            _iter = _iter_leaf_paths(v, prefix + [k], depth + 1, max_depth)
-            if _iter is None:
+    def _archive_files(self) -> List[str]:
+        if os.path.isdir(self.path):
+            return sorted(glob.glob(os.path.join(self.path, "*.ndjson.gz")) + glob.glob(os.path.join(self.path, "*.ndjson")))
+        return [self.path]
+
+    def _iter_records(self):
+        import gzip  # only loaded when replay mode is on
+        for archive in self._archive_files():
+            opener = gzip.open if archive.endswith(".gz") else open
+            try:
+                with opener(archive, "rt", encoding="utf-8") as f:
+                    for line_no, line in enumerate(f, 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            log(f"Skipping malformed capture record {archive}:{line_no}", "warning")
+            except (OSError, EOFError) as e:
+                log(f"Error reading capture archive {archive}: {e}", "error")
+
+    def _wait_for(self, record_ts: float):
+        """Sleep until the record's offset from the first record, scaled by speed, has elapsed."""
+        if self._first_ts is None:
+            self._first_ts = record_ts
+            self._start_monotonic = time.monotonic()
+            return
+        if self.speed <= 0:
+            return
+        due = self._start_monotonic + (record_ts - self._first_ts) / self.speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def next_cycle(self):
+        """Return (aircraft_data, feeder_snapshots) for the next aircraft record, or None when exhausted."""
+        feeder_snapshots = []
+        for record in self._records:
+            self._wait_for(float(record.get("ts", 0)))
+            self.records_replayed += 1
+            if record.get("kind") == "feeder":
+                feeder_snapshots.append(record.get("data"))
                 continue
-            for item in _iter:
-                yield item
-    elif isinstance(data, list):
-        # Skip long arrays; expose their length instead
-        length = len(data)
-        yield (prefix + ["length"], length)
-    else:
-        # primitive leaf
-        yield (prefix, data)
+            return record.get("data"), feeder_snapshots
+        return None
 
 
-def _publish_dynamic_feeder_discovery(mqtt_manager, stats: Dict[str, Any], limit: int = 200):
-    """Publish discovery entries for all leaf metrics in stats.json."""
-    global FEEDER_DYNAMIC_DISCOVERY_DONE
-    if FEEDER_DYNAMIC_DISCOVERY_DONE or not stats:
-        return
-    sensors_published = 0
-    for path, value in _iter_leaf_paths(stats):
-        # Only publish reasonable primitives
-        if not isinstance(value, (int, float, bool, str)):
-            continue
-        metric_key = _sanitize_metric_key(path)
-        discovery_topic = f"homeassistant/sensor/airplanes_live_feeder_{metric_key}/config"
-        json_path = "value_json." + ".".join([str(p) for p in path])
-        # For integer metrics, hide zeros by emitting 'none' so HA shows unavailable
-        if FEEDER_FILTER_ZERO_SENSORS and isinstance(value, int):
-            value_template = "{{ " + json_path + " if (" + json_path + " | int(0) > 0) else none }}"
-        else:
-            value_template = "{{ " + json_path + " }}"
-        payload = {
-            "name": f"Feeder: {'/'.join([str(p) for p in path])}",
-            "state_topic": f"{MQTT_TOPIC}/feeder/summary",
-            "unique_id": f"airplanes_live_feeder_{metric_key}",
-            "value_template": value_template,
-            "device": {
-                "identifiers": [FEEDER_DEVICE_ID],
-                "name": FEEDER_DEVICE_NAME,
-                "manufacturer": "BenCos17",
-                "model": "Aircraft Tracker (Powered by airplanes.live)",
-                "sw_version": get_addon_version()
+class CycleProfiler:
+    """On-demand profiler armed over MQTT for the next N update cycles.
+
+    While idle, begin_cycle()/end_cycle() are a single attribute check. Only
+    the work portion of each cycle is profiled, not the sleep between cycles.
+    """
+
+    MODES = ("cprofile", "sample")
+    SORT_KEYS = ("cumulative", "tottime")
+
+    def __init__(self, output_dir: Optional[str] = None):
+        self.output_dir = output_dir
+        self.armed = False
+        self._lock = threading.Lock()
+        self._request: Optional[Dict[str, Any]] = None
+        self._session: Optional[Dict[str, Any]] = None
+        self._profile = None
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling = threading.Event()
+        self._stop_sampler = threading.Event()
+        self._samples: Dict[str, int] = {}
+        self._stacks: Dict[str, int] = {}
+        self._sample_count = 0
+
+    def request(self, topic: str, payload: bytes):
+        """Handle a profile command: a cycle count or JSON {cycles, mode, top, sort, save, interval_ms}."""
+        try:
+            text = payload.decode("utf-8").strip() if isinstance(payload, (bytes, bytearray)) else str(payload).strip()
+            options = json.loads(text) if text else {}
+            if isinstance(options, int):
+                options = {"cycles": options}
+            if not isinstance(options, dict):
+                raise ValueError("payload must be an integer or a JSON object")
+            request = {
+                "cycles": max(1, min(int(options.get("cycles", 3)), 100)),
+                "mode": options.get("mode", "cprofile"),
+                "top": max(1, min(int(options.get("top", 15)), 50)),
+                "sort": options.get("sort", "cumulative"),
+                "save": bool(options.get("save", False)),
+                "interval_ms": max(1.0, float(options.get("interval_ms", 5))),
             }
+            if request["mode"] not in self.MODES:
+                raise ValueError(f"mode must be one of {', '.join(self.MODES)}")
+            if request["sort"] not in self.SORT_KEYS:
+                raise ValueError(f"sort must be one of {', '.join(self.SORT_KEYS)}")
+        except (ValueError, TypeError) as e:
+            log(f"Ignoring invalid profile command on {topic}: {e}", "warning")
+            return
+        with self._lock:
+            self._request = request
+            self.armed = True
+        log(f"Profiling armed: {request['mode']} for the next {request['cycles']} cycles")
+
+    def begin_cycle(self):
+        """Start (or resume) profiling at the start of a cycle's work."""
+        if not self.armed:
+            return
+        if self._session is None:
+            with self._lock:
+                request, self._request = self._request, None
+            if request is None:
+                return
+            self._start(request)
+        session = self._session
+        session["cycle_started"] = time.perf_counter()
+        if session["mode"] == "cprofile":
+            self._profile.enable()
+        else:
+            self._sampling.set()
+
+    def end_cycle(self, mqtt_manager):
+        """Pause profiling at the end of a cycle's work; publish the report after the last cycle."""
+        session = self._session
+        if session is None:
+            return
+        if session["mode"] == "cprofile":
+            self._profile.disable()
+        else:
+            self._sampling.clear()
+        session["profiled_seconds"] += time.perf_counter() - session["cycle_started"]
+        session["remaining"] -= 1
+        if session["remaining"] <= 0:
+            self._finish(mqtt_manager)
+
+    def _start(self, request: Dict[str, Any]):
+        self._session = dict(request, remaining=request["cycles"], profiled_seconds=0.0, started=datetime.now().isoformat())
+        if request["mode"] == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+        else:
+            self._samples = {}
+            self._stacks = {}
+            self._sample_count = 0
+            self._stop_sampler.clear()
+            self._sampler = threading.Thread(
+                target=self._sample_loop,
+                args=(threading.main_thread().ident, request["interval_ms"] / 1000.0),
+                name="profile-sampler",
+                daemon=True,
+            )
+            self._sampler.start()
+
+    def _sample_loop(self, thread_id: int, interval: float):
+        """Record the main thread's stack while a profiled cycle is running."""
+        while not self._stop_sampler.is_set():
+            if not self._sampling.wait(0.2):
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                name = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+                stack.append(name)
+                if name not in seen:
+                    seen.add(name)
+                    self._samples[name] = self._samples.get(name, 0) + 1
+                frame = frame.f_back
+            if stack:
+                self._sample_count += 1
+                # Collapsed stack (root first) for flame graph tools
+                folded = ";".join(reversed(stack))
+                self._stacks[folded] = self._stacks.get(folded, 0) + 1
+            time.sleep(interval)
+
+    def _finish(self, mqtt_manager):
+        session, self._session = self._session, None
+        with self._lock:
+            self.armed = self._request is not None
+        report = {
+            "mode": session["mode"],
+            "cycles": session["cycles"],
+            "started": session["started"],
+            "profiled_seconds": round(session["profiled_seconds"], 4),
         }
         try:
-            mqtt_manager.publish(discovery_topic, json.dumps(payload), retain=True)
-            sensors_published += 1
+            if session["mode"] == "cprofile":
+                report.update(self._cprofile_report(session))
+            else:
+                report.update(self._sample_report(session))
         except Exception as e:
-            log(f"Error publishing dynamic feeder discovery for {metric_key}: {e}", "error")
-        if sensors_published >= limit:
-            break
-    if sensors_published > 0:
-        FEEDER_DYNAMIC_DISCOVERY_DONE = True
-        log(f"Published {sensors_published} dynamic feeder sensors (limit {limit})")
+            log(f"Error building profile report: {e}", "error")
+            report["error"] = str(e)
+        finally:
+            self._profile = None
+        mqtt_manager.publish(f"{CONFIG.mqtt_topic}/profile/report", json.dumps(report), qos=1, retain=False)
+        log(f"Published profile report ({session['mode']}, {session['cycles']} cycles)")
 
+    def _output_path(self, suffix: str) -> str:
+        return os.path.join(self.output_dir or PROFILE_OUTPUT_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{suffix}")
 
-def fetch_feeder_stats() -> Optional[Dict[str, Any]]:
-    """Fetch local feeder stats JSON (e.g., readsb/dump1090 metrics.json)."""
-    if not FEEDER_MONITOR_ENABLED:
-        return None
-    try:
-        log(f"Fetching feeder stats from: {FEEDER_STATS_URL}")
-        resp = requests.get(FEEDER_STATS_URL, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        if isinstance(data, dict) and data:
-            return data
-        log("Feeder stats response was empty or not a dict", "warning")
-        return None
-    except requests.exceptions.Timeout:
-        log("Feeder stats request timed out", "warning")
-        return None
-    except Exception as e:
-        log(f"Error fetching feeder stats: {e}", "warning")
-        return None
+    def _prune(self):
+        """Remove the oldest saved profiles beyond profile_max_files."""
+        directory = self.output_dir or PROFILE_OUTPUT_DIR
+        saved = sorted(glob.glob(os.path.join(directory, "profile-*.pstats")) + glob.glob(os.path.join(directory, "profile-*.folded")),
+                       key=os.path.basename)
+        for old_path in saved[:-CONFIG.profile_max_files]:
+            try:
+                os.remove(old_path)
+                log(f"Removed old profile {old_path}")
+            except OSError as e:
+                log(f"Error removing profile {old_path}: {e}", "warning")
 
+    def _cprofile_report(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        import pstats
+        stats = pstats.Stats(self._profile)
+        sort_index = 3 if session["sort"] == "cumulative" else 2
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][sort_index], reverse=True)
+        top = []
+        for (filename, line, func), (cc, nc, tt, ct, _callers) in rows[:session["top"]]:
+            top.append({
+                "func": f"{os.path.basename(filename)}:{line}({func})",
+                "calls": nc,
+                "tottime_ms": round(tt * 1000, 2),
+                "cumtime_ms": round(ct * 1000, 2),
+            })
+        result: Dict[str, Any] = {"sort": session["sort"], "total_calls": stats.total_calls, "top": top}
+        if session["save"]:
+            path = self._output_path("pstats")
+            try:
+                self._profile.dump_stats(path)
+                result["file"] = path
+                log(f"Wrote profile statistics to {path}")
+                self._prune()
+            except OSError as e:
+                log(f"Error writing profile statistics: {e}", "error")
+                result["file_error"] = str(e)
+        return result
 
-def publish_feeder_stats(mqtt_manager, stats: Optional[Dict[str, Any]]):
-    """Publish feeder stats to MQTT: raw payload and summarized fields."""
-    if not FEEDER_MONITOR_ENABLED:
+    def _sample_report(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        self._stop_sampler.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+        total = max(self._sample_count, 1)
+        rows = sorted(self._samples.items(), key=lambda item: item[1], reverse=True)
+        top = [{"func": name, "samples": count, "percent": round(100.0 * count / total, 1)} for name, count in rows[:session["top"]]]
+        result: Dict[str, Any] = {"interval_ms": session["interval_ms"], "samples": self._sample_count, "top": top}
+        if session["save"]:
+            path = self._output_path("folded")
+            try:
+                with open(path, "w") as f:
+                    for stack, count in sorted(self._stacks.items()):
+                        f.write(f"{stack} {count}\n")
+                result["file"] = path
+                log(f"Wrote collapsed stack samples to {path}")
+                self._prune()
+            except OSError as e:
+                log(f"Error writing collapsed stack samples: {e}", "error")
+                result["file_error"] = str(e)
+        return result
+
+
+# MQTT Configuration and State
+def configure_mqtt_manager(mqtt_manager):
+    """Apply the configured QoS/retain defaults and the aircraft state expiry to a manager's policies"""
+    mqtt_manager.qos = CONFIG.mqtt_qos
+    mqtt_manager.retain = CONFIG.mqtt_retain
+    for topic_class in ("aircraft", "aggregate"):
+        mqtt_manager.set_policy(topic_class, expiry=CONFIG.aircraft_state_expiry or None)
+
+
+def _shard_worker_main(conn, config: "AddonConfig", index: int, discovered: List[str]):
+    """Worker process loop: publish the shards ShardPool sends and reply with partial summaries"""
+    global CONFIG, AIRCRAFT_DB
+    CONFIG = config
+    DETAILED_DISCOVERY_PUBLISHED.update(discovered)
+    mqtt_manager = MQTTManager(CONFIG.mqtt_broker, CONFIG.mqtt_port, CONFIG.mqtt_topic, CONFIG.mqtt_username, CONFIG.mqtt_password)
+    configure_mqtt_manager(mqtt_manager)
+    mqtt_manager.report_status = False
+    if not mqtt_manager.connect(budget=ShardPool.CONNECT_BUDGET):
+        log(f"Shard worker {index} could not connect to the MQTT broker - exiting", "error")
+        conn.close()
         return
     try:
-        base_topic = f"{MQTT_TOPIC}/feeder"
-        # Raw
-        mqtt_manager.publish(f"{base_topic}/raw", json.dumps(stats or {}), retain=True)
-        # Summary mirrors the raw structure but is intended for HA sensors value_template
-        mqtt_manager.publish(f"{base_topic}/summary", json.dumps(stats or {}), retain=True)
-        # Ensure discovery exists once stats are published
-        if not FEEDER_DISCOVERY_DONE:
-            _publish_feeder_discovery(mqtt_manager)
-        # Publish dynamic sensors for all leaf metrics (first time only)
-        if not FEEDER_DYNAMIC_DISCOVERY_DONE and stats:
-            _publish_dynamic_feeder_discovery(mqtt_manager, stats)
-    except Exception as e:
-        log(f"Error publishing feeder stats: {e}", "error")
+        conn.send("ready")
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            shard, publish, db_ready, handoff = message
+            DETAILED_DISCOVERY_PUBLISHED.update(handoff)
+            if db_ready and AIRCRAFT_DB is None:
+                db = AircraftDatabase(CONFIG.aircraft_db_csv, AIRCRAFT_DB_FILE)
+                if db.open(build=False):
+                    AIRCRAFT_DB = db
+            partial = SummaryAccumulator(CONFIG.top_n_count).add(shard)
+            wanted = None if publish is None else set(publish)
+            aircraft = [ac for i, ac in shard if wanted is None or i in wanted]
+            new_hexes = [ac.get('hex') for ac in aircraft if ac.get('hex') not in DETAILED_DISCOVERY_PUBLISHED]
+            publish_individual_aircraft(mqtt_manager, aircraft)
+            conn.send((partial, [h for h in new_hexes if h in DETAILED_DISCOVERY_PUBLISHED]))
+    except (EOFError, KeyboardInterrupt):
+        pass  # Coordinator went away
+    finally:
+        mqtt_manager.disconnect()
+        conn.close()
+
+
+class ShardPool:
+    """Worker processes that publish detailed aircraft for a hash partition of the hexes.
+
+    An aircraft goes to worker int(hex, 16) % size, so it stays on the same
+    worker (and its discovery state with it) from cycle to cycle. Each worker
+    has its own MQTT connection and replies with a partial
+    SummaryAccumulator that the coordinator merges for the summary. A worker
+    only gets shards once it has reported "ready" after connecting (within
+    CONNECT_BUDGET seconds, or it exits). Until then, and when a worker dies
+    or misses the deadline, its shard is handled in-process; dead workers
+    are restarted on the next cycle. Discovery configs published in-process
+    are handed to the worker with its next shard.
+    """
+
+    CONNECT_BUDGET = 15.0
+
+    def __init__(self, size: int, config: AddonConfig):
+        import multiprocessing  # Only needed in worker mode
+        # spawn rather than fork: the coordinator already runs paho's network thread
+        self._context = multiprocessing.get_context("spawn")
+        self.size = size
+        self.config = config
+        self._workers: List[Optional[tuple]] = [None] * size  # (process, connection)
+        self._ready = [False] * size
+        self._handoff: List[List[str]] = [[] for _ in range(size)]
+        self.started = 0
+        self.fallbacks = 0
+        self.shard_sizes = [0] * size
+
+    def shard_of(self, hex_code: Any) -> int:
+        try:
+            return int(str(hex_code).lstrip("~"), 16) % self.size
+        except ValueError:
+            return int.from_bytes(hashlib.blake2b(str(hex_code).encode("utf-8"), digest_size=4).digest(), "big") % self.size
+
+    def _start(self, index: int):
+        parent_conn, child_conn = self._context.Pipe()
+        discovered = [h for h in DETAILED_DISCOVERY_PUBLISHED if self.shard_of(h) == index]
+        process = self._context.Process(
+            target=_shard_worker_main, args=(child_conn, self.config, index, discovered),
+            name=f"shard-{index}", daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._workers[index] = (process, parent_conn)
+        self._ready[index] = False
+        self._handoff[index] = []
+        self.started += 1
+
+    def start(self):
+        for index in range(self.size):
+            self._start(index)
+        log(f"Started {self.size} shard worker processes")
+
+    def _stop(self, index: int, timeout: float = 0.0):
+        """Forget worker index, giving it timeout seconds to exit before it is terminated"""
+        worker = self._workers[index]
+        self._workers[index] = None
+        self._ready[index] = False
+        if worker is None:
+            return
+        process, conn = worker
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(1)
+        conn.close()
+
+    def close(self):
+        # Ask every worker first so they disconnect in parallel
+        for worker in self._workers:
+            if worker is not None:
+                try:
+                    worker[1].send(None)
+                except (OSError, ValueError):
+                    pass
+        for index in range(self.size):
+            self._stop(index, timeout=2.0)
+
+    def _is_ready(self, index: int) -> bool:
+        """Whether worker index has connected, reading its one-off ready message if it has arrived"""
+        if not self._ready[index]:
+            try:
+                conn = self._workers[index][1]
+                if conn.poll(0) and conn.recv() == "ready":
+                    self._ready[index] = True
+                    log(f"Shard worker {index} connected", "debug")
+            except (OSError, EOFError):
+                pass  # Exited; restarted on the next cycle
+        return self._ready[index]
+
+    def _run_locally(self, mqtt_manager, index, shard, publish) -> SummaryAccumulator:
+        wanted = None if publish is None else set(publish)
+        aircraft = [ac for i, ac in shard if wanted is None or i in wanted]
+        new_hexes = [ac.get('hex') for ac in aircraft if ac.get('hex') not in DETAILED_DISCOVERY_PUBLISHED]
+        publish_individual_aircraft(mqtt_manager, aircraft)
+        self._handoff[index].extend(h for h in new_hexes if h in DETAILED_DISCOVERY_PUBLISHED)
+        return SummaryAccumulator(self.config.top_n_count).add(shard)
+
+    def process(self, mqtt_manager, aircraft_list, publish_hexes: Optional[set] = None) -> SummaryAccumulator:
+        """Publish detailed aircraft across the workers and return the merged summary accumulator
+
+        publish_hexes limits detailed publishing (watchlist); None publishes all.
+        """
+        shards: List[List[tuple]] = [[] for _ in range(self.size)]
+        publish: List[Optional[List[int]]] = [None if publish_hexes is None else [] for _ in range(self.size)]
+        for index, ac in enumerate(aircraft_list or []):
+            hex_code = ac.get('hex')
+            shard = self.shard_of(hex_code)
+            shards[shard].append((index, ac))
+            if publish_hexes is not None and hex_code in publish_hexes:
+                publish[shard].append(index)
+        self.shard_sizes = [len(shard) for shard in shards]
+
+        db_ready = AIRCRAFT_DB is not None
+        pending = []
+        accumulator = SummaryAccumulator(self.config.top_n_count)
+        for index, shard in enumerate(shards):
+            worker = self._workers[index]
+            if worker is None or not worker[0].is_alive():
+                if worker is not None:
+                    log(f"Shard worker {index} exited (code {worker[0].exitcode}) - restarting", "warning")
+                self._stop(index)
+                self._start(index)
+                worker = self._workers[index]
+            if not self._is_ready(index):
+                # Still connecting: sending now could block on a worker that is not reading yet
+                log(f"Shard worker {index} not connected yet - publishing {len(shard)} aircraft in-process", "debug")
+                self.fallbacks += 1
+                accumulator.merge(self._run_locally(mqtt_manager, index, shard, publish[index]))
+                continue
+            try:
+                worker[1].send((shard, publish[index], db_ready, self._handoff[index]))
+                self._handoff[index] = []
+                pending.append(index)
+            except (OSError, ValueError) as e:
+                log(f"Shard worker {index} unreachable ({e}) - publishing {len(shard)} aircraft in-process", "warning")
+                self._stop(index)
+                self.fallbacks += 1
+                accumulator.merge(self._run_locally(mqtt_manager, index, shard, publish[index]))
+
+        # Generous enough for a first cycle full of discovery configs; only a stalled worker misses it
+        deadline = time.monotonic() + max(3 * self.config.update_interval, 30)
+        for index in pending:
+            conn = self._workers[index][1]
+            try:
+                if not conn.poll(max(deadline - time.monotonic(), 0)):
+                    raise TimeoutError("no reply before the deadline")
+                partial, discovered = conn.recv()
+                accumulator.merge(partial)
+                DETAILED_DISCOVERY_PUBLISHED.update(discovered)
+            except (OSError, EOFError, TimeoutError) as e:
+                log(f"Shard worker {index} failed ({e}) - publishing {len(shards[index])} aircraft in-process", "warning")
+                self._stop(index)
+                self.fallbacks += 1
+                accumulator.merge(self._run_locally(mqtt_manager, index, shards[index], publish[index]))
+        return accumulator
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.size,
+            "alive": sum(1 for worker in self._workers if worker is not None and worker[0].is_alive()),
+            "ready": sum(self._ready),
+            "restarts": self.started - self.size,
+            "fallbacks": self.fallbacks,
+            "shard_sizes": self.shard_sizes,
+        }
+
 
-# MQTT Configuration and State
 class MQTTManager:
+    # Messages held while disconnected or refused by paho; beyond this the oldest are dropped
+    MAX_QUEUED_MESSAGES = 10000
+    # Seconds a reconnect from the main loop may take; well below the watchdog's 120 s minimum stall
+    RECONNECT_BUDGET = 30.0
+    # Delivery policy per topic class. qos/retain of None take the configured mqtt_qos/mqtt_retain.
+    # High-volume per-cycle data goes out at QoS 0 and unretained: no PUBACK per message and nothing
+    # for the broker to store, since the next cycle replaces it anyway.
+    PUBLISH_POLICIES = {
+        "summary": {"qos": None, "retain": True, "expiry": None},  # also top lists, statistics, overhead
+        "squawk": {"qos": 1, "retain": True, "expiry": None},
+        "aircraft": {"qos": 0, "retain": False, "expiry": None},
+        "aggregate": {"qos": 0, "retain": False, "expiry": None},
+        "discovery": {"qos": 1, "retain": True, "expiry": None},
+        "feeder_raw": {"qos": 0, "retain": False, "expiry": None},
+        "feeder_summary": {"qos": None, "retain": True, "expiry": None},
+        "status": {"qos": 1, "retain": True, "expiry": None},
+        "diagnostics": {"qos": 0, "retain": False, "expiry": None},
+        "default": {"qos": None, "retain": None, "expiry": None},
+    }
+
     def __init__(self, broker: str, port: int, topic: str, username: str = "", password: str = ""):
         self.broker = broker
         self.port = port
@@ -1180,12 +4410,45 @@ class MQTTManager:
         self.connected = False
         self.reconnect_delay = 1
         self.max_reconnect_delay = 300  # 5 minutes
-        self.message_queue = Queue()
+        self.message_queue = Queue(maxsize=self.MAX_QUEUED_MESSAGES)
+        self.queue_dropped = 0
+        # Handed to paho but not yet written (QoS 0) or acknowledged (QoS 1/2); on_publish confirms both
+        self.unconfirmed = 0
+        self._unconfirmed_lock = threading.Lock()
         self.last_heartbeat = 0
         self.heartbeat_interval = 30  # seconds
         self.connection_lock = threading.Lock()
+        self.connected_event = threading.Event()
         self.qos = 1
         self.retain = True
+        self.policies = {name: dict(policy) for name, policy in self.PUBLISH_POLICIES.items()}
+        self.published_by_class: Dict[str, int] = {}
+        self.subscriptions: Dict[str, Callable[[str, bytes], None]] = {}
+        # MQTT v5 topic aliases; the table is per connection and sized by the broker's CONNACK
+        self.topic_alias_maximum = 0
+        self.topic_alias_idle_seconds = 120
+        self._topic_aliases: "OrderedDict[str, List[Any]]" = OrderedDict()  # topic -> [alias, last_used]
+        self._alias_candidates: "OrderedDict[str, None]" = OrderedDict()
+        self._alias_lock = threading.Lock()
+        self.alias_eligible = 0
+        self.alias_hits = 0
+        self.alias_assignments = 0
+        self.alias_bytes_saved = 0
+        # Retained discovery configs seen on the broker (topic -> payload hash) and those confirmed this session
+        self.discovery_filters = ["homeassistant/sensor/+/config", "homeassistant/device/+/config"]
+        self.retained_discovery: Dict[str, str] = {}
+        self.discovery_confirmed = set()
+        self.discovery_synced = False
+        self.discovery_skipped = 0
+        self.discovery_sent = 0
+        self.discovery_removed = 0
+        self._discovery_lock = threading.Lock()
+        self._suback_event = threading.Event()
+        # Worker connections leave <topic>/status (and its last will) to the coordinator's connection
+        self.report_status = True
+        # Liveness for the watchdog: paho's network loop confirms each publish through on_publish
+        self.last_publish_ack: Optional[float] = None
+        self.publish_pending_since: Optional[float] = None
         
     def create_client(self):
         """Create and configure MQTT client"""
@@ -1205,6 +4468,8 @@ class MQTTManager:
         self.client.on_disconnect = self._on_disconnect
         self.client.on_publish = self._on_publish
         self.client.on_log = self._on_log
+        self.client.on_message = self._on_message
+        self.client.on_subscribe = self._on_subscribe
         
         # Configure authentication
         if self.username and self.password:
@@ -1214,13 +4479,15 @@ class MQTTManager:
             log("No MQTT credentials provided - attempting anonymous connection", "warning")
         
         # Set last will and testament
-        will_topic = f"{self.topic}/status"
-        will_payload = json.dumps({
-            "status": "offline",
-            "last_seen": datetime.now().isoformat(),
-            "reason": "unexpected_disconnect"
-        })
-        self.client.will_set(will_topic, will_payload, qos=1, retain=True)
+        if self.report_status:
+            will_topic = f"{self.topic}/status"
+            will_payload = json.dumps({
+                "status": "offline",
+                "last_seen": datetime.now().isoformat(),
+                "reason": "unexpected_disconnect"
+            })
+            qos, retain, _ = self.resolve_policy("status")
+            self.client.will_set(will_topic, will_payload, qos=qos, retain=retain)
         
         # Set connection parameters
         self.client.reconnect_delay_set(min_delay=1, max_delay=300)
@@ -1232,13 +4499,30 @@ class MQTTManager:
         if reasonCode == 0:
             self.connected = True
             self.reconnect_delay = 1  # Reset delay on successful connection
+            # QoS 0 packets left unsent by the old connection are gone and will never be confirmed
+            with self._unconfirmed_lock:
+                self.unconfirmed = 0
             log("Connected to MQTT broker successfully")
+
+            # Aliases never survive a reconnect; start over with the broker's new limit
+            with self._alias_lock:
+                self._topic_aliases.clear()
+                self.topic_alias_maximum = getattr(properties, "TopicAliasMaximum", 0) if properties else 0
+            if self.topic_alias_maximum:
+                log(f"Broker allows {self.topic_alias_maximum} topic aliases")
             
             # Publish online status
             self._publish_status("online", "startup")
             
             # Process queued messages
             self._process_message_queue()
+
+            # Restore command subscriptions (they do not survive a reconnect)
+            for topic in self.subscriptions:
+                client.subscribe(topic, qos=1)
+
+            # Wake connect() now rather than on its next poll
+            self.connected_event.set()
             
         else:
             self.connected = False
@@ -1250,9 +4534,13 @@ class MQTTManager:
             elif reasonCode == 4:
                 log("MQTT bad username or password", "error")
     
-    def _on_disconnect(self, client, userdata, rc, properties=None):
+    def _on_disconnect(self, client, userdata, *args):
         """Handle MQTT disconnection events"""
+        # VERSION2 callbacks pass (flags, reason_code, properties); VERSION1 passes (rc[, properties])
+        rc = args[1] if len(args) >= 3 else (args[0] if args else 0)
         self.connected = False
+        self.connected_event.clear()
+        self.publish_pending_since = None  # A broker outage is not a stalled network loop
         log(f"Disconnected from MQTT broker with reason code: {rc}", "warning")
         
         if rc == 0:
@@ -1270,10 +4558,119 @@ class MQTTManager:
         else:
             log(f"Disconnect with unknown reason code: {rc}")
     
-    def _on_publish(self, client, userdata, mid):
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
         """Handle successful message publish"""
+        with self._unconfirmed_lock:
+            # QoS 1/2 messages resent after a reconnect were already written off in _on_connect
+            self.unconfirmed = max(self.unconfirmed - 1, 0)
+        self.last_publish_ack = time.monotonic()
+        self.publish_pending_since = None
         log(f"Message published successfully (ID: {mid})", "debug")
     
+    def _on_message(self, client, userdata, message):
+        """Dispatch incoming messages to the handler registered for the matching subscription"""
+        for topic_filter, handler in list(self.subscriptions.items()):
+            if mqtt.topic_matches_sub(topic_filter, message.topic):
+                try:
+                    handler(message.topic, message.payload)
+                except Exception as e:
+                    log(f"Error handling message on {message.topic}: {e}", "error")
+
+    def _on_subscribe(self, client, userdata, mid, *args):
+        self._suback_event.set()
+
+    def unsubscribe(self, topic: str):
+        self.subscriptions.pop(topic, None)
+        if self.connected and self.client is not None:
+            try:
+                self.client.unsubscribe(topic)
+            except Exception as e:
+                log(f"Error unsubscribing from {topic}: {e}", "error")
+
+    def sync_retained_discovery(self, object_prefixes=("airplanes_live_", "airplane_"), timeout: float = 5.0, quiet: float = 0.3) -> bool:
+        """Briefly subscribe to the discovery prefixes and record hashes of our retained configs.
+
+        The broker sends retained messages right after SUBACK; collection stops
+        once nothing new arrived for `quiet` seconds (or after `timeout`).
+        Returns False when the subscription was not acknowledged, in which
+        case publish_discovery() publishes every config as before.
+        """
+        if not self.connected or self.client is None:
+            return False
+        last_message = [time.monotonic()]
+
+        def collect(topic: str, payload: bytes):
+            object_id = topic.split("/")[-2]
+            if not object_id.startswith(object_prefixes):
+                return
+            with self._discovery_lock:
+                if payload:
+                    self.retained_discovery[topic] = hashlib.sha1(payload).hexdigest()
+                else:
+                    self.retained_discovery.pop(topic, None)
+            last_message[0] = time.monotonic()
+
+        started = time.monotonic()
+        for topic_filter in self.discovery_filters:
+            self._suback_event.clear()
+            self.subscribe(topic_filter, collect)
+            if not self._suback_event.wait(timeout):
+                for subscribed in self.discovery_filters:
+                    self.unsubscribe(subscribed)
+                log("Discovery sync: broker did not acknowledge the subscription - publishing all configs", "warning")
+                return False
+        last_message[0] = time.monotonic()
+        while time.monotonic() - started < timeout and time.monotonic() - last_message[0] < quiet:
+            time.sleep(0.05)
+        for topic_filter in self.discovery_filters:
+            self.unsubscribe(topic_filter)
+        self.discovery_synced = True
+        log(f"Discovery sync: {len(self.retained_discovery)} retained configs on the broker "
+            f"({(time.monotonic() - started) * 1000:.0f} ms)")
+        return True
+
+    def publish_discovery(self, topic: str, payload: str) -> bool:
+        """Publish a retained discovery config unless the broker already holds an identical one"""
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        with self._discovery_lock:
+            self.discovery_confirmed.add(topic)
+            if self.retained_discovery.get(topic) == digest:
+                self.discovery_skipped += 1
+                return True
+            self.retained_discovery[topic] = digest
+            self.discovery_sent += 1
+        return self.publish(topic, payload, topic_class="discovery")
+
+    def has_retained_discovery(self, topic: str) -> bool:
+        with self._discovery_lock:
+            return topic in self.retained_discovery
+
+    def remove_orphaned_discovery(self, is_current: Callable[[str], bool]) -> int:
+        """Clear retained configs not confirmed this session and not claimed by is_current(topic)"""
+        if not self.discovery_synced:
+            return 0
+        with self._discovery_lock:
+            orphans = [topic for topic in self.retained_discovery
+                       if topic not in self.discovery_confirmed and not is_current(topic)]
+            for topic in orphans:
+                del self.retained_discovery[topic]
+        for topic in orphans:
+            self.publish(topic, "", retain=True, topic_class="discovery")
+        self.discovery_removed += len(orphans)
+        if orphans:
+            log(f"Removed {len(orphans)} orphaned discovery configs")
+        return len(orphans)
+
+    def subscribe(self, topic: str, handler: Callable[[str, bytes], None]):
+        """Subscribe to a topic and route its messages to handler(topic, payload); kept across reconnects"""
+        self.subscriptions[topic] = handler
+        if self.connected and self.client is not None:
+            try:
+                self.client.subscribe(topic, qos=1)
+                log(f"Subscribed to {topic}")
+            except Exception as e:
+                log(f"Error subscribing to {topic}: {e}", "error")
+
     def _on_log(self, client, userdata, level, buf):
         """Handle MQTT client logs"""
         if level == mqtt.MQTT_LOG_ERR:
@@ -1287,7 +4684,7 @@ class MQTTManager:
     
     def _publish_status(self, status: str, reason: str):
         """Publish connection status"""
-        if not self.connected or self.client is None:
+        if not self.connected or self.client is None or not self.report_status:
             return
             
         status_topic = f"{self.topic}/status"
@@ -1299,11 +4696,43 @@ class MQTTManager:
         })
         
         try:
-            self.client.publish(status_topic, status_payload, qos=1, retain=True)
+            qos, retain, _ = self.resolve_policy("status")
+            info = self._client_publish(status_topic, status_payload, qos, retain)
             log(f"Published status: {status} ({reason})")
+            return info
         except Exception as e:
             log(f"Error publishing status: {e}", "error")
     
+    def _enqueue(self, message: tuple):
+        """Queue a message for later, dropping the oldest once the queue is full"""
+        while True:
+            try:
+                self.message_queue.put_nowait(message)
+                return
+            except Full:
+                try:
+                    self.message_queue.get_nowait()
+                    self.queue_dropped += 1
+                except Empty:
+                    pass
+
+    def backlog(self) -> int:
+        """Messages not yet delivered: our queue plus those paho has not written or had acknowledged"""
+        return self.message_queue.qsize() + self.unconfirmed
+
+    def _client_publish(self, topic: str, payload: Any, qos: int, retain: bool, properties: Optional[Properties] = None):
+        """paho publish that keeps the unconfirmed count; counted first so on_publish cannot run ahead of it"""
+        with self._unconfirmed_lock:
+            self.unconfirmed += 1
+        result = None
+        try:
+            result = self.client.publish(topic, payload, qos=qos, retain=retain, properties=properties)
+            return result
+        finally:
+            if result is None or result.rc != mqtt.MQTT_ERR_SUCCESS:
+                with self._unconfirmed_lock:
+                    self.unconfirmed = max(self.unconfirmed - 1, 0)
+
     def _process_message_queue(self):
         """Process any queued messages when reconnecting"""
         if not self.connected or self.client is None:
@@ -1312,8 +4741,8 @@ class MQTTManager:
         processed = 0
         while not self.message_queue.empty():
             try:
-                topic, payload, qos, retain = self.message_queue.get_nowait()
-                self.client.publish(topic, payload, qos=qos, retain=retain)
+                topic, payload, qos, retain, properties = self.message_queue.get_nowait()
+                self._client_publish(topic, payload, qos, retain, properties)
                 processed += 1
             except Exception as e:
                 log(f"Error processing queued message: {e}", "error")
@@ -1321,13 +4750,82 @@ class MQTTManager:
         if processed > 0:
             log(f"Processed {processed} queued messages")
     
-    def publish(self, topic: str, payload: Any, qos: Optional[int] = None, retain: Optional[bool] = None):
-        """Publish message with queuing support and safe payload normalization."""
-        # Use instance defaults if not specified
+    def _alias_for(self, topic: str, properties: Optional[Properties]):
+        """Return (topic_to_send, properties) using a topic alias for hot topics; call with _alias_lock held.
+
+        A topic gets an alias the second time it is published. When the table is
+        full, only an alias idle for topic_alias_idle_seconds is reused, so a
+        cycle's worth of per-aircraft topics cannot thrash the table.
+        """
+        self.alias_eligible += 1
+        now = time.monotonic()
+        entry = self._topic_aliases.get(topic)
+        if entry is not None:
+            entry[1] = now
+            self._topic_aliases.move_to_end(topic)
+            self.alias_hits += 1
+            # Topic string omitted; the alias property costs 3 bytes
+            self.alias_bytes_saved += len(topic.encode("utf-8")) - 3
+            return "", self._alias_properties(entry[0], properties)
+
+        if topic not in self._alias_candidates:
+            self._alias_candidates[topic] = None
+            if len(self._alias_candidates) > 4096:
+                self._alias_candidates.popitem(last=False)
+            return topic, properties
+
+        if len(self._topic_aliases) < self.topic_alias_maximum:
+            alias = len(self._topic_aliases) + 1
+        else:
+            oldest_topic, (oldest_alias, last_used) = next(iter(self._topic_aliases.items()))
+            if now - last_used < self.topic_alias_idle_seconds:
+                return topic, properties
+            del self._topic_aliases[oldest_topic]
+            alias = oldest_alias
+        self._alias_candidates.pop(topic, None)
+        self._topic_aliases[topic] = [alias, now]
+        self.alias_assignments += 1
+        self.alias_bytes_saved -= 3
+        return topic, self._alias_properties(alias, properties)
+
+    @staticmethod
+    def _alias_properties(alias: int, properties: Optional[Properties]) -> Properties:
+        """Copy of the publish properties with TopicAlias set (queued messages keep the original)."""
+        aliased = Properties(PacketTypes.PUBLISH)
+        if properties is not None and hasattr(properties, "MessageExpiryInterval"):
+            aliased.MessageExpiryInterval = properties.MessageExpiryInterval
+        aliased.TopicAlias = alias
+        return aliased
+
+    def set_policy(self, topic_class: str, **settings):
+        """Override qos, retain and/or expiry for one topic class"""
+        self.policies.setdefault(topic_class, {"qos": None, "retain": None, "expiry": None}).update(settings)
+
+    def resolve_policy(self, topic_class: str):
+        """(qos, retain, expiry) for a topic class, with the configured defaults filled in"""
+        policy = self.policies.get(topic_class) or self.policies["default"]
+        return (self.qos if policy["qos"] is None else policy["qos"],
+                self.retain if policy["retain"] is None else policy["retain"],
+                policy["expiry"])
+
+    def publish(self, topic: str, payload: Any, qos: Optional[int] = None, retain: Optional[bool] = None,
+                expiry: Optional[int] = None, topic_class: str = "default") -> bool:
+        """Publish message with queuing support and safe payload normalization.
+
+        qos, retain and expiry default to the policy of topic_class (see
+        PUBLISH_POLICIES); explicit values win. expiry sets the MQTT v5 message
+        expiry interval (seconds) so the broker drops the message, retained
+        copy included, once it is stale. Returns True when paho accepted the
+        message, False when it was only queued for a later retry.
+        """
+        policy_qos, policy_retain, policy_expiry = self.resolve_policy(topic_class)
         if qos is None:
-            qos = self.qos
+            qos = policy_qos
         if retain is None:
-            retain = self.retain
+            retain = policy_retain
+        if expiry is None:
+            expiry = policy_expiry
+        self.published_by_class[topic_class] = self.published_by_class.get(topic_class, 0) + 1
 
         # Normalize payload to avoid publishing Python repr dicts (single quotes)
         # that Home Assistant cannot parse as JSON.
@@ -1342,29 +4840,52 @@ class MQTTManager:
                 json.loads(payload)
             except json.JSONDecodeError:
                 try:
+                    import ast  # rarely needed; deferred off the startup path
                     payload = json.dumps(ast.literal_eval(payload))
                 except Exception:
                     pass
+
+        properties = None
+        if expiry:
+            properties = Properties(PacketTypes.PUBLISH)
+            properties.MessageExpiryInterval = int(expiry)
             
         if self.connected and self.client is not None:
             try:
-                result = self.client.publish(topic, payload, qos=qos, retain=retain)
+                if qos == 0 and self.topic_alias_maximum:
+                    # Aliases only for QoS 0: paho would resend QoS 1/2 packets after a
+                    # reconnect with an alias the new connection does not know.
+                    with self._alias_lock:
+                        send_topic, send_properties = self._alias_for(topic, properties)
+                        result = self._client_publish(send_topic, payload, qos, retain, send_properties)
+                        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                            self._topic_aliases.clear()
+                else:
+                    result = self._client_publish(topic, payload, qos, retain, properties)
                 if result.rc != mqtt.MQTT_ERR_SUCCESS:
                     log(f"Failed to publish to {topic}: {result.rc}", "error")
                     # Queue message for later
-                    self.message_queue.put((topic, payload, qos, retain))
-                return result
+                    self._enqueue((topic, payload, qos, retain, properties))
+                    return False
+                if self.publish_pending_since is None:
+                    self.publish_pending_since = time.monotonic()
+                return True
             except Exception as e:
                 log(f"Error publishing to {topic}: {e}", "error")
                 # Queue message for later
-                self.message_queue.put((topic, payload, qos, retain))
+                self._enqueue((topic, payload, qos, retain, properties))
         else:
             # Queue message for later
-            self.message_queue.put((topic, payload, qos, retain))
+            self._enqueue((topic, payload, qos, retain, properties))
             log(f"MQTT not connected - queued message for {topic}")
+        return False
     
-    def connect(self) -> bool:
-        """Connect to MQTT broker with retry logic"""
+    def connect(self, budget: Optional[float] = None) -> bool:
+        """Connect to MQTT broker with retry logic
+
+        budget caps the seconds spent across all attempts, CONNACK waits and
+        backoff included; None allows the full retry schedule.
+        """
         if not self.client:
             self.create_client()
         if self.client is None:
@@ -1375,8 +4896,14 @@ class MQTTManager:
         
         max_retries = 10
         retry_count = 0
+        deadline = None if budget is None else time.monotonic() + budget
+
+        def within_budget(seconds: float) -> float:
+            return seconds if deadline is None else max(min(seconds, deadline - time.monotonic()), 0.0)
         
         while retry_count < max_retries and not self.connected:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
             try:
                 log(f"Connecting to MQTT broker {self.broker}:{self.port} (attempt {retry_count + 1}/{max_retries})")
                 
@@ -1384,11 +4911,8 @@ class MQTTManager:
                     client.connect(self.broker, self.port, 60)
                     client.loop_start()
                 
-                # Wait for connection callback
-                wait_time = 0
-                while wait_time < 10 and not self.connected:
-                    time.sleep(0.5)
-                    wait_time += 0.5
+                # Wait for the connection callback (returns as soon as CONNACK is handled)
+                self.connected_event.wait(within_budget(10))
                 
                 if self.connected:
                     log("MQTT connection established successfully")
@@ -1400,16 +4924,20 @@ class MQTTManager:
                     
                     # Exponential backoff
                     delay = min(self.reconnect_delay * (2 ** retry_count), self.max_reconnect_delay)
-                    log(f"Waiting {delay} seconds before retry...")
+                    delay = within_budget(delay)
+                    log(f"Waiting {delay:.0f} seconds before retry...")
                     time.sleep(delay)
                     
             except Exception as e:
                 log(f"MQTT connection failed: {e}. Retrying in {self.reconnect_delay} seconds...", "error")
                 retry_count += 1
-                time.sleep(self.reconnect_delay)
+                time.sleep(within_budget(self.reconnect_delay))
         
         if not self.connected:
-            log("Failed to connect to MQTT broker after maximum retries", "critical")
+            if deadline is not None and retry_count < max_retries:
+                log(f"MQTT broker not reachable within {budget:.0f} seconds - retrying at the next heartbeat", "error")
+            else:
+                log("Failed to connect to MQTT broker after maximum retries", "critical")
             return False
         
         return True
@@ -1417,8 +4945,12 @@ class MQTTManager:
     def disconnect(self):
         """Cleanly disconnect from MQTT broker"""
         if self.connected:
-            self._publish_status("offline", "shutdown")
-            time.sleep(1)  # Allow status message to be sent
+            info = self._publish_status("offline", "shutdown")
+            if info is not None:
+                try:
+                    info.wait_for_publish(timeout=1)  # Allow status message to be sent
+                except (RuntimeError, ValueError) as e:
+                    log(f"Offline status not confirmed: {e}", "debug")
         
         if self.client:
             try:
@@ -1443,7 +4975,8 @@ class MQTTManager:
                 self.last_heartbeat = current_time
             else:
                 log("MQTT connection lost - attempting reconnection", "warning")
-                self.connect()
+                # Bounded so a broker that accepts TCP but never answers cannot stall the main loop
+                self.connect(budget=self.RECONNECT_BUDGET)
     
     def get_stats(self) -> Dict[str, Any]:
         """Get MQTT connection statistics"""
@@ -1452,19 +4985,50 @@ class MQTTManager:
             "broker": f"{self.broker}:{self.port}",
             "topic": self.topic,
             "queued_messages": self.message_queue.qsize(),
+            "queue_dropped": self.queue_dropped,
+            "unconfirmed": self.unconfirmed,
+            "policies": {
+                name: dict(zip(("qos", "retain", "expiry"), self.resolve_policy(name)),
+                           messages=self.published_by_class.get(name, 0))
+                for name in self.policies
+            },
             "last_heartbeat": datetime.fromtimestamp(self.last_heartbeat).isoformat() if self.last_heartbeat > 0 else "Never",
             "qos": self.qos,
-            "retain": self.retain
+            "retain": self.retain,
+            "topic_alias": {
+                "maximum": self.topic_alias_maximum,
+                "active": len(self._topic_aliases),
+                "hits": self.alias_hits,
+                "assignments": self.alias_assignments,
+                "hit_rate": round(100.0 * self.alias_hits / self.alias_eligible, 1) if self.alias_eligible else 0.0,
+                "bytes_saved": self.alias_bytes_saved,
+            },
+            "discovery": {
+                "synced": self.discovery_synced,
+                "retained": len(self.retained_discovery),
+                "sent": self.discovery_sent,
+                "skipped": self.discovery_skipped,
+                "removed": self.discovery_removed,
+            }
         }
     
     def log_stats(self):
         """Log current MQTT statistics"""
         stats = self.get_stats()
         log(f"MQTT Stats: Connected={stats['connected']}, Broker={stats['broker']}, Queued={stats['queued_messages']}, QoS={stats['qos']}, Retain={stats['retain']}")
+        aliases = stats["topic_alias"]
+        if aliases["maximum"]:
+            log(f"MQTT Topic Aliases: {aliases['active']}/{aliases['maximum']} in use, hit rate {aliases['hit_rate']}%, {aliases['bytes_saved']} bytes saved")
 
 
 
-def main():
+def main(max_cycles: Optional[int] = None, config: Optional[AddonConfig] = None):
+    """Run the add-on; max_cycles and config (instead of options.json) are used by the load-test harness."""
+    global CONFIG, STARTUP_SECONDS, TRAFFIC_STATS, SUMMARY_CHANGES, OVERHEAD, MEMORY_MONITOR
+    if config is None:
+        init_config()
+    else:
+        CONFIG = config
     log(f"Starting Airplanes Live Home Assistant Add-on v{get_addon_version()}")
     
     # Validate configuration first
@@ -1472,84 +5036,286 @@ def main():
         log("Configuration validation failed. Please check your settings.", "critical")
         return
     
-    log(f"Configuration validated and applied for location {_format_location_for_logs(LATITUDE, LONGITUDE)}")
+    log(f"Configuration validated and applied for location {_format_location_for_logs(CONFIG.latitude, CONFIG.longitude)}")
+    init_api_sources()
     log("MQTT connection settings applied")
     
-    mqtt_manager = MQTTManager(MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, MQTT_USERNAME, MQTT_PASSWORD)
-    mqtt_manager.qos = MQTT_QOS
-    mqtt_manager.retain = MQTT_RETAIN
+    mqtt_manager = MQTTManager(CONFIG.mqtt_broker, CONFIG.mqtt_port, CONFIG.mqtt_topic, CONFIG.mqtt_username, CONFIG.mqtt_password)
+    configure_mqtt_manager(mqtt_manager)
     
     if not mqtt_manager.connect():
         log("Failed to connect to MQTT broker. Exiting.", "critical")
         return
 
+    state_store = None
+    pool = None
+    reloader = None
+    restart_reason = None
+
+    def save_and_disconnect():
+        """Stop workers, persist state and go offline; also run by the watchdog before it restarts a stuck loop"""
+        if pool is not None:
+            pool.close()
+        if TRAFFIC_STATS is not None:
+            TRAFFIC_STATS.checkpoint()
+        if state_store is not None:
+            state_store.flush()
+            state_store.close()
+        mqtt_manager.disconnect()
+
+    # Stalls are judged against several missed cycles, never less than two minutes
+    watchdog = Watchdog(mqtt_manager, max(3 * CONFIG.update_interval, 120), CONFIG.watchdog_restart, save_and_disconnect)
+    watchdog.start(HEALTH_PORT)
+    if CONFIG.persist_state:
+        state_store = StateStore(STATE_DB_FILE)
+        if state_store.open():
+            # Before discovery starts, so configs HA already has are not republished
+            state_store.load()
+        else:
+            state_store = None
+
     try:
-        # Publish discovery once at startup
+        # Publish discovery in the background while the first fetch is in flight
+        discovery_thread = None
         if mqtt_manager.is_connected():
-            publish_discovery(mqtt_manager)
-            # Wait a moment for discovery to be processed
-            time.sleep(3)
-            # Publish initial data to help with discovery
-            log("Publishing initial data for discovery...")
-            initial_data = {
-                "count": 0,
-                "closest_lowest": "None",
-                "closest_distance": "None",
-                "highest": None,
-                "highest_aircraft": "None",
-                "highest_display": "None",
-                "fastest_ground": 0,
-                "fastest_air": 0,
-                "aircraft_types": "None",
-                "weather": "Unknown",
-                "current_squawk": "None",
-                "last_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            mqtt_manager.publish(f"{MQTT_TOPIC}/summary", json.dumps(initial_data), retain=True)
-            log("Initial data published")
-        
+            discovery_thread = threading.Thread(target=publish_discovery, args=(mqtt_manager,), name="discovery", daemon=True)
+            discovery_thread.start()
+
+        if CONFIG.aircraft_db_csv:
+            # Building from a large CSV takes seconds; aircraft are enriched once it is mapped
+            threading.Thread(target=open_aircraft_db, name="aircraft-db", daemon=True).start()
+
+        if CONFIG.statistics_enabled:
+            TRAFFIC_STATS = TrafficStatistics(TRAFFIC_STATS_FILE)
+            TRAFFIC_STATS.load()
+
+        if CONFIG.overhead_minutes > 0:
+            OVERHEAD = OverflightPredictor(CONFIG.latitude, CONFIG.longitude, CONFIG.overhead_minutes * 60, CONFIG.overhead_radius)
+        SUMMARY_CHANGES = SummaryChangeDetector(CONFIG.summary_max_age) if CONFIG.summary_max_age else None
+        if CONFIG.memory_monitor:
+            MEMORY_MONITOR = MemoryMonitor(CONFIG.memory_warn_mb)
+            log(f"Memory monitor enabled - tracemalloc snapshot every {MemoryMonitor.SNAPSHOT_INTERVAL:.0f}s")
+
+        watchlist = None
+        if CONFIG.watchlist_file and CONFIG.tracking_mode in ["detailed", "both"]:
+            watchlist = Watchlist(CONFIG.watchlist_file)
+            log(f"Watchlist enabled - detailed tracking limited to entries in {CONFIG.watchlist_file}")
+
+        capture = CaptureWriter(CONFIG.capture_dir, CONFIG.capture_max_files) if CONFIG.capture_enabled else None
+        replayer = CaptureReplayer(CONFIG.replay_file, CONFIG.replay_speed) if CONFIG.replay_file else None
+        if capture:
+            log(f"Capture mode enabled - writing snapshots to {CONFIG.capture_dir}")
+        if replayer:
+            log(f"Replay mode enabled - replaying {CONFIG.replay_file} at {CONFIG.replay_speed}x (0 = as fast as possible)")
+
+        profiler = CycleProfiler() if CONFIG.profile_command_enabled else None
+        if profiler:
+            mqtt_manager.subscribe(f"{CONFIG.mqtt_topic}/cmd/profile", profiler.request)
+
+        scheduler = CycleScheduler(CONFIG.update_interval)
+        shedder = LoadShedder(CONFIG.load_shedding)
+
+        # Only the live add-on reads options.json; the load-test harness passes its own config
+        if config is None:
+            reloader = ConfigReloader(OPTIONS_FILE)
+            reloader.start(scheduler.wake)
+
+        # Started after discovery has reconciled, so workers inherit the final discovered set
+        pool_size = CONFIG.worker_processes if CONFIG.worker_processes > 1 and CONFIG.tracking_mode in ["detailed", "both"] else 0
+        if CONFIG.worker_processes > 1 and not pool_size:
+            log("worker_processes only applies to detailed tracking - running in-process", "warning")
+
         # Counter for periodic stats logging
         stats_counter = 0
         last_feeder_publish = 0.0
+        last_full_publish: Optional[float] = None
+        # An unchanged snapshot is still republished this often so expiring aircraft states stay alive
+        refresh_seconds = CONFIG.aircraft_state_expiry / 2 if CONFIG.aircraft_state_expiry else float("inf")
         
         while True:
-            data = fetch_airplane_data()
+            scheduler.start_cycle()
+            watchdog.beat()
+            # What the broker has not taken after the sleep is the backlog that counts, not a burst still draining
+            shedder.update(mqtt_manager.backlog(), scheduler.last_work > scheduler.interval)
+            reload = reloader.maybe_reload() if reloader is not None else None
+            if reload is not None:
+                started = time.monotonic()
+                new_config, changed, mtime = reload
+                restart_options = [key for key in changed if key in RESTART_OPTIONS]
+                if restart_options:
+                    restart_reason = f"Configuration change needs a restart ({', '.join(restart_options)})"
+                    break
+                CONFIG = new_config
+                subsystems = {RELOAD_SUBSYSTEMS.get(key, "config") for key in changed}
+                apply_reloaded_config(subsystems)
+                if "scheduler" in subsystems:
+                    scheduler.interval = float(CONFIG.update_interval)
+                    watchdog.stall_seconds = max(3 * CONFIG.update_interval, 120)
+                if "watchdog" in subsystems:
+                    watchdog.restart = CONFIG.watchdog_restart
+                if "load" in subsystems:
+                    shedder.enabled = CONFIG.load_shedding
+                if subsystems & {"mqtt", "publishing"}:
+                    configure_mqtt_manager(mqtt_manager)
+                if "watchlist" in subsystems:
+                    watchlist = Watchlist(CONFIG.watchlist_file) if CONFIG.watchlist_file and CONFIG.tracking_mode in ["detailed", "both"] else None
+                if "capture" in subsystems:
+                    capture = CaptureWriter(CONFIG.capture_dir, CONFIG.capture_max_files) if CONFIG.capture_enabled else None
+                if "publishing" in subsystems:
+                    refresh_seconds = CONFIG.aircraft_state_expiry / 2 if CONFIG.aircraft_state_expiry else float("inf")
+                if pool is not None:
+                    # Workers run on a copy of the configuration; the next cycle starts fresh ones
+                    pool.close()
+                    pool = None
+                    subsystems.add("workers")
+                if subsystems & DISCOVERY_SUBSYSTEMS and mqtt_manager.is_connected() and discovery_thread is None:
+                    discovery_thread = threading.Thread(target=publish_discovery, args=(mqtt_manager,), name="discovery", daemon=True)
+                    discovery_thread.start()
+                    subsystems.add("discovery")
+                last_full_publish = None  # Publish this cycle's snapshot under the new settings
+                latency_ms = (time.monotonic() - started) * 1000
+                reloader.record(changed, latency_ms)
+                log(f"Configuration reloaded in {latency_ms:.1f} ms, {max(time.time() - mtime, 0):.1f}s after the file changed: "
+                    f"{', '.join(changed)} -> {', '.join(sorted(subsystems))}")
+            if profiler:
+                profiler.begin_cycle()
+            replayed_feeder = []
+            snapshot_unchanged = False
+            if replayer:
+                cycle = replayer.next_cycle()
+                if cycle is None:
+                    log(f"Replay finished after {replayer.records_replayed} records")
+                    break
+                data, replayed_feeder = cycle
+                watchdog.fetch_ok()
+            else:
+                data = fetch_airplane_data()
+                if data is not None:
+                    watchdog.fetch_ok()
+                if capture:
+                    capture.write("aircraft", data)
+                snapshot_unchanged = (API_RESPONSE.unchanged and last_full_publish is not None
+                                      and time.monotonic() - last_full_publish < refresh_seconds)
+            if discovery_thread is not None:
+                # Let discovery configs go out before the first states so HA creates the entities first
+                discovery_thread.join()
+                discovery_thread = None
+            if pool_size and pool is None and mqtt_manager.is_connected():
+                # Workers get a bounded connect budget; starting them during an outage would only burn it
+                pool = ShardPool(pool_size, CONFIG)
+                pool.start()
             if mqtt_manager.is_connected():
-                # Extract squawk data first if needed
-                squawk_data = extract_squawks(data) if SQUAWK_TRACKING_ENABLED else {"current_squawk": "None"}
+                if snapshot_unchanged:
+                    log("Snapshot unchanged - skipping summary and aircraft publishing", "debug")
+                else:
+                    # Extract squawk data first if needed
+                    squawk_data = extract_squawks(data) if CONFIG.squawk_tracking_enabled else {"current_squawk": "None"}
                 
-                publish_summary_data(mqtt_manager, data, squawk_data)
-                publish_individual_aircraft(mqtt_manager, data)
+                    if watchlist is not None:
+                        watchlist.maybe_reload()
+                    # Per-aircraft publishing is what gets shed when MQTT falls behind; the summary never is
+                    publish_list = watchlist.filter(data) if watchlist is not None else data
+                    publish_list = shedder.select(publish_list)
+                    if pool is not None:
+                        # Workers publish detailed aircraft for their shards and return partial summaries
+                        publish_hexes = {ac.get('hex') for ac in publish_list} if publish_list is not data else None
+                        accumulator = pool.process(mqtt_manager, data, publish_hexes) if isinstance(data, list) else None
+                        publish_summary_data(mqtt_manager, data, squawk_data, accumulator)
+                    else:
+                        publish_summary_data(mqtt_manager, data, squawk_data)
+                    if STARTUP_SECONDS is None:
+                        STARTUP_SECONDS = _seconds_since_process_start()
+                        log(f"First summary published {STARTUP_SECONDS:.2f} seconds after process start")
+                    if pool is None:
+                        publish_individual_aircraft(mqtt_manager, publish_list)
+                    if shedder.batch_due():
+                        publish_aircraft_batch(mqtt_manager, data)
                 
-                # Publish current squawk state if enabled
-                if SQUAWK_TRACKING_ENABLED:
-                    publish_squawk_state(mqtt_manager, squawk_data)
-                # Publish feeder stats on its own cadence
-                if FEEDER_MONITOR_ENABLED:
-                    now_ts = time.time()
-                    if now_ts - last_feeder_publish >= FEEDER_MONITOR_INTERVAL:
-                        feeder = fetch_feeder_stats()
-                        publish_feeder_stats(mqtt_manager, feeder)
-                        last_feeder_publish = now_ts
+                    # Publish current squawk state if enabled
+                    if CONFIG.squawk_tracking_enabled:
+                        publish_squawk_state(mqtt_manager, squawk_data)
+                    last_full_publish = time.monotonic()
+                # Publish feeder stats on its own cadence (replay publishes recorded snapshots as they come)
+                if CONFIG.feeder_monitor_enabled:
+                    if replayer:
+                        for feeder in replayed_feeder:
+                            publish_feeder_stats(mqtt_manager, feeder)
+                    else:
+                        now_ts = time.time()
+                        if now_ts - last_feeder_publish >= CONFIG.feeder_monitor_interval:
+                            feeder = fetch_feeder_stats()
+                            if capture:
+                                capture.write("feeder", feeder)
+                            if FEEDER_RESPONSE.unchanged:
+                                log("Feeder stats unchanged - skipping publish", "debug")
+                            else:
+                                publish_feeder_stats(mqtt_manager, feeder)
+                            last_feeder_publish = now_ts
                 mqtt_manager.send_heartbeat() # Send heartbeat regularly
             else:
                 log("MQTT not connected - skipping publish", "warning")
+                last_full_publish = None  # The next snapshot must go out even if it is unchanged
+                if SUMMARY_CHANGES is not None:
+                    SUMMARY_CHANGES.reset()
                 mqtt_manager.send_heartbeat() # Still send heartbeat even if not connected
+
+            if state_store is not None:
+                state_store.flush(ac.get('hex') for ac in data or ())
             
+            if profiler:
+                profiler.end_cycle(mqtt_manager)
+            cycle_time = scheduler.end_cycle()
+            RECENT_CYCLE_TIMES.append(cycle_time)
+            log(f"Cycle completed in {cycle_time:.3f} seconds", "debug")
+            if MEMORY_MONITOR is not None:
+                MEMORY_MONITOR.sample(get_registry_sizes(mqtt_manager))
+            if mqtt_manager.is_connected() and not snapshot_unchanged:
+                diagnostics = {"scheduler": scheduler.get_stats(), "mqtt": mqtt_manager.get_stats()}
+                diagnostics["fetch"] = {"api": API_RESPONSE.get_stats(), "feeder": FEEDER_RESPONSE.get_stats()}
+                diagnostics["api"] = get_api_stats()
+                diagnostics["load"] = shedder.get_stats()
+                if reloader is not None:
+                    diagnostics["config"] = reloader.get_stats()
+                if MEMORY_MONITOR is not None:
+                    diagnostics["memory"] = MEMORY_MONITOR.get_stats()
+                if OVERHEAD is not None:
+                    diagnostics["overhead"] = OVERHEAD.get_stats()
+                if SUMMARY_CHANGES is not None:
+                    diagnostics["summary"] = SUMMARY_CHANGES.get_stats()
+                if AIRCRAFT_DB is not None:
+                    diagnostics["aircraft_db"] = AIRCRAFT_DB.get_stats()
+                if watchlist is not None:
+                    diagnostics["watchlist"] = watchlist.get_stats()
+                if pool is not None:
+                    diagnostics["workers"] = pool.get_stats()
+                publish_diagnostics(mqtt_manager, diagnostics)
+
             # Log MQTT stats every 10 cycles
             stats_counter += 1
             if stats_counter % 10 == 0:
                 mqtt_manager.log_stats()
+                if capture:
+                    log(f"Capture stats: {capture.records_written} records, {capture.bytes_written} bytes (uncompressed)")
+            if max_cycles is not None and stats_counter >= max_cycles:
+                log(f"Reached {max_cycles} cycles - stopping")
+                break
             
-            log(f"Sleeping for {UPDATE_INTERVAL} seconds")
-            time.sleep(UPDATE_INTERVAL)
+            # Replay paces itself from the recorded timestamps
+            if replayer:
+                continue
+            scheduler.wait()
     except KeyboardInterrupt:
         log("Shutting down.")
     except Exception as e:
         log(f"Unexpected error: {e}", "critical")
     finally:
-        mqtt_manager.disconnect()
+        watchdog.stop()
+        if reloader is not None:
+            reloader.stop()
+        save_and_disconnect()
         log("Cleanup completed")
+    if restart_reason:
+        restart_process(restart_reason)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Peak memory of decoding one API response: resp.json() vs the streaming decoder.
+
+Serves a synthetic response from FakeAirplanesLiveServer and fetches it in
+a fresh child process per method, reporting how far peak RSS (VmHWM) rose
+above the child's resident set after imports, and the fetch time. Linux
+only; ru_maxrss is not used because it keeps the forking parent's peak
+across exec.
+
+Example:
+    python tools/decode_memory.py --aircraft 20000 --api rest --readsb-fields
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+
+
+# Members real readsb/airplanes.live records carry that the add-on never reads
+READSB_FIELDS = {
+    "alt_geom": 36025, "baro_rate": -64, "geom_rate": -32, "category": "A3", "emergency": "none",
+    "nav_qnh": 1013.6, "nav_altitude_mcp": 36000, "nav_heading": 270.0, "nav_modes": ["autopilot", "althold", "tcas"],
+    "true_heading": 268.9, "mag_heading": 271.2, "mach": 0.78, "roll": -0.2, "nic": 8, "rc": 186,
+    "version": 2, "nic_baro": 1, "nac_p": 9, "nac_v": 1, "sil": 3, "sil_type": "perhour", "gva": 2, "sda": 2,
+    "alert": 0, "spi": 0, "mlat": [], "tisb": [], "dst": 42.8, "dir": 93.1, "seen_pos": 0.3,
+}
+
+
+def status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def child(method: str, url: str, api_type: str) -> int:
+    import logging
+
+    import run
+    logging.disable(logging.INFO)
+    options = {"disable_auto_config": True, "api_type": api_type, "api_url": url}
+    run.CONFIG = run.AddonConfig(options)
+    baseline = status_kb("VmRSS")
+    started = time.perf_counter()
+    if method == "json":
+        # What fetch_airplane_data() did before streaming: whole body, whole tree
+        url = f"{url}/?circle=0,0,1" if api_type == "authenticated" else f"{url}/0/0/1"
+        data = run.requests.get(url, timeout=60).json()
+        aircraft = data.get("aircraft") or data.get("ac")
+    else:
+        aircraft = run.fetch_airplane_data()
+    seconds = time.perf_counter() - started
+    peak = status_kb("VmHWM")
+    print(json.dumps({"aircraft": len(aircraft or []), "peak_growth_kb": peak - baseline, "seconds": round(seconds, 3)}))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Peak RSS of resp.json() vs streaming decode of one API response")
+    parser.add_argument("--aircraft", type=int, default=10000)
+    parser.add_argument("--api", choices=["feeder", "rest"], default="feeder")
+    parser.add_argument("--readsb-fields", action="store_true", help="Pad aircraft with the other members real responses carry")
+    parser.add_argument("--child", nargs=3, metavar=("METHOD", "URL", "API_TYPE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    from fake_airplanes_live import FakeAirplanesLiveServer, wait_for_port
+    api = FakeAirplanesLiveServer(aircraft_count=args.aircraft)
+    if args.readsb_fields:
+        for aircraft in api.traffic.aircraft:
+            aircraft.update(READSB_FIELDS)
+    api.start()
+    wait_for_port(api.port)
+    url, api_type = (api.rest_url, "authenticated") if args.api == "rest" else (api.feeder_url, "unauthenticated")
+
+    report = {"aircraft": args.aircraft}
+    for method in ("json", "stream"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", method, url, api_type],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        report[method] = json.loads(output.strip().splitlines()[-1])
+    report["body_bytes"] = api.bytes_served // 2
+    api.stop()
+
+    print(f"aircraft: {args.aircraft}, body: {report['body_bytes']} bytes")
+    print(f"{'method':<10}{'peak RSS growth KB':>20}{'seconds':>10}")
+    for method in ("json", "stream"):
+        print(f"{method:<10}{report[method]['peak_growth_kb']:>20}{report[method]['seconds']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
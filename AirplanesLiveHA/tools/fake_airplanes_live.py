@@ -0,0 +1,527 @@
+"""Local stand-ins for the airplanes.live API and an MQTT broker.
+
+Used by the load-test harness (tools/loadtest.py) so end-to-end performance
+runs need neither internet access nor a real broker. Both servers bind to
+127.0.0.1 and run in background threads.
+"""
+
+import json
+import math
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+AIRCRAFT_TYPES = ["A320", "A321", "B738", "B38M", "A20N", "E190", "AT76", "B77W", "A333", "C172"]
+SPECIAL_SQUAWK = "7700"
+
+
+class FakeTraffic:
+    """Deterministic synthetic traffic that moves a little on every request."""
+
+    def __init__(self, lat: float, lon: float, radius_km: float, count: int, emergencies: int = 0, seed: int = 1):
+        self.lat = lat
+        self.lon = lon
+        self.radius_km = radius_km
+        self.count = count
+        self.emergencies = emergencies
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._last_step = time.monotonic()
+        self.aircraft = [self._make_aircraft(i) for i in range(count)]
+
+    def _make_aircraft(self, index: int) -> Dict[str, Any]:
+        rng = self._rng
+        bearing = rng.uniform(0, 2 * math.pi)
+        dist_km = self.radius_km * math.sqrt(rng.random())
+        lat = self.lat + (dist_km * math.cos(bearing)) / 111.32
+        lon = self.lon + (dist_km * math.sin(bearing)) / (111.32 * max(math.cos(math.radians(self.lat)), 0.01))
+        gs = round(rng.uniform(90, 520), 1)
+        aircraft = {
+            "hex": f"{0x400000 + index:06x}",
+            "type": "adsb_icao",
+            "flight": f"FAKE{index:04d}".ljust(8),
+            "r": f"EI-{index:04d}",
+            "t": rng.choice(AIRCRAFT_TYPES),
+            "alt_baro": rng.randrange(500, 41000, 25),
+            "gs": gs,
+            "tas": round(gs * rng.uniform(0.9, 1.1)),
+            "ias": round(gs * 0.8),
+            "track": round(rng.uniform(0, 360), 1),
+            "lat": round(lat, 6),
+            "lon": round(lon, 6),
+            "squawk": SPECIAL_SQUAWK if index < self.emergencies else f"{rng.randrange(0o1001, 0o7000):04o}",
+            "messages": rng.randrange(100, 100000),
+            "seen": round(rng.uniform(0, 5), 1),
+            "rssi": round(rng.uniform(-30, -3), 1),
+        }
+        if index % 7 == 0:
+            aircraft.update({"wd": rng.randrange(0, 360), "ws": rng.randrange(0, 80), "oat": rng.randrange(-60, 30)})
+        return aircraft
+
+    def step(self) -> List[Dict[str, Any]]:
+        """Advance every aircraft along its track by the wall time since the last call."""
+        with self._lock:
+            now = time.monotonic()
+            dt_h = (now - self._last_step) / 3600.0
+            self._last_step = now
+            for ac in self.aircraft:
+                dist_km = ac["gs"] * 1.852 * dt_h
+                track = math.radians(ac["track"])
+                ac["lat"] = round(ac["lat"] + dist_km * math.cos(track) / 111.32, 6)
+                ac["lon"] = round(ac["lon"] + dist_km * math.sin(track) / (111.32 * max(math.cos(math.radians(ac["lat"])), 0.01)), 6)
+            return [dict(ac) for ac in self.aircraft]
+
+
+class FakeAirplanesLiveServer:
+    """HTTP server serving the feeder `/v2/point/...` and REST `?circle=` response shapes."""
+
+    def __init__(self, aircraft_count: int = 100, latency_ms: float = 0, emergencies: int = 0,
+                 lat: float = 53.2707, lon: float = -9.0568, radius_km: float = 50, port: int = 0,
+                 frozen: bool = False, validators: bool = False):
+        self.traffic = FakeTraffic(lat, lon, radius_km, aircraft_count, emergencies)
+        self.latency_ms = latency_ms
+        # frozen serves the same snapshot (and "now") every time; validators adds ETag/Last-Modified
+        self.frozen = frozen
+        self.validators = validators
+        self.not_modified_served = 0
+        self._snapshot: Optional[List[Dict[str, Any]]] = None
+        self._snapshot_ms = 0
+        self.requests_served = 0
+        self.bytes_served = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def feeder_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v2/point"
+
+    @property
+    def rest_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _handle(self, request: BaseHTTPRequestHandler):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        parsed = urlparse(request.path)
+        if parsed.path.startswith("/v2/point/"):
+            key = "ac"
+        elif "circle" in parse_qs(parsed.query):
+            key = "aircraft"
+        else:
+            request.send_error(404)
+            return
+        if self._snapshot is None or not self.frozen:
+            self._snapshot = self.traffic.step()
+            self._snapshot_ms = int(time.time() * 1000)
+        aircraft, now_ms = self._snapshot, self._snapshot_ms
+        etag = f'"{now_ms:x}"'
+        if self.validators and request.headers.get("If-None-Match") == etag:
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.end_headers()
+            self.requests_served += 1
+            self.not_modified_served += 1
+            return
+        body = {key: aircraft, "msg": "No error", "now": now_ms, "total": len(aircraft), "ctime": now_ms, "ptime": 0}
+        payload = json.dumps(body).encode("utf-8")
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        if self.validators:
+            request.send_header("ETag", etag)
+        request.end_headers()
+        request.wfile.write(payload)
+        self.requests_served += 1
+        self.bytes_served += len(payload)
+
+    def start(self) -> "FakeAirplanesLiveServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-airplanes-live", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# MQTT control packet types
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+# MQTT v5 property identifier -> value encoding
+_PROPERTY_KINDS = {
+    0x01: "byte", 0x02: "u32", 0x03: "str", 0x08: "str", 0x09: "bin", 0x0B: "varint",
+    0x11: "u32", 0x12: "str", 0x13: "u16", 0x15: "str", 0x16: "bin", 0x17: "byte",
+    0x18: "u32", 0x19: "byte", 0x1A: "str", 0x1C: "str", 0x1F: "str", 0x21: "u16",
+    0x22: "u16", 0x23: "u16", 0x24: "byte", 0x25: "byte", 0x26: "pair", 0x27: "u32",
+    0x28: "byte", 0x29: "byte", 0x2A: "byte",
+}
+PROP_MESSAGE_EXPIRY = 0x02
+PROP_TOPIC_ALIAS_MAXIMUM = 0x22
+PROP_TOPIC_ALIAS = 0x23
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value % 128
+        value //= 128
+        if value:
+            byte |= 0x80
+        out.append(byte)
+        if not value:
+            return bytes(out)
+
+
+def _decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    multiplier, value = 1, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            return value, pos
+        multiplier *= 128
+
+
+def _decode_string(data: bytes, pos: int) -> Tuple[bytes, int]:
+    length = struct.unpack_from("!H", data, pos)[0]
+    return data[pos + 2:pos + 2 + length], pos + 2 + length
+
+
+def _decode_properties(data: bytes, pos: int) -> Tuple[Dict[int, Any], int]:
+    length, pos = _decode_varint(data, pos)
+    end = pos + length
+    props: Dict[int, Any] = {}
+    while pos < end:
+        prop_id, pos = _decode_varint(data, pos)
+        kind = _PROPERTY_KINDS.get(prop_id)
+        if kind == "byte":
+            value, pos = data[pos], pos + 1
+        elif kind == "u16":
+            value, pos = struct.unpack_from("!H", data, pos)[0], pos + 2
+        elif kind == "u32":
+            value, pos = struct.unpack_from("!I", data, pos)[0], pos + 4
+        elif kind == "varint":
+            value, pos = _decode_varint(data, pos)
+        elif kind in ("str", "bin"):
+            value, pos = _decode_string(data, pos)
+        elif kind == "pair":
+            key, pos = _decode_string(data, pos)
+            val, pos = _decode_string(data, pos)
+            value = (key, val)
+        else:
+            raise ValueError(f"Unknown MQTT property 0x{prop_id:02x}")
+        props[prop_id] = value
+    return props, end
+
+
+def _packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([(packet_type << 4) | flags]) + _encode_varint(len(body)) + body
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT wildcard match for `+` and `#`."""
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class _SinkClient(socketserver.BaseRequestHandler):
+    """One broker-side MQTT session."""
+
+    def setup(self):
+        self.sink: "MQTTSink" = self.server.sink  # type: ignore[attr-defined]
+        self.send_lock = threading.Lock()
+        self.protocol_level = 4
+        self.aliases: Dict[int, str] = {}
+        self.buffer = b""
+
+    def _read_packet(self) -> Optional[Tuple[int, int, bytes]]:
+        while True:
+            if len(self.buffer) >= 2:
+                try:
+                    length, pos = _decode_varint(self.buffer, 1)
+                except IndexError:
+                    length, pos = None, 0
+                if length is not None and len(self.buffer) >= pos + length:
+                    header = self.buffer[0]
+                    body = self.buffer[pos:pos + length]
+                    self.buffer = self.buffer[pos + length:]
+                    self.sink._count_bytes_in(pos + length)
+                    return header >> 4, header & 0x0F, body
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return None
+            self.buffer += chunk
+
+    def send(self, data: bytes):
+        with self.send_lock:
+            self.request.sendall(data)
+
+    def _props(self, props: bytes = b"") -> bytes:
+        if self.protocol_level < 5:
+            return b""
+        return _encode_varint(len(props)) + props
+
+    def handle(self):
+        try:
+            while True:
+                packet = self._read_packet()
+                if packet is None:
+                    break
+                packet_type, flags, body = packet
+                if packet_type == CONNECT:
+                    self._handle_connect(body)
+                elif packet_type == PUBLISH:
+                    self._handle_publish(flags, body)
+                elif packet_type == PUBREL:
+                    self.send(_packet(PUBCOMP, 0, body[:2]))
+                elif packet_type == SUBSCRIBE:
+                    self._handle_subscribe(body)
+                elif packet_type == UNSUBSCRIBE:
+                    self._handle_unsubscribe(body)
+                elif packet_type == PINGREQ:
+                    self.send(_packet(PINGRESP, 0, b""))
+                elif packet_type == DISCONNECT:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.sink._drop_session(self)
+
+    def _handle_connect(self, body: bytes):
+        _, pos = _decode_string(body, 0)
+        self.protocol_level = body[pos]
+        self.sink._count("connects")
+        props = b""
+        if self.protocol_level >= 5 and self.sink.topic_alias_maximum:
+            props = bytes([PROP_TOPIC_ALIAS_MAXIMUM]) + struct.pack("!H", self.sink.topic_alias_maximum)
+        payload = b"\x00\x00" + self._props(props)
+        self.send(_packet(CONNACK, 0, payload))
+
+    def _handle_publish(self, flags: int, body: bytes):
+        if self.sink.publish_delay:
+            time.sleep(self.sink.publish_delay)
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic_bytes, pos = _decode_string(body, 0)
+        packet_id = None
+        if qos:
+            packet_id = struct.unpack_from("!H", body, pos)[0]
+            pos += 2
+        props: Dict[int, Any] = {}
+        if self.protocol_level >= 5:
+            props, pos = _decode_properties(body, pos)
+        payload = body[pos:]
+        topic = topic_bytes.decode("utf-8")
+        alias = props.get(PROP_TOPIC_ALIAS)
+        alias_hit = False
+        if alias is not None:
+            if topic:
+                self.aliases[alias] = topic
+            else:
+                topic = self.aliases.get(alias, "")
+                alias_hit = True
+        self.sink._record_publish(topic, payload, qos, retain, len(body), alias_hit, props.get(PROP_MESSAGE_EXPIRY))
+        if qos == 1:
+            self.send(_packet(PUBACK, 0, struct.pack("!H", packet_id)))
+        elif qos == 2:
+            self.send(_packet(PUBREC, 0, struct.pack("!H", packet_id)))
+
+    def _handle_subscribe(self, body: bytes):
+        packet_id = struct.unpack_from("!H", body, 0)[0]
+        pos = 2
+        if self.protocol_level >= 5:
+            _, pos = _decode_properties(body, pos)
+        filters = []
+        while pos < len(body):
+            topic_filter, pos = _decode_string(body, pos)
+            options = body[pos]
+            pos += 1
+            filters.append((topic_filter.decode("utf-8"), options & 0x03))
+        payload = struct.pack("!H", packet_id) + self._props() + bytes(q for _, q in filters)
+        self.send(_packet(SUBACK, 0, payload))
+        for topic_filter, _ in filters:
+            self.sink._subscribe(self, topic_filter)
+
+    def _handle_unsubscribe(self, body: bytes):
+        packet_id = struct.unpack_from("!H", body, 0)[0]
+        pos = 2
+        if self.protocol_level >= 5:
+            _, pos = _decode_properties(body, pos)
+        count = 0
+        while pos < len(body):
+            topic_filter, pos = _decode_string(body, pos)
+            self.sink._unsubscribe(self, topic_filter.decode("utf-8"))
+            count += 1
+        reasons = bytes(count) if self.protocol_level >= 5 else b""
+        self.send(_packet(UNSUBACK, 0, struct.pack("!H", packet_id) + self._props() + reasons))
+
+    def deliver(self, topic: str, payload: bytes, retain: bool):
+        topic_bytes = topic.encode("utf-8")
+        body = struct.pack("!H", len(topic_bytes)) + topic_bytes + self._props() + payload
+        self.send(_packet(PUBLISH, 0x01 if retain else 0x00, body))
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MQTTSink:
+    """Minimal in-process MQTT 3.1.1/5 broker that records what it receives.
+
+    Supports QoS 0-2 publishes, retained messages, subscriptions with
+    wildcards, and v5 topic aliases. Not a general-purpose broker.
+    """
+
+    def __init__(self, port: int = 0, topic_alias_maximum: int = 0, publish_delay_ms: float = 0):
+        self.topic_alias_maximum = topic_alias_maximum
+        # Per-PUBLISH processing delay, to emulate a slow broker that lets the client's backlog build up
+        self.publish_delay = publish_delay_ms / 1000.0
+        self._lock = threading.Lock()
+        self._server = _SinkServer(("127.0.0.1", port), _SinkClient)
+        self._server.sink = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+        self._subscriptions: Dict[_SinkClient, List[str]] = {}
+        self.retained: Dict[str, bytes] = {}
+        self.reset_stats()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats: Dict[str, Any] = {
+                "connects": 0,
+                "messages": 0,
+                "payload_bytes": 0,
+                "publish_bytes": 0,
+                "bytes_in": 0,
+                "alias_hits": 0,
+                "with_expiry": 0,
+                "by_qos": {0: 0, 1: 0, 2: 0},
+                "retained_publishes": 0,
+            }
+            self.topic_counts: Dict[str, int] = {}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _count_bytes_in(self, size: int):
+        with self._lock:
+            self.stats["bytes_in"] += size
+
+    def _record_publish(self, topic: str, payload: bytes, qos: int, retain: bool, body_len: int,
+                        alias_hit: bool, expiry: Optional[int]):
+        with self._lock:
+            stats = self.stats
+            stats["messages"] += 1
+            stats["payload_bytes"] += len(payload)
+            stats["publish_bytes"] += body_len
+            stats["by_qos"][qos] += 1
+            if alias_hit:
+                stats["alias_hits"] += 1
+            if expiry is not None:
+                stats["with_expiry"] += 1
+            self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+            if retain:
+                stats["retained_publishes"] += 1
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            subscribers = [c for c, filters in self._subscriptions.items() if any(topic_matches(f, topic) for f in filters)]
+        for client in subscribers:
+            try:
+                client.deliver(topic, payload, False)
+            except OSError:
+                pass
+
+    def _subscribe(self, client: _SinkClient, topic_filter: str):
+        with self._lock:
+            self._subscriptions.setdefault(client, []).append(topic_filter)
+            retained = [(t, p) for t, p in self.retained.items() if topic_matches(topic_filter, t)]
+        for topic, payload in retained:
+            client.deliver(topic, payload, True)
+
+    def _unsubscribe(self, client: _SinkClient, topic_filter: str):
+        with self._lock:
+            filters = self._subscriptions.get(client, [])
+            if topic_filter in filters:
+                filters.remove(topic_filter)
+
+    def _drop_session(self, client: _SinkClient):
+        with self._lock:
+            self._subscriptions.pop(client, None)
+
+    def publish(self, topic: str, payload: Any, retain: bool = False):
+        """Inject a message as if another client had published it (e.g. a command topic)."""
+        if not isinstance(payload, (bytes, bytearray)):
+            payload = (payload if isinstance(payload, str) else json.dumps(payload)).encode("utf-8")
+        with self._lock:
+            if retain:
+                self.retained[topic] = bytes(payload)
+            subscribers = [c for c, filters in self._subscriptions.items() if any(topic_matches(f, topic) for f in filters)]
+        for client in subscribers:
+            client.deliver(topic, bytes(payload), False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the recorded counters plus retained-topic cardinality."""
+        with self._lock:
+            snap = dict(self.stats)
+            snap["by_qos"] = dict(self.stats["by_qos"])
+            snap["retained_topics"] = len(self.retained)
+            snap["distinct_topics"] = len(self.topic_counts)
+            return snap
+
+    def start(self) -> "MQTTSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mqtt-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def wait_for_port(port: int, timeout: float = 5.0) -> bool:
+    """Wait until something accepts connections on 127.0.0.1:port."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""End-to-end throughput test against the local fake API and MQTT sink.
+
+Starts FakeAirplanesLiveServer and MQTTSink on ephemeral localhost ports,
+points run.py at them, drives main() for a fixed number of cycles through
+the real MQTTManager connection path, then reports and checks throughput
+and cycle time.
+
+Example:
+    python tools/loadtest.py --aircraft 2000 --cycles 5 --tracking-mode both --min-throughput 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+
+from fake_airplanes_live import FakeAirplanesLiveServer, MQTTSink, wait_for_port  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive run.main() against local fakes and assert on throughput")
+    parser.add_argument("--aircraft", type=int, default=500, help="Aircraft returned per API response")
+    parser.add_argument("--emergencies", type=int, default=0, help="How many of them squawk 7700")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Artificial API response latency")
+    parser.add_argument("--frozen", action="store_true", help="Serve the same snapshot on every request")
+    parser.add_argument("--etag", action="store_true", help="Send ETag and answer If-None-Match with 304")
+    parser.add_argument("--cycles", type=int, default=3, help="Update cycles to run")
+    parser.add_argument("--interval", type=int, default=1, help="update_interval in seconds")
+    parser.add_argument("--api", choices=["feeder", "rest"], default="feeder", help="Response shape to exercise")
+    parser.add_argument("--tracking-mode", choices=["summary", "detailed", "both", "aggregate"], default="both")
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument("--aircraft-qos", type=int, choices=[0, 1, 2], default=None,
+                        help="QoS of the aircraft topic class (default: its publish policy)")
+    parser.add_argument("--workers", type=int, default=0, help="worker_processes for detailed publishing (0 = in-process)")
+    parser.add_argument("--broker-delay-ms", type=float, default=0, help="Delay the sink adds to every PUBLISH (slow broker)")
+    parser.add_argument("--load-shedding", action="store_true", help="Enable load shedding (off so throughput figures stay comparable)")
+    parser.add_argument("--topic-alias-max", type=int, default=0, help="TopicAliasMaximum the sink grants in CONNACK")
+    parser.add_argument("--min-backlog", type=int, default=0, help="Fail if the largest backlog seen at cycle start is below this")
+    parser.add_argument("--min-throughput", type=float, default=0, help="Fail below this many MQTT messages per second of cycle work")
+    parser.add_argument("--max-cycle-time", type=float, default=0, help="Fail if the mean cycle work time exceeds this (seconds)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only")
+    return parser.parse_args()
+
+
+def build_config(run, args, api: FakeAirplanesLiveServer, sink: MQTTSink):
+    """Build an add-on configuration pointed at the local fakes."""
+    options = {
+        "mqtt_broker": "127.0.0.1",
+        "mqtt_port": sink.port,
+        "mqtt_qos": args.qos,
+        "update_interval": args.interval,
+        "tracking_mode": args.tracking_mode,
+        "worker_processes": args.workers,
+        "load_shedding": args.load_shedding,
+        "feeder_monitor_enabled": False,
+        "disable_auto_config": True,
+    }
+    if args.api == "rest":
+        options.update({"api_type": "authenticated", "api_key": "loadtest", "api_url": api.rest_url})
+    else:
+        options.update({"api_type": "unauthenticated", "api_url": api.feeder_url})
+    return run.AddonConfig(options)
+
+
+def track_backlog(run) -> dict:
+    """Record the largest backlog and shedding level main() sees at the start of each cycle."""
+    seen = {"backlog": 0, "level": 0}
+    update = run.LoadShedder.update
+
+    def recording_update(self, backlog, overran):
+        level = update(self, backlog, overran)
+        seen["backlog"] = max(seen["backlog"], backlog)
+        seen["level"] = max(seen["level"], level)
+        return level
+
+    run.LoadShedder.update = recording_update
+    return seen
+
+
+def main() -> int:
+    args = parse_args()
+    api = FakeAirplanesLiveServer(aircraft_count=args.aircraft, latency_ms=args.latency_ms, emergencies=args.emergencies,
+                                  frozen=args.frozen, validators=args.etag).start()
+    sink = MQTTSink(topic_alias_maximum=args.topic_alias_max, publish_delay_ms=args.broker_delay_ms).start()
+    if not wait_for_port(api.port) or not wait_for_port(sink.port):
+        print("Fake servers failed to start", file=sys.stderr)
+        return 2
+
+    import run
+
+    config = build_config(run, args, api, sink)
+    if args.aircraft_qos is not None:
+        run.MQTTManager.PUBLISH_POLICIES["aircraft"]["qos"] = args.aircraft_qos
+    seen = track_backlog(run)
+    started = time.monotonic()
+    run.main(max_cycles=args.cycles, config=config)
+    wall_time = time.monotonic() - started
+
+    cycle_times = list(run.RECENT_CYCLE_TIMES)[-args.cycles:]
+    stats = sink.snapshot()
+    work_time = sum(cycle_times) or 1e-9
+    report = {
+        "aircraft": args.aircraft,
+        "cycles": len(cycle_times),
+        "wall_time_s": round(wall_time, 3),
+        "cycle_time_mean_s": round(statistics.mean(cycle_times), 4) if cycle_times else None,
+        "cycle_time_max_s": round(max(cycle_times), 4) if cycle_times else None,
+        "messages": stats["messages"],
+        "messages_per_cycle": round(stats["messages"] / max(len(cycle_times), 1), 1),
+        "throughput_msgs_per_s": round(stats["messages"] / work_time, 1),
+        "publish_bytes": stats["publish_bytes"],
+        "payload_bytes": stats["payload_bytes"],
+        "alias_hits": stats["alias_hits"],
+        "with_expiry": stats["with_expiry"],
+        "retained_topics": stats["retained_topics"],
+        "distinct_topics": stats["distinct_topics"],
+        "by_qos": stats["by_qos"],
+        "max_backlog": seen["backlog"],
+        "max_shed_level": seen["level"],
+        "api_requests": api.requests_served,
+        "api_bytes": api.bytes_served,
+        "api_not_modified": api.not_modified_served,
+    }
+
+    failures = []
+    if len(cycle_times) < args.cycles:
+        failures.append(f"only {len(cycle_times)} of {args.cycles} cycles completed")
+    if args.min_throughput and report["throughput_msgs_per_s"] < args.min_throughput:
+        failures.append(f"throughput {report['throughput_msgs_per_s']} msg/s below {args.min_throughput}")
+    if args.min_backlog and report["max_backlog"] < args.min_backlog:
+        failures.append(f"largest backlog {report['max_backlog']} below {args.min_backlog}")
+    if args.max_cycle_time and cycle_times and report["cycle_time_mean_s"] > args.max_cycle_time:
+        failures.append(f"mean cycle time {report['cycle_time_mean_s']}s above {args.max_cycle_time}s")
+    report["failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>24}: {value}")
+        print("PASS" if not failures else "FAIL")
+
+    sink.stop()
+    api.stop()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
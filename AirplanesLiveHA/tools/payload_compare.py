@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Compare MQTT traffic of per-aircraft topics against the aggregate payload.
+
+Runs publish_individual_aircraft() and publish_aircraft_batch() from run.py
+over the same synthetic traffic snapshot with a recording MQTT manager and
+reports messages and bytes (topic + payload) per cycle for each mode.
+
+Example:
+    python tools/payload_compare.py --aircraft 1000
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+
+from fake_airplanes_live import FakeTraffic  # noqa: E402
+
+
+class RecordingManager:
+    """Stands in for MQTTManager and counts what would be published."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload, qos=None, retain=None, expiry=None, topic_class="default"):
+        data = payload if isinstance(payload, (bytes, bytearray)) else str(payload).encode("utf-8")
+        self.messages += 1
+        self.bytes += len(topic.encode("utf-8")) + len(data)
+        return True
+
+    def publish_discovery(self, topic, payload):
+        return self.publish(topic, payload, topic_class="discovery")
+
+
+def measure(publish, aircraft):
+    manager = RecordingManager()
+    publish(manager, aircraft)
+    return {"messages": manager.messages, "bytes": manager.bytes}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-aircraft topics vs aggregate payload, messages and bytes per cycle")
+    parser.add_argument("--aircraft", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON only")
+    args = parser.parse_args()
+
+    import run
+    logging.disable(logging.INFO)
+
+    lat, lon = 53.2707, -9.0568
+    aircraft = FakeTraffic(lat, lon, 150.0, args.aircraft).step()
+    options = {"latitude": lat, "longitude": lon, "disable_auto_config": True}
+
+    report = {"aircraft": args.aircraft}
+    run.CONFIG = run.AddonConfig(dict(options, tracking_mode="detailed"))
+    run.DETAILED_DISCOVERY_PUBLISHED.clear()
+    report["individual_first_cycle"] = measure(run.publish_individual_aircraft, aircraft)
+    report["individual"] = measure(run.publish_individual_aircraft, aircraft)
+    run.CONFIG = run.AddonConfig(dict(options, tracking_mode="detailed", device_discovery=True))
+    run.DETAILED_DISCOVERY_PUBLISHED.clear()
+    report["device_first_cycle"] = measure(run.publish_individual_aircraft, aircraft)
+
+    run.CONFIG = run.AddonConfig(dict(options, tracking_mode="aggregate"))
+    report["aggregate"] = measure(run.publish_aircraft_batch, aircraft)
+    run.CONFIG = run.AddonConfig(dict(options, tracking_mode="aggregate", aggregate_compression=True))
+    report["aggregate_compressed"] = measure(run.publish_aircraft_batch, aircraft)
+
+    # Round trip check so a format change cannot silently lose positions
+    batch = run.encode_aircraft_batch(aircraft)
+    decoded = {a["hex"]: a for a in run.decode_aircraft_batch(json.dumps(batch))}
+    report["max_position_error_deg"] = max(
+        (max(abs(decoded[a["hex"]]["lat"] - a["lat"]), abs(decoded[a["hex"]]["lon"] - a["lon"])) for a in aircraft),
+        default=0.0,
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"aircraft: {args.aircraft}")
+    print(f"{'mode':<24}{'messages':>10}{'bytes':>12}")
+    for mode in ("individual_first_cycle", "individual", "device_first_cycle", "aggregate", "aggregate_compressed"):
+        print(f"{mode:<24}{report[mode]['messages']:>10}{report[mode]['bytes']:>12}")
+    print(f"max position error: {report['max_position_error_deg']:.6f} deg")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())